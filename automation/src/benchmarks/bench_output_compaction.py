@@ -0,0 +1,61 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.append("../")
+
+from ewifi.libs.output import compact_output, iter_output_lines
+
+
+def legacy_compact(text):
+    """Output handling of AurubaController.run before single pass compaction."""
+    info = text.splitlines()
+    no_blank_info = [ i.strip() for i in info if i.strip() != ""]
+    return "\n".join(no_blank_info[1:-1]).strip()
+
+
+def count_lines(text):
+    return sum(1 for _ in iter_output_lines(text))
+
+
+def synthetic_output(size):
+    """Console output shaped like show datapath session: echo, table rows, prompt."""
+    random.seed(size)
+    rows = ["show datapath session\r\n", "Datapath Session Table Entries\r\n", "\r\n"]
+    length = 0
+    while length < size:
+        row = "192.168.1.{:<5} 192.168.1.{:<6} 17   {:<5} {:<5} 0/0      0    0   1   tunnel 29   {:<4} 0         0         FYI\r\n".format(
+            random.randrange(255), random.randrange(255), random.randrange(65535), random.randrange(65535), random.randrange(100))
+        rows.append(row)
+        length += len(row)
+    rows.append("(AOS-SAN-JOSE-C1) #")
+    return "".join(rows)
+
+
+def measure(function, text):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(text)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+parser = argparse.ArgumentParser(description="Output compaction benchmark")
+parser.add_argument("--sizes", default="1,4,16", help="Comma separated output sizes in MB")
+args = parser.parse_args()
+
+print(f"{'size':>8} {'method':<16} {'seconds':>8} {'peak MB':>8} {'x input':>8}")
+for megabytes in [float(size) for size in args.sizes.split(",")]:
+    text = synthetic_output(int(megabytes * 1024 * 1024))
+    assert legacy_compact(text) == compact_output(text)
+    for name, function in (("legacy", legacy_compact), ("compact_output", compact_output),
+                           ("iter_output_lines", count_lines)):
+        elapsed, peak = measure(function, text)
+        print(f"{megabytes:>6}MB {name:<16} {elapsed:>8.3f} {peak / 2**20:>8.1f} {peak / len(text):>8.2f}")
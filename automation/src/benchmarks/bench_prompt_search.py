@@ -0,0 +1,67 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.append("../")
+
+from pexpect.fdpexpect import fdspawn
+
+from ewifi.libs.console import compile_prompt, spawn_console
+
+PROMPT = "(AOS-SAN-JOSE-C1) #"
+ROW = "192.168.1.10    192.168.1.3     17   8209  8419  0/0      0    0   1   tunnel 29   11   0         0         FYCI\r\n"
+
+
+class Pipe:
+    """Read end of a pipe, shaped like an open serial device."""
+
+    def __init__(self, fd):
+        self.fd = fd
+
+    def fileno(self):
+        return self.fd
+
+
+def feed(fd, size):
+    rows = ROW * (size // len(ROW) + 1)
+    data = ("show datapath session\r\n" + rows[:size] + PROMPT).encode()
+    for offset in range(0, len(data), 4096):
+        os.write(fd, data[offset:offset + 4096])
+    os.close(fd)
+
+
+def read_until_prompt(tuned, size):
+    read_fd, write_fd = os.pipe()
+    writer = threading.Thread(target=feed, args=(write_fd, size))
+    writer.start()
+    start = time.perf_counter()
+    if tuned:
+        p = spawn_console(Pipe(read_fd))
+        p.expect(compile_prompt(PROMPT), timeout=600)
+    else:
+        p = fdspawn(Pipe(read_fd), encoding="utf-8", codec_errors="replace", maxread=4092)
+        p.expect("#", timeout=600)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    os.close(read_fd)
+    assert len(p.before) >= size
+    return elapsed
+
+
+parser = argparse.ArgumentParser(description="Console prompt search benchmark")
+parser.add_argument("--sizes", default="10,100,1000,10000", help="Comma separated output sizes in KB")
+parser.add_argument("--legacy-max", type=int, default=1000, help="Largest size in KB run with legacy settings")
+args = parser.parse_args()
+
+print(f"{'size KB':>8} {'legacy s':>10} {'tuned s':>10} {'tuned us/KB':>12}")
+for kilobytes in [int(size) for size in args.sizes.split(",")]:
+    size = kilobytes * 1024
+    legacy = read_until_prompt(False, size) if kilobytes <= args.legacy_max else None
+    tuned = read_until_prompt(True, size)
+    legacy_text = f"{legacy:>10.3f}" if legacy is not None else f"{'skipped':>10}"
+    print(f"{kilobytes:>8} {legacy_text} {tuned:>10.3f} {tuned * 1e6 / kilobytes:>12.1f}")
@@ -0,0 +1,194 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+from array import array
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Vocabulary:
+    """Maps categorical values (AP names, ESSIDs, roles) to dense integer codes"""
+
+    def __init__(self):
+        self._codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        return self._codes.get(value, -1)
+
+
+class SnapshotAnalytics:
+    """Columnar store of parsed user-table and AP database snapshots.
+
+    Every client of every snapshot becomes one row of integer columns
+    (snapshot, AP, ESSID, role); the per-snapshot AP database is kept the
+    same way. Counts and trends are computed with NumPy over whole columns,
+    so the cost is a few array passes regardless of the number of snapshots.
+    """
+
+    def __init__(self):
+        self.aps = Vocabulary()
+        self.essids = Vocabulary()
+        self.roles = Vocabulary()
+        self.groups = Vocabulary()
+        self._timestamps = array("d")
+        self._user_columns = {key: array("l") for key in ("snapshot", "ap", "essid", "role")}
+        self._ap_columns = {key: array("l") for key in ("snapshot", "ap", "group", "up")}
+        self._frozen = None
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def add_snapshot(self, timestamp, users, aps=()):
+        """
+        Appends one poll of the controller
+
+        :param float timestamp: Poll time in seconds since epoch
+        :param users: Rows of ewifi.libs.parsers.parse_user_table
+        :param aps: Rows of ewifi.libs.parsers.parse_ap_database
+        :return: Index of the snapshot
+        """
+
+        snapshot = len(self._timestamps)
+        self._timestamps.append(timestamp)
+
+        columns = self._user_columns
+        for user in users:
+            columns["snapshot"].append(snapshot)
+            columns["ap"].append(self.aps.code(user.get("AP name", "")))
+            columns["essid"].append(self.essids.code(user.get("ESSID", "")))
+            columns["role"].append(self.roles.code(user.get("Role", "")))
+
+        columns = self._ap_columns
+        for ap in aps:
+            columns["snapshot"].append(snapshot)
+            columns["ap"].append(self.aps.code(ap.get("Name", "")))
+            columns["group"].append(self.groups.code(ap.get("Group", "")))
+            columns["up"].append(ap.get("Status", "").startswith("Up"))
+
+        self._frozen = None
+        return snapshot
+
+    def _arrays(self):
+        if self._frozen is None:
+            frozen = {"timestamp": np.frombuffer(self._timestamps, dtype=np.float64).copy()}
+            for prefix, columns in (("user", self._user_columns), ("ap", self._ap_columns)):
+                for key, column in columns.items():
+                    frozen[f"{prefix}_{key}"] = np.frombuffer(column, dtype=np.dtype(f"i{column.itemsize}")).copy()
+            self._frozen = frozen
+        return self._frozen
+
+    @property
+    def timestamps(self):
+        return self._arrays()["timestamp"]
+
+    def _matrix(self, column, vocabulary):
+        """Counts rows per (snapshot, category) with a single bincount."""
+
+        arrays = self._arrays()
+        width = max(len(vocabulary), 1)
+        flat = arrays["user_snapshot"] * width + arrays[f"user_{column}"]
+        counts = np.bincount(flat, minlength=len(self) * width)
+        return counts.reshape(len(self), width)
+
+    def clients_per_ap(self):
+        """
+        Client count of every AP in every snapshot
+
+        :return: Integer matrix of shape (snapshots, APs), columns ordered as aps.values
+        """
+
+        return self._matrix("ap", self.aps)
+
+    def clients_per_essid(self):
+        """
+        Client count of every ESSID in every snapshot
+
+        :return: Integer matrix of shape (snapshots, ESSIDs), columns ordered as essids.values
+        """
+
+        return self._matrix("essid", self.essids)
+
+    def clients_per_role(self):
+        """
+        Client count of every user role in every snapshot
+
+        :return: Integer matrix of shape (snapshots, roles), columns ordered as roles.values
+        """
+
+        return self._matrix("role", self.roles)
+
+    def aps_up(self):
+        """
+        Number of APs up per AP group in every snapshot
+
+        :return: Integer matrix of shape (snapshots, groups), columns ordered as groups.values
+        """
+
+        arrays = self._arrays()
+        width = max(len(self.groups), 1)
+        up = arrays["ap_up"].astype(bool)
+        flat = arrays["ap_snapshot"][up] * width + arrays["ap_group"][up]
+        return np.bincount(flat, minlength=len(self) * width).reshape(len(self), width)
+
+    def distribution(self, matrix, vocabulary, snapshot=-1):
+        """
+        Share of clients per category in one snapshot
+
+        :param matrix: Result of one of the clients_per_* methods
+        :param vocabulary: Vocabulary matching the matrix columns
+        :param int snapshot: Snapshot index, latest by default
+        :return: Dictionary of category to fraction of clients
+        """
+
+        if not len(self):
+            return {}
+        row = matrix[snapshot]
+        total = row.sum()
+        if not total:
+            return {}
+        return {value: float(count / total) for value, count in zip(vocabulary.values, row) if count}
+
+    def trend(self, matrix):
+        """
+        Summary statistics of every column of a snapshot matrix
+
+        The slope is the least squares fit of the count over time, per hour.
+
+        :param matrix: Result of one of the clients_per_* methods
+        :return: Dictionary of statistic name to array with one value per column
+        """
+
+        values = np.asarray(matrix, dtype=np.float64)
+        if not len(values):
+            empty = np.zeros(values.shape[1] if values.ndim == 2 else 0)
+            return {key: empty for key in ("mean", "std", "min", "max", "p95", "slope_per_hour")}
+
+        hours = (self.timestamps - self.timestamps[0]) / 3600.0
+        centered = hours - hours.mean()
+        variance = (centered ** 2).sum()
+        if variance:
+            slope = centered @ (values - values.mean(axis=0)) / variance
+        else:
+            slope = np.zeros(values.shape[1])
+        return {
+            "mean": values.mean(axis=0),
+            "std": values.std(axis=0),
+            "min": values.min(axis=0),
+            "max": values.max(axis=0),
+            "p95": np.percentile(values, 95, axis=0),
+            "slope_per_hour": slope,
+        }
@@ -0,0 +1,323 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from ewifi.libs.errors import ControllerError, FrameworkError, SerialTimeoutError, SetupError
+from ewifi.libs.parsers import (parse_ap_database, parse_auth_tracebuf, parse_essids, parse_parameters, parse_table,
+                                parse_user_table)
+from ewifi.libs.topology import parse_switches, parse_vrrp
+
+logger = logging.getLogger(__name__)
+
+API_HOST = "127.0.0.1"
+API_PORT = 8080
+POLL_INTERVAL_SECONDS = 60
+MAX_REQUEST_LINE = 8192
+MAX_HEADERS = 100
+# Request bodies are read and discarded up to this size; larger ones close the connection.
+MAX_BODY = 64 * 1024
+
+# Resource name to the AurubaController show method and the parser of its output.
+RESOURCES = {
+    "user-table": ("show_user_table", parse_user_table),
+    "ap-database": ("show_ap_database", parse_ap_database),
+    "essids": ("show_essids", parse_essids),
+    "auth-tracebuf": ("show_auth_tracebuf", parse_auth_tracebuf),
+    "vlan": ("show_vlan", parse_table),
+    "port-status": ("show_port_status", parse_table),
+    "license": ("show_license", parse_table),
+    "virtual-aps": ("list_wlan_virtual_ap", parse_table),
+    "switches": ("show_switches", lambda output: list(parse_switches(output).values())),
+    "vrrp": ("show_vrrp", lambda output: [dict(router, id=key) for key, router in parse_vrrp(output).items()]),
+    "control-plane-security": ("show_control_plane_security", parse_parameters),
+}
+
+# Short query parameters accepted as filters on a resource's columns.
+FILTER_ALIASES = {
+    "user-table": {"ap": "AP name", "essid": "ESSID", "mac": "MAC", "ip": "IP", "role": "Role", "bssid": "BSSID"},
+    "ap-database": {"name": "Name", "group": "Group", "status": "Status", "ip": "IP Address"},
+    "auth-tracebuf": {"mac": "station", "station": "station", "bssid": "bssid", "event": "event"},
+    "essids": {"essid": "ESSID"},
+}
+RESERVED_PARAMETERS = ("fresh",)
+
+# Errors of a controller fetch; polling carries on and fresh requests get a 502.
+FETCH_ERRORS = (ControllerError, FrameworkError, SetupError, SerialTimeoutError, OSError)
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+def envelope(name, resource, fetched, data):
+    return {"controller": name, "resource": resource, "fetched": fetched, "data": data}
+
+
+class CachedResource:
+    """Parsed show output with its response body serialized once, and its entity tag"""
+
+    __slots__ = ("data", "body", "etag", "fetched")
+
+    def __init__(self, name, resource, data, fetched):
+        self.data = data
+        self.fetched = fetched
+        encoded = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        head = json.dumps(envelope(name, resource, fetched, None), separators=(",", ":")).encode("utf-8")
+        self.body = head[:-len(b"null}")] + encoded + b"}"
+        # Tagged by content only, so a poll returning the same rows keeps the tag.
+        self.etag = '"' + hashlib.sha1(encoded).hexdigest() + '"'
+
+
+def _column(resource, parameter, row):
+    column = FILTER_ALIASES.get(resource, {}).get(parameter)
+    if column:
+        return column
+    wanted = parameter.replace("-", " ").replace("_", " ").lower()
+    for key in row:
+        if key.lower() == wanted:
+            return key
+    return None
+
+
+def filter_rows(resource, rows, filters):
+    """
+    Rows whose columns equal every filter value, case insensitively
+
+    :param str resource: Resource name
+    :param list rows: Parsed rows
+    :param dict filters: Query parameter to value
+    :return: List of matching rows
+    """
+
+    if not filters or not isinstance(rows, list):
+        return rows
+    matched = []
+    for row in rows:
+        for parameter, value in filters.items():
+            column = _column(resource, parameter, row)
+            if column is None or str(row.get(column, "")).lower() != value.lower():
+                break
+        else:
+            matched.append(row)
+    return matched
+
+
+class StateService:
+    """Cache of parsed controller state kept current by background pollers
+
+    Every (controller, resource) pair is polled in the background every
+    interval seconds; commands to one controller are serialized and run in
+    a worker thread so the event loop never blocks on the console.
+    Requests are answered from the cache only, unless they carry fresh=1.
+    """
+
+    def __init__(self, controllers, resources=None, interval=POLL_INTERVAL_SECONDS, clock=time.time):
+        """
+        Constructs StateService
+
+        :param dict controllers: Controller name to AurubaController
+        :param resources: Resource names to poll, all of RESOURCES by default
+        :param float interval: Seconds between polls of one resource
+        """
+
+        self.controllers = controllers
+        self.resources = list(resources or RESOURCES)
+        self.interval = interval
+        self._clock = clock
+        self._cache = {}
+        self._locks = {}
+        self._tasks = []
+
+    def _lock(self, name):
+        lock = self._locks.get(name)
+        if lock is None:
+            lock = self._locks[name] = asyncio.Lock()
+        return lock
+
+    async def fetch(self, name, resource):
+        """
+        Runs the show command of a resource and caches the parsed result
+
+        :return: Instance of CachedResource
+        """
+
+        method, parser = RESOURCES[resource]
+        controller = self.controllers[name]
+        async with self._lock(name):
+            output = await asyncio.get_running_loop().run_in_executor(None, getattr(controller, method))
+        cached = self._cache[(name, resource)] = CachedResource(name, resource, parser(output), self._clock())
+        return cached
+
+    def cached(self, name, resource):
+        return self._cache.get((name, resource))
+
+    async def _poll(self, name, resource):
+        while True:
+            try:
+                await self.fetch(name, resource)
+            except FETCH_ERRORS as error:
+                logger.warning("%s: Unable to refresh %s: %s", name, resource, error)
+            except Exception:
+                # E.g. a parser choking on unexpected output; the next poll may well succeed.
+                logger.exception("%s: Unexpected error refreshing %s", name, resource)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        for name in self.controllers:
+            for resource in self.resources:
+                self._tasks.append(asyncio.ensure_future(self._poll(name, resource)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def index(self):
+        now = self._clock()
+        return {name: {resource: {"age": now - self._cache[(name, resource)].fetched}
+                       for resource in self.resources if (name, resource) in self._cache}
+                for name in self.controllers}
+
+
+class ApiServer:
+    """Minimal HTTP/1.1 JSON API over a StateService
+
+    GET /controllers lists the controllers and the age of their cached
+    resources. GET /controllers/{name}/{resource} returns the cached rows;
+    query parameters filter on columns (e.g. ?ap=ap1 on user-table) and
+    fresh=1 reads the controller first. Responses carry an ETag and a
+    matching If-None-Match is answered with 304.
+    """
+
+    def __init__(self, service, host=API_HOST, port=API_PORT):
+        self.service = service
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self.service.start()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=MAX_REQUEST_LINE)
+        logger.info("Serving controller state on http://%s:%d", self.host, self.port)
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.service.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                for _ in range(MAX_HEADERS):
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                parts = request_line.decode("latin-1").split()
+                if len(parts) != 3:
+                    await self._respond(writer, 400, {"error": "malformed request"}, close=True)
+                    break
+                method, target, version = parts
+                close = version == "HTTP/1.0" or headers.get("connection", "").lower() == "close"
+                if not await self._discard_body(reader, headers):
+                    # The end of the body is unknown, so the next request cannot be found.
+                    close = True
+                status, payload, etag = await self._route(method, target, headers)
+                await self._respond(writer, status, payload, etag, close)
+                if close:
+                    break
+        except (ValueError, asyncio.LimitOverrunError):
+            # Line longer than MAX_REQUEST_LINE, readline raises ValueError for it.
+            try:
+                await self._respond(writer, 400, {"error": "request line or header too long"}, close=True)
+            except ConnectionError:
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _discard_body(reader, headers):
+        """
+        Skips the request body, none of the routes takes one
+
+        :return: True if the connection is positioned on the next request
+        """
+
+        if "transfer-encoding" in headers:
+            return False
+        length = headers.get("content-length", "0").strip() or "0"
+        if not length.isdigit() or int(length) > MAX_BODY:
+            return False
+        if int(length):
+            await reader.readexactly(int(length))
+        return True
+
+    async def _route(self, method, target, headers):
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}, None
+        url = urlsplit(target)
+        path = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if path == ["controllers"]:
+            return 200, self.service.index(), None
+        if len(path) != 3 or path[0] != "controllers":
+            return 404, {"error": "unknown path"}, None
+        name, resource = path[1], path[2]
+        if name not in self.service.controllers:
+            return 404, {"error": f"unknown controller {name}"}, None
+        if resource not in RESOURCES:
+            return 404, {"error": f"unknown resource {resource}", "resources": sorted(RESOURCES)}, None
+
+        cached = self.service.cached(name, resource)
+        if query.get("fresh") in ("1", "true", "yes"):
+            try:
+                cached = await self.service.fetch(name, resource)
+            except FETCH_ERRORS as error:
+                return 502, {"error": str(error)}, None
+        if cached is None:
+            return 503, {"error": f"{resource} of {name} not polled yet, retry or ask with fresh=1"}, None
+
+        filters = {key: value for key, value in query.items() if key not in RESERVED_PARAMETERS}
+        etag = cached.etag
+        if filters:
+            etag = '"' + hashlib.sha1((cached.etag + json.dumps(sorted(filters.items()))).encode()).hexdigest() + '"'
+        if headers.get("if-none-match") == etag:
+            return 304, None, etag
+        if not filters:
+            return 200, cached, etag
+        return 200, envelope(name, resource, cached.fetched, filter_rows(resource, cached.data, filters)), etag
+
+    async def _respond(self, writer, status, payload, etag=None, close=False):
+        if isinstance(payload, CachedResource):
+            body = payload.body
+        elif payload is None:
+            body = b""
+        else:
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: " + ("close" if close else "keep-alive")]
+        if etag:
+            head.append(f"ETag: {etag}")
+        if status == 503:
+            head.append("Retry-After: 5")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (body if status != 304 else b""))
+        await writer.drain()
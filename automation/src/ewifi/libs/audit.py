@@ -0,0 +1,210 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ewifi.libs.common import ConfigureReader
+from ewifi.libs.errors import ControllerError, FrameworkError, SerialTimeoutError, SetupError
+from ewifi.libs.parsers import iter_table, parse_control_plane_security, parse_parameters, parse_table
+
+logger = logging.getLogger(__name__)
+
+AUDIT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "configure", "audit_rules.yaml")
+
+PASS = "pass"
+FAIL = "fail"
+ERROR = "error"
+
+CHECKS = ("equals", "not_equals", "in", "not_in", "matches", "not_matches", "min", "max")
+
+
+def _ssid_profiles(controller, outputs):
+    names = [row["Name"] for row in iter_table(outputs["show wlan ssid-profile"]) if row.get("Name")]
+    if not names:
+        return []
+    details = controller.run_batch([f"show wlan ssid-profile {name}" for name in names])
+    return [dict(parse_parameters(output), Name=name) for name, output in zip(names, details)]
+
+
+# Source name to the commands it needs and the function building it from their outputs.
+SOURCES = {
+    "control-plane-security": (["show control-plane-security"],
+                               lambda controller, outputs: parse_control_plane_security(
+                                   outputs["show control-plane-security"])),
+    "license": (["show license"], lambda controller, outputs: parse_table(outputs["show license"])),
+    "ssid-profiles": (["show wlan ssid-profile"], _ssid_profiles),
+    "vlan": (["show vlan"], lambda controller, outputs: parse_table(outputs["show vlan"])),
+    "virtual-aps": (["show wlan virtual-ap"], lambda controller, outputs: parse_table(outputs["show wlan virtual-ap"])),
+}
+
+
+class Rule:
+    """Declarative compliance check on one parsed source"""
+
+    __slots__ = ("id", "description", "severity", "source", "parameter", "field", "subject", "checks")
+
+    def __init__(self, id, source, description="", severity="medium", parameter=None, field=None, subject=None,
+                 **checks):
+        if source not in SOURCES:
+            raise FrameworkError(f"Rule {id}: unknown source {source}")
+        if (parameter is None) == (field is None):
+            raise FrameworkError(f"Rule {id}: give exactly one of parameter or field")
+        unknown = set(checks) - set(CHECKS)
+        if unknown or not checks:
+            raise FrameworkError(f"Rule {id}: unknown or missing checks {sorted(unknown)}")
+        self.id = id
+        self.description = description
+        self.severity = severity
+        self.source = source
+        self.parameter = parameter
+        self.field = field
+        self.subject = subject
+        self.checks = {name: re.compile(value) if name.endswith("matches") else value
+                       for name, value in checks.items()}
+
+    def violations(self, value):
+        """
+        Checks a value
+
+        :param str value: Value read from the source, None if absent
+        :return: List of the checks it fails, empty if compliant
+        """
+
+        failed = []
+        for name, expected in self.checks.items():
+            if value is None:
+                failed.append(name)
+            elif name == "equals" and value != str(expected):
+                failed.append(name)
+            elif name == "not_equals" and value == str(expected):
+                failed.append(name)
+            elif name == "in" and value not in [str(item) for item in expected]:
+                failed.append(name)
+            elif name == "not_in" and value in [str(item) for item in expected]:
+                failed.append(name)
+            elif name == "matches" and not expected.search(value):
+                failed.append(name)
+            elif name == "not_matches" and expected.search(value):
+                failed.append(name)
+            elif name in ("min", "max"):
+                number = re.match(r"-?\d+(\.\d+)?", value)
+                if not number or (name == "min" and float(number.group(0)) < expected) or \
+                        (name == "max" and float(number.group(0)) > expected):
+                    failed.append(name)
+        return failed
+
+    def expected(self):
+        return {name: value.pattern if hasattr(value, "pattern") else value for name, value in self.checks.items()}
+
+
+def load_rules(rules_file=AUDIT_RULES_FILE):
+    """
+    Loads audit rules
+
+    :param str rules_file: Rules file in YAML format
+    :return: List of Rule
+    """
+
+    content = ConfigureReader(rules_file) or {}
+    rules = [Rule(**entry) for entry in content.get("rules", [])]
+    if len({rule.id for rule in rules}) != len(rules):
+        raise FrameworkError(f"Duplicate rule IDs in {rules_file}")
+    return rules
+
+
+def fetch_sources(controller, names):
+    """
+    Reads the sources once, with every command they need in one serial session
+
+    :param controller: Instance of AurubaController
+    :param names: Source names
+    :return: Dictionary of source name to parsed state
+    """
+
+    names = sorted(set(names))
+    commands = sorted({command for name in names for command in SOURCES[name][0]})
+    outputs = dict(zip(commands, controller.run_batch(commands)))
+    return {name: SOURCES[name][1](controller, outputs) for name in names}
+
+
+def evaluate(name, rules, state):
+    """
+    Evaluates rules against the parsed state of a controller
+
+    :param str name: Controller name
+    :param rules: List of Rule
+    :param dict state: Source name to parsed state
+    :return: List of finding dictionaries
+    """
+
+    findings = []
+    for rule in rules:
+        base = {"controller": name, "rule": rule.id, "severity": rule.severity, "description": rule.description,
+                "expected": rule.expected()}
+        data = state.get(rule.source)
+        if rule.parameter is not None:
+            # Parameter sources are keyed in lower case, see parse_control_plane_security.
+            value = data.get(rule.parameter.lower()) if isinstance(data, dict) else None
+            failed = rule.violations(value)
+            findings.append(dict(base, subject=rule.parameter, actual=value, status=FAIL if failed else PASS,
+                                 failed=failed))
+            continue
+        rows = data if isinstance(data, list) else []
+        for index, row in enumerate(rows):
+            value = row.get(rule.field)
+            failed = rule.violations(value)
+            findings.append(dict(base, subject=row.get(rule.subject, str(index)) if rule.subject else str(index),
+                                 actual=value, status=FAIL if failed else PASS, failed=failed))
+    return findings
+
+
+def audit_controller(name, conf_file, rules, controller_class=None):
+    """
+    Audits one controller
+
+    :return: List of finding dictionaries, a single error finding if the controller could not be read
+    """
+
+    if controller_class is None:
+        from ewifi.libs.controller import AurubaController as controller_class
+    start = time.monotonic()
+    try:
+        controller = controller_class(conf_file, name=name)
+        state = fetch_sources(controller, [rule.source for rule in rules])
+    except (ControllerError, FrameworkError, SetupError, SerialTimeoutError, OSError) as error:
+        logger.error("%s: Audit failed: %s", name, error)
+        return [{"controller": name, "rule": None, "status": ERROR, "error": str(error)}]
+    findings = evaluate(name, rules, state)
+    logger.info("%s: Audited %d rules in %.1f seconds, %d failures", name, len(rules), time.monotonic() - start,
+                sum(1 for finding in findings if finding["status"] == FAIL))
+    return findings
+
+
+def audit_fleet(targets, rules, max_workers=None, controller_class=None):
+    """
+    Audits controllers concurrently, so the audit takes as long as the slowest one
+
+    :param dict targets: Controller name to configuration file
+    :param rules: List of Rule
+    :param int max_workers: Controllers audited at once, all of them by default
+    :return: List of finding dictionaries ordered by controller
+    """
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+        futures = {name: executor.submit(audit_controller, name, conf_file, rules, controller_class)
+                   for name, conf_file in sorted(targets.items())}
+        findings = []
+        for name, future in futures.items():
+            try:
+                findings.extend(future.result())
+            except Exception as error:
+                # One controller failing in an unexpected way must not lose the findings of the others.
+                logger.exception("%s: Audit crashed", name)
+                findings.append({"controller": name, "rule": None, "status": ERROR, "error": f"audit crashed: {error}"})
+        return findings
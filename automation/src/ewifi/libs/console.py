@@ -0,0 +1,68 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import functools
+import re
+
+from pexpect.fdpexpect import fdspawn
+
+# Bytes requested from the console per read.
+CONSOLE_READ_BYTES = 64 * 1024
+# Trailing characters of the console buffer searched for the prompt. A
+# prompt is only ever at the very end of what the controller has sent, so
+# the search never needs to rescan earlier output.
+PROMPT_SEARCH_WINDOW = 1024
+
+
+# What may follow a prompt at the end of the buffer: whitespace, line
+# breaks, ANSI escape sequences and other control characters.
+PROMPT_TRAILER = r"(?:\x1b\[[0-9;?]*[A-Za-z]|[\s\x00-\x1f\x7f])*\Z"
+
+
+@functools.lru_cache(maxsize=None)
+def _compile(prompt):
+    return re.compile("(" + re.escape(prompt.strip()) + ")" + PROMPT_TRAILER)
+
+
+def compile_prompt(prompt):
+    """
+    Compiles a prompt into a regex anchored at the end of the console buffer
+
+    Only whitespace and control characters, ANSI sequences included, may
+    follow the prompt.
+
+    :param prompt: Prompt string, list of prompt strings, or a pexpect EOF/TIMEOUT
+    :return: Compiled pattern, or list of them, usable by pexpect expect()
+    """
+
+    if isinstance(prompt, str):
+        return _compile(prompt)
+    if isinstance(prompt, (list, tuple)):
+        return [compile_prompt(item) for item in prompt]
+    return prompt
+
+
+def matched_prompt(console):
+    """
+    Prompt matched by the last expect(), without what trailed it
+
+    :param console: pexpect spawn after a successful expect()
+    :return: Prompt text, or console.after for EOF/TIMEOUT and plain patterns
+    """
+
+    match = console.match
+    if isinstance(match, re.Match) and match.re.groups:
+        return match.group(1)
+    return console.after
+
+
+def spawn_console(device):
+    """
+    Wraps an open serial device for prompt driven command exchange
+
+    :param device: Open serial device (anything with fileno())
+    :return: pexpect fdspawn reading in large chunks with a bounded search window
+    """
+
+    return fdspawn(device, encoding="utf-8", codec_errors="replace",
+                   maxread=CONSOLE_READ_BYTES, searchwindowsize=PROMPT_SEARCH_WINDOW)
@@ -3,83 +3,259 @@
 
 import logging
 import os 
+import threading
+import time
 
 from ewifi.libs.common import ConfigureReader
-from ewifi.libs.serial_access import AurubaControllerSerial
-from ewifi.libs.errors import FrameworkError, SetupError
+from ewifi.libs.output import compact_output, iter_output_lines
+from ewifi.libs.output_archive import ARCHIVED_COMMANDS, OutputArchive
+from ewifi.libs.output_logging import log_output
+from ewifi.libs.profiling import span
+from ewifi.libs.latency import command_key
+from ewifi.libs.resilience import call_with_retry, circuit_breaker, is_read_only, retry_policy, single_flight
+from ewifi.libs.serial_access import PROMPT, AurubaControllerSerial, ReplaySerial
+from ewifi.libs.session_archive import SessionRecorder
+from ewifi.libs.transaction import ConfigTransaction
+from ewifi.libs.version_cache import VERSION_FILE, version_cache
+from ewifi.libs.errors import FrameworkError, SerialTimeoutError, SetupError
 
 logger = logging.getLogger(__name__)
 
+# Serial failures worth retrying; anything else is a bug or a setup issue.
+RETRYABLE_ERRORS = (SerialTimeoutError, OSError)
+# Failures of the controller or its connection that retrying at once will not fix.
+FAILURE_ERRORS = (SetupError,)
+
+
+def _no_wait(seconds):
+    pass
+
 
 class AurubaController:
-    """Class for controlling Auruba controller via serial communication."""
+    """Class for controlling Auruba controller via serial communication.
 
-    def __init__(self, conf_file, name=""):
+    By default the constructor checks the console, logs in, enables admin
+    and configure mode and reads the version. In lazy mode (lazy=True, or
+    "lazy: true" in the configuration) it only reads the configuration:
+    login and admin mode happen before the first command, configure mode
+    before the first command that is not read-only, and the version only
+    when asked for. Versions are cached across runs, see VersionCache.
+    """
+
+    def __init__(self, conf_file, name="", lazy=None):
         if not name:
             name = "Controller"
         self._name = name
 
+        with span(f"AurubaController {self._name}", "init"):
+            self._initialize(conf_file, lazy)
+
+    def _initialize(self, conf_file, lazy):
         logger.info("%s: Creating Aruba controller", self._name)
         if not os.path.exists(conf_file):
             logger.error("%s: Configuration file %s not found", self._name, conf_file)
             raise FrameworkError("Configuration file unfound")
         
-        self.configuration = ConfigureReader(conf_file)
-        self.serial = AurubaControllerSerial(self.configuration.get("device_id", None),
-                                             self.configuration.get("baudrate"),
-                                             self.configuration.get("prompt"),
-                                             name=self._name)
+        with span("load configuration", "init"):
+            self.configuration = ConfigureReader(conf_file)
+        self.serial = self._serial()
         logger.debug("%s: Created serial wrapper aroung Aruba controller", self._name)
-        if not self.test_health():
+        self.breaker = circuit_breaker(self.serial.device_id or self._name)
+        self.flight = single_flight(self.serial.device_id or self._name)
+        archive = self.configuration.get("archive")
+        self.archive = OutputArchive(archive) if archive else None
+        self.lazy = self.configuration.get("lazy", False) if lazy is None else lazy
+        # Recorded sessions must hold every exchange their replay will ask for,
+        # so neither recording nor replaying reuses versions from earlier runs.
+        self.versions = version_cache(None if self.configuration.get("record") or self.configuration.get("replay")
+                                      else VERSION_FILE)
+        self._ready_lock = threading.Lock()
+        self._connected = False
+        self._configuring = False
+        if self.lazy:
+            logger.info("%s: Lazy mode, connecting on first command", self._name)
+            return
+
+        with span("test health", "init"):
+            healthy = self.test_health()
+        if not healthy:
             raise SetupError("Unhealthy controller")
-        self.serial.login(self.configuration.get("username"), self.configuration.get("password"))
-        self.serial.enable_admin_mode(self.configuration.get("admin_password"))
-        self.enable_configure_mode()
-        self.version()
+        self._connect(self.serial.state)
+        with span("enable configure mode", "init"):
+            self.enable_configure_mode()
+        with span("version", "init"):
+            self.version()
+
+    def _connect(self, status):
+        """
+        Logs in and enables admin mode, skipping what the console prompt shows is done
+
+        :param str status: Prompt just seen on the console
+        :return: None
+        """
+
+        if status not in (PROMPT.USER_MODE, PROMPT.ADMIN_MODE):
+            # Back at the login or boot loader prompt: the controller may have rebooted.
+            self.versions.invalidate(self._name)
+            with span("login", "init"):
+                self.serial.login(self.configuration.get("username"), self.configuration.get("password"), status)
+            status = self.serial.state
+        with span("enable admin mode", "init"):
+            self.serial.enable_admin_mode(self.configuration.get("admin_password"), status)
+        self._connected = True
+
+    def _ready(self, commands):
+        """Connects, and enters configure mode for configuration commands, on first need."""
+
+        configure = not all(is_read_only(command) for command in commands)
+        if self._connected and (self._configuring or not configure):
+            return
+        with self._ready_lock:
+            if not self._connected:
+                with span("connect", "init"):
+                    status = self.serial.state or self.serial.prompt_status
+                    if status is None:
+                        self.breaker.record_failure()
+                        raise SetupError("Unhealthy controller")
+                    self._connect(status)
+            if configure and not self._configuring:
+                with span("enable configure mode", "init"):
+                    self.enable_configure_mode()
+
+    def _serial(self):
+        """
+        Serial transport selected by the configuration
+
+        A "replay" key serves a recorded session archive instead of the
+        device, at "replay_speed" times the recorded pace (0 for no delay).
+        A "record" key saves every exchange with the device to that archive.
+        """
+
+        replay = self.configuration.get("replay")
+        if replay:
+            return ReplaySerial(replay, self.configuration.get("prompt"), name=self._name,
+                                speed=self.configuration.get("replay_speed", 1.0))
+        record = self.configuration.get("record")
+        recorder = SessionRecorder(record, name=self._name) if record else None
+        return AurubaControllerSerial(self.configuration.get("device_id", None),
+                                      self.configuration.get("baudrate"),
+                                      self.configuration.get("prompt"),
+                                      name=self._name, recorder=recorder)
+
+    def _call(self, commands, function):
+        """Runs a serial exchange under the retry policy and circuit breaker."""
+        # A replay answers at once, recorded timeouts included: waiting between retries only slows it down.
+        sleep = _no_wait if isinstance(self.serial, ReplaySerial) else time.sleep
+        return call_with_retry(function, retry_policy(commands), self.breaker, RETRYABLE_ERRORS, self._name,
+                               fail_on=FAILURE_ERRORS, sleep=sleep)
+
+    def _read(self, commands, function, prompt):
+        """
+        Runs a serial exchange, sharing it with identical concurrent reads
+
+        Read-only commands answered by the regular prompt are coalesced: a
+        caller arriving while the same command is in flight on this
+        controller gets that execution's output instead of queueing its own.
+        """
+
+        if prompt is None and all(is_read_only(command) for command in commands):
+            key = tuple(command_key(command) for command in commands)
+            return self.flight.do(key, lambda: self._call(commands, function))
+        return self._call(commands, function)
 
     def run(self, command, prompt=None, timeout=None):
-        output = self.serial.run(command, prompt, timeout)
-        info = output.before.splitlines()
-        no_blank_info = [ i.strip() for i in info if i.strip() != ""]
-        return "\n".join(no_blank_info[1:-1]).strip()
-
-    def version(self):
-        output = self.run("show version")
-        info = None
-        for line in output.splitlines():
+        self._ready([command])
+        output = self._read([command], lambda: self.serial.run(command, prompt, timeout), prompt)
+        return compact_output(output.before)
+
+    def run_lines(self, command, prompt=None, timeout=None):
+        """Runs command and iterates its output lines without joining them."""
+        self._ready([command])
+        output = self._read([command], lambda: self.serial.run(command, prompt, timeout), prompt)
+        return iter_output_lines(output.before)
+
+    def run_batch(self, commands, prompt=None, timeout=None, on_output=None):
+        """
+        Runs commands over one serial session
+
+        :param on_output: Called with each command and its compacted output as soon as it is answered,
+                          an exception it raises ends the batch; such batches are never shared
+        :return: List of compacted outputs in command order
+        """
+
+        self._ready(commands)
+        if on_output is None:
+            outputs = self._read(commands, lambda: self.serial.run_batch(commands, prompt, timeout), prompt)
+        else:
+            relay = lambda command, output: on_output(command, compact_output(output.before))
+            outputs = self._call(commands, lambda: self.serial.run_batch(commands, prompt, timeout, relay))
+        return [compact_output(output.before) for output in outputs]
+
+    def _archive(self, command, output):
+        """Adds an output to the configured output archive, see OutputArchive."""
+        if self.archive is not None and command in ARCHIVED_COMMANDS:
+            self.archive.put(self._name, command, output)
+
+    def flight_stats(self):
+        """Executions and saved executions of coalesced reads on this controller."""
+        return self.flight.stats()
+
+    def transaction(self):
+        """Starts a configuration transaction, see ConfigTransaction."""
+        return ConfigTransaction(self, self._name)
+
+    def version(self, refresh=False):
+        info = None if refresh else self.versions.get(self._name, self.serial.device_id)
+        if info is not None:
+            logger.info("%s: Controller version: %s (cached)", self._name, info)
+            return info
+        for line in self.run_lines("show version"):
             if line.startswith("ArubaOS"):
                 info = line.split()[4]
                 break
         logger.info("%s: Controller version: %s", self._name, info)
+        if info is not None:
+            self.versions.put(self._name, self.serial.device_id, info)
         return info 
 
     def show_switch_software(self):
         logger.info("%s: Switch software", self._name)
         output = self.run("show switch software")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show switch software", output)
         return output
 
     def test_health(self):
         logger.info("%s: Checking if controller is healthy", self._name)
+        try:
+            prompt = self.serial.prompt_status
+        except (SetupError, OSError) as error:
+            logger.warning("%s: Controller unreachable: %s", self._name, error)
+            prompt = None
+        if prompt is None:
+            self.breaker.record_failure()
+            logger.warning("%s: Controller is not responding, circuit %s", self._name, self.breaker.state)
+            return False
+        self.breaker.record_success()
         logger.info("%s: Controller is healthy", self._name)
         return True
 
     def show_license(self):
         logger.info("%s: Getting license information", self._name)
         output = self.run("show license")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show license", output)
+        self._archive("show license", output)
         return output
 
     def show_port_status(self):
         logger.info("%s: Getting port status information", self._name)
         output = self.run("show port status")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show port status", output)
         return output
 
     def show_ip_interface_br(self):
         logger.info("%s: Getting IP interface br information", self._name)
         output = self.run("show ip interface br")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show ip interface br", output)
         return output
 
     def show_datapath_tunnel(self, tunnel_id):
@@ -89,116 +265,127 @@ class AurubaController:
         if tunnel_id:
             command+=f" tunnel-id {tunnel_id}"
         output = self.run(command)
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, command, output)
         return output
 
+    def show_datapath_tunnels(self, tunnel_ids):
+        logger.info("%s: Getting datapath tunnel information of %d tunnels", self._name, len(tunnel_ids))
+        commands = [f"show datapath tunnel tunnel-id {tunnel_id}" for tunnel_id in tunnel_ids]
+        outputs = self.run_batch(["no paging"] + commands)[1:]
+        for tunnel_id, output in zip(tunnel_ids, outputs):
+            log_output(self._name, f"show datapath tunnel tunnel-id {tunnel_id}", output)
+        return dict(zip(tunnel_ids, outputs))
+
     def show_wlan_virtual_ap(self, vap):
         logger.info("%s: Getting WlAN virtual ap information", self._name)
         output = self.run(f"show wlan virtual-ap {vap}")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, f"show wlan virtual-ap {vap}", output)
         return output
 
     def show_crypto_isakmp(self):
         logger.info("%s: Getting crypto isakmp information", self._name)
         output = self.run("show crypto isakmp sa")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show crypto isakmp sa", output)
         return output
 
     def show_auth_tracebuf(self):
         logger.info("%s: Getting auth tracebuf information", self._name)
         output = self.run("show auth-tracebuf")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show auth-tracebuf", output)
         return output
 
     def show_user_table(self):
         logger.info("%s: Getting user table information", self._name)
         output = self.run("show user-table")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show user-table", output)
+        self._archive("show user-table", output)
         return output
 
     def show_essids(self):
         logger.info("%s: Getting AP ESSID information", self._name)
         output = self.run("show ap essid")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show ap essid", output)
         return output
 
     def show_datapath_session(self):
         logger.info("%s: Getting datapath session information", self._name)
         output = self.run("no paging")
         output = self.run("show datapath session")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show datapath session", output)
         return output
 
     def show_controller_ip(self):
         logger.info("%s: Getting controller IP information", self._name)
         output = self.run("show controller-ip")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show controller-ip", output)
         return output
 
     def show_vrrp(self):
         logger.info("%s: Getting VRRP details", self._name)
         output = self.run("show vrrp")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show vrrp", output)
         return output
 
     def show_crypto_dynamic_map(self):
         logger.info("%s: Getting crypto dynamic map details", self._name)
         output = self.run("show crypto dynamic-map")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show crypto dynamic-map", output)
         return output
 
     def show_crypto_ipsec_security_associations(self):
         logger.info("%s: Getting crypto IPSec Security Associations", self._name)
         output = self.run("show crypto ipsec sa")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show crypto ipsec sa", output)
         return output
 
     def show_crypto_ipsec_max_mtu(self):
         logger.info("%s: Getting crypto IPSec max MTU", self._name)
         output = self.run("show crypto ipsec mtu")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show crypto ipsec mtu", output)
         return output
 
     def show_crypto_ipsec_map_id(self):
         logger.info("%s: Getting IPsec MAP to ID mapping.", self._name)
         output = self.run("show crypto ipsec ipsec-map-id")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show crypto ipsec ipsec-map-id", output)
         return output
 
     def show_ap_database(self):
         logger.info("%s: Getting AP database details", self._name)
         output = self.run("show ap database")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show ap database", output)
+        self._archive("show ap database", output)
         return output
 
     def list_wlan_virtual_ap(self):
         logger.info("%s: Getting WLAN virtual AP details", self._name)
         output = self.run("show wlan virtual-ap")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show wlan virtual-ap", output)
         return output
 
     def show_system(self):
         logger.info("%s: Getting system details", self._name)
         output = self.run("show system")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show system", output)
         return output
 
     def show_vlan(self):
         logger.info("%s: Getting VLAN details", self._name)
         output = self.run("show vlan")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show vlan", output)
+        self._archive("show vlan", output)
         return output
 
     def show_switches(self):
         logger.info("%s: Getting system details", self._name)
         output = self.run("show switches")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show switches", output)
         return output
 
     def show_control_plane_security(self):
         logger.info("%s: Getting Control plane security details", self._name)
         output = self.run("show control-plane-security")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show control-plane-security", output)
         return output
 
     def enable_control_plane_security(self):
@@ -233,51 +420,76 @@ class AurubaController:
     
     def show_running_config(self):
         logger.info("%s: Getting running configuration details", self._name)
-        output = self.run("show run", timeout=6000)
-        logger.info("%s: %s", self._name, output)
+        output = self.run("show run")
+        log_output(self._name, "show run", output)
+        self._archive("show run", output)
         return output
 
+    def save_running_config(self, path):
+        """
+        Streams the running configuration to a file instead of holding it in memory
+
+        Open the file with running_config.MappedConfig to parse or diff it.
+
+        :param str path: Output file, overwritten
+        :return: path
+        """
+
+        logger.info("%s: Saving running configuration to %s", self._name, path)
+        self._ready(["show run"])
+        self._call(["show run"], lambda: self.serial.run_to_file("show run", path))
+        if self.archive is not None:
+            with open(path, encoding="utf-8") as stream:
+                self.archive.put_lines(self._name, "show run", (line.rstrip("\n") for line in stream))
+        return path
+
     def show_wlan_ssid_profile(self):
         logger.info("%s: Getting WLAN SSID profiles", self._name)
         output = self.run("show wlan ssid-profile")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show wlan ssid-profile", output)
         return output
 
     def show_switchinfo(self):
         logger.info("%s: Getting switch information", self._name)
         output = self.run("show switchinfo")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show switchinfo", output)
         return output
 
     def rights(self):
         logger.info("%s: Getting controller rights", self._name)
         output = self.run("show rights")
-        logger.info(output)
+        log_output(self._name, "show rights", output)
         return output
 
     def inventory(self):
         logger.info("%s: Getting inventory details", self._name)
         output = self.run("show inventory")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show inventory", output)
         return output
 
     def show_vlan(self):
         logger.info("%s: Getting VLAN details", self._name)
         output = self.run("show vlan")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show vlan", output)
+        self._archive("show vlan", output)
         return output
 
     def show_ap(self):
         output = self.run("show ap")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show ap", output)
         return output
 
     def show_arp(self):
         output = self.run("show arp")
-        logger.info("%s: %s", self._name, output)
+        log_output(self._name, "show arp", output)
         return output
 
     def enable_configure_mode(self):
         logger.info("%s: Enabling configuring mode", self._name)
-        self.run("configure terminal")
-        self.run("no paging")
+        # Paging is turned off by the first admin session, see AurubaControllerSerial._session.
+        self._configuring = True
+        try:
+            self.run("configure terminal")
+        except Exception:
+            self._configuring = False
+            raise
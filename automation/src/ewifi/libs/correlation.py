@@ -0,0 +1,253 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+
+from ewifi.libs.output_logging import log_output
+from ewifi.libs.parsers import parse_ap_database, parse_auth_tracebuf, parse_essids, parse_user_table
+
+logger = logging.getLogger(__name__)
+
+CORRELATION_TTL_SECONDS = 30
+AUTH_HISTORY = 64
+
+# Source name to the command producing it.
+SOURCES = {
+    "users": "show user-table",
+    "aps": "show ap database",
+    "essids": "show ap essid",
+    "auth": "show auth-tracebuf",
+}
+
+
+# show ap database columns identifying the hardware behind an AP name.
+AP_IDENTITY = ("Wired MAC Address", "Serial #")
+
+
+def _event_key(event):
+    return (event["time"], event["event"], event["direction"], event["station"], event["bssid"],
+            event["id"], event["length"], event["detail"])
+
+
+def _add(index, key, value):
+    if key:
+        index.setdefault(key, set()).add(value)
+
+
+def _discard(index, key, value):
+    members = index.get(key)
+    if members is not None:
+        members.discard(value)
+        if not members:
+            del index[key]
+
+
+class CorrelationEngine:
+    """Indexed views of the user table, AP database, ESSIDs and auth trace buffer
+
+    Each view is refreshed when older than its TTL; stale views are pulled
+    together over one serial session and an output identical to the last
+    one (same digest) is not parsed again. The user table is updated per
+    client: only clients that appeared, left or changed touch the AP,
+    ESSID and BSSID indexes. Auth trace events are appended to a bounded
+    per-station history, continuing after the last event already seen, so
+    history outlives the controller's trace buffer.
+
+    Lookups are dictionary hits: client to AP, ESSID and auth history, and
+    AP or ESSID to its clients.
+    """
+
+    def __init__(self, controller, ttl=CORRELATION_TTL_SECONDS, auth_history=AUTH_HISTORY, clock=time.monotonic):
+        self.controller = controller
+        self.ttl = ttl
+        self.auth_history = auth_history
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._refreshed = {}
+        self._digests = {}
+
+        self._clients = {}
+        self._clients_by_ip = {}
+        self._clients_by_ap = {}
+        self._clients_by_essid = {}
+        self._ap_by_bssid = {}
+        self._aps = {}
+        self._essids = {}
+        self._auth = {}
+        self._last_event = None
+
+    def _stale(self, sources, force):
+        now = self._clock()
+        return [source for source in sources
+                if force or source not in self._refreshed or now - self._refreshed[source] >= self.ttl]
+
+    def refresh(self, sources=None, force=False):
+        """
+        Pulls the stale views from the controller
+
+        :param sources: Names from SOURCES, all by default
+        :param bool force: Refresh even when younger than the TTL
+        :return: List of sources whose content changed
+        """
+
+        with self._lock:
+            stale = self._stale(list(sources or SOURCES), force)
+            if not stale:
+                return []
+            outputs = self.controller.run_batch([SOURCES[source] for source in stale])
+            now = self._clock()
+            changed = []
+            for source, output in zip(stale, outputs):
+                log_output(getattr(self.controller, "_name", ""), SOURCES[source], output)
+                self._refreshed[source] = now
+                digest = hashlib.sha1(output.encode("utf-8", "replace")).digest()
+                if self._digests.get(source) == digest:
+                    continue
+                self._digests[source] = digest
+                getattr(self, f"_load_{source}")(output)
+                changed.append(source)
+            if changed:
+                logger.debug("Correlation views changed: %s", ", ".join(changed))
+            return changed
+
+    def _load_users(self, output):
+        current = {row["MAC"].lower(): row for row in parse_user_table(output)}
+        for mac, row in list(self._clients.items()):
+            if current.get(mac) != row:
+                self._unindex_client(mac, row)
+        for mac, row in current.items():
+            if self._clients.get(mac) != row:
+                self._index_client(mac, row)
+
+    def _index_client(self, mac, row):
+        self._clients[mac] = row
+        ip = row.get("IP", "")
+        if ip:
+            self._clients_by_ip[ip] = mac
+        _add(self._clients_by_ap, row.get("AP name", ""), mac)
+        _add(self._clients_by_essid, row.get("ESSID", ""), mac)
+        bssid = row.get("BSSID", "").lower()
+        if bssid and row.get("AP name"):
+            self._ap_by_bssid[bssid] = row["AP name"]
+
+    def _unindex_client(self, mac, row):
+        del self._clients[mac]
+        ip = row.get("IP", "")
+        if ip and self._clients_by_ip.get(ip) == mac:
+            del self._clients_by_ip[ip]
+        _discard(self._clients_by_ap, row.get("AP name", ""), mac)
+        _discard(self._clients_by_essid, row.get("ESSID", ""), mac)
+
+    def _load_aps(self, output):
+        previous = self._aps
+        self._aps = {row["Name"]: row for row in parse_ap_database(output)}
+        # BSSIDs are learned from user-table rows; drop those of APs that are
+        # gone or were re-provisioned on other hardware, then relearn from
+        # the clients currently associated.
+        moved = {name for name, row in self._aps.items() if name in previous and
+                 any(row.get(key) != previous[name].get(key) for key in AP_IDENTITY)}
+        self._ap_by_bssid = {bssid: name for bssid, name in self._ap_by_bssid.items()
+                             if name in self._aps and name not in moved}
+        for row in self._clients.values():
+            bssid = row.get("BSSID", "").lower()
+            if bssid and row.get("AP name"):
+                self._ap_by_bssid[bssid] = row["AP name"]
+
+    def _load_essids(self, output):
+        self._essids = {row["ESSID"]: row for row in parse_essids(output)}
+
+    def _load_auth(self, output):
+        events = parse_auth_tracebuf(output)
+        start = 0
+        if self._last_event is not None:
+            for index in range(len(events) - 1, -1, -1):
+                if _event_key(events[index]) == self._last_event:
+                    start = index + 1
+                    break
+        for event in events[start:]:
+            station = event["station"]
+            if station:
+                history = self._auth.get(station)
+                if history is None:
+                    history = self._auth[station] = deque(maxlen=self.auth_history)
+                history.append(event)
+        if events:
+            self._last_event = _event_key(events[-1])
+
+    def client(self, mac):
+        """
+        Everything known about a client
+
+        :param str mac: Client MAC address
+        :return: Dictionary with user (user-table row or None), ap, essid and auth history
+        """
+
+        mac = mac.lower()
+        with self._lock:
+            user = self._clients.get(mac)
+            history = list(self._auth.get(mac, ()))
+            ap_name = user.get("AP name") if user else None
+            if not ap_name and history:
+                ap_name = self._ap_by_bssid.get(history[-1]["bssid"])
+            return {"mac": mac, "user": user, "ap": self._aps.get(ap_name) if ap_name else None, "ap_name": ap_name,
+                    "essid": self._essids.get(user.get("ESSID")) if user else None, "auth": history}
+
+    def client_by_ip(self, ip):
+        with self._lock:
+            mac = self._clients_by_ip.get(ip)
+        return self.client(mac) if mac else None
+
+    def clients_on_ap(self, ap_name):
+        with self._lock:
+            return sorted(self._clients_by_ap.get(ap_name, ()))
+
+    def clients_on_essid(self, essid):
+        with self._lock:
+            return sorted(self._clients_by_essid.get(essid, ()))
+
+    def ap(self, name):
+        with self._lock:
+            return self._aps.get(name)
+
+    def ap_for_bssid(self, bssid):
+        with self._lock:
+            return self._ap_by_bssid.get(bssid.lower())
+
+    def essid(self, name):
+        with self._lock:
+            return self._essids.get(name)
+
+    def diagnose(self, mac):
+        """
+        Explains the state of a client from the joined views
+
+        :param str mac: Client MAC address
+        :return: Dictionary of the client view with a list of findings
+        """
+
+        view = self.client(mac)
+        findings = []
+        if view["user"] is None:
+            findings.append("not in user table")
+            if view["auth"]:
+                last = view["auth"][-1]
+                findings.append(f"last auth event {last['event']} at {last['time']} {last['detail']}".strip())
+            else:
+                findings.append("no auth trace events")
+        if view["ap_name"] and view["ap"] is None:
+            findings.append(f"AP {view['ap_name']} not in AP database")
+        elif view["ap"] and not view["ap"].get("Status", "").startswith("Up"):
+            findings.append(f"AP {view['ap_name']} is {view['ap'].get('Status')}")
+        if view["user"] is not None and view["essid"] is None:
+            findings.append(f"ESSID {view['user'].get('ESSID')} not advertised")
+        view["findings"] = findings
+        return view
+
+    def stats(self):
+        with self._lock:
+            return {"clients": len(self._clients), "aps": len(self._aps), "essids": len(self._essids),
+                    "auth_stations": len(self._auth)}
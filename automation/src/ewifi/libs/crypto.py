@@ -0,0 +1,403 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import hashlib
+import heapq
+import logging
+import re
+import time
+from datetime import datetime
+
+from ewifi.libs.parsers import iter_table
+
+logger = logging.getLogger(__name__)
+
+CRYPTO_MAP_TTL_SECONDS = 3600
+DEFAULT_SA_LIFETIME_SECONDS = 7200
+
+DYNAMIC_MAP_HEADER = re.compile(r"Dynamic Map Name:\s*(\S+)(?:\s+Priority:\s*(\d+))?")
+SA_LIFETIME = re.compile(r"Security association lifetime:\s*(\d+)\s*seconds", re.I)
+PFS = re.compile(r"PFS[^:]*:\s*(\S+)")
+TRANSFORM_SETS = re.compile(r"Transform sets:\s*\{?\s*([^}]*)\}?")
+
+
+def parse_start_time(text, now=None):
+    """
+    Converts an ArubaOS start time such as "Nov 23 07:36:25" to epoch seconds
+
+    The controller prints no year, so the most recent matching date is used.
+
+    :param str text: Start time column value
+    :param float now: Reference time in seconds since epoch
+    :return: Seconds since epoch, None if the value is not a timestamp
+    """
+
+    if now is None:
+        now = time.time()
+    current = datetime.fromtimestamp(now)
+    try:
+        stamp = datetime.strptime(f"{current.year} {' '.join(text.split())}", "%Y %b %d %H:%M:%S")
+    except ValueError:
+        return None
+    if stamp > current:
+        stamp = stamp.replace(year=current.year - 1)
+    return stamp.timestamp()
+
+
+def _header(key):
+    return re.sub(r"[^a-z0-9]", "", key.lower())
+
+
+def _column(row, *names):
+    """
+    Value of the first of names that is a column of the row
+
+    Headers are compared lower cased without blanks or punctuation, so
+    "SPI(IN/OUT)" is "spiinout" and "Map ID" is "mapid".
+
+    :param dict row: Table row keyed by column header
+    :param names: Normalized header names, in order of preference
+    :return: Column value, empty if none of the columns is present
+    """
+
+    values = {_header(key): value for key, value in row.items()}
+    for name in names:
+        if name in values:
+            return values[name]
+    return ""
+
+
+class IsakmpSA:
+    """ISAKMP (IKE) security association"""
+
+    __slots__ = ("initiator", "responder", "flags", "start", "private_ip")
+
+    def __init__(self, initiator, responder, flags, start, private_ip):
+        self.initiator = initiator
+        self.responder = responder
+        self.flags = flags
+        self.start = start
+        self.private_ip = private_ip
+
+    @property
+    def peer(self):
+        """Remote end of the SA; the controller is the responder unless flagged initiator."""
+
+        return self.responder if self.flags.startswith("i") else self.initiator
+
+
+class IpsecSA:
+    """IPsec security association linked to its peer and crypto map"""
+
+    __slots__ = ("initiator", "responder", "spi_in", "spi_out", "flags", "start", "inner_ip", "map_ref",
+                 "peer", "map", "expires")
+
+    def __init__(self, initiator, responder, spi_in, spi_out, flags, start, inner_ip, map_ref=""):
+        self.initiator = initiator
+        self.responder = responder
+        self.spi_in = spi_in
+        self.spi_out = spi_out
+        self.flags = flags
+        self.start = start
+        self.inner_ip = inner_ip
+        self.map_ref = map_ref
+        self.peer = initiator
+        self.map = None
+        self.expires = None
+
+
+class CryptoMap:
+    """Dynamic crypto map and its ipsec-map-id"""
+
+    __slots__ = ("name", "priority", "lifetime", "pfs", "transforms", "map_id")
+
+    def __init__(self, name, priority=None, lifetime=DEFAULT_SA_LIFETIME_SECONDS, pfs=None, transforms=()):
+        self.name = name
+        self.priority = priority
+        self.lifetime = lifetime
+        self.pfs = pfs
+        self.transforms = tuple(transforms)
+        self.map_id = None
+
+
+class CryptoPeer:
+    """All crypto state towards one peer IP"""
+
+    __slots__ = ("ip", "isakmp", "ipsec", "map")
+
+    def __init__(self, ip):
+        self.ip = ip
+        self.isakmp = None
+        self.ipsec = []
+        self.map = None
+
+
+def parse_isakmp(output, now=None):
+    """
+    Parses show crypto isakmp sa
+
+    :param str output: Command output
+    :param float now: Reference time for start times without year
+    :return: List of IsakmpSA
+    """
+
+    sas = []
+    for row in iter_table(output):
+        initiator = _column(row, "initiatorip", "initiator")
+        if not initiator:
+            continue
+        sas.append(IsakmpSA(initiator, _column(row, "responderip", "responder"), _column(row, "flags"),
+                            parse_start_time(_column(row, "starttime", "start"), now),
+                            _column(row, "privateip", "private")))
+    return sas
+
+
+def parse_ipsec_sa(output, now=None):
+    """
+    Parses show crypto ipsec sa
+
+    :param str output: Command output
+    :param float now: Reference time for start times without year
+    :return: List of IpsecSA
+    """
+
+    sas = []
+    for row in iter_table(output):
+        initiator = _column(row, "initiatorip", "initiator")
+        if not initiator:
+            continue
+        spi_in, _, spi_out = _column(row, "spiinout", "spi").partition("/")
+        sas.append(IpsecSA(initiator, _column(row, "responderip", "responder"), spi_in, spi_out, _column(row, "flags"),
+                           parse_start_time(_column(row, "starttime", "start"), now), _column(row, "innerip", "inner"),
+                           _column(row, "mapname", "mapid", "map")))
+    return sas
+
+
+def parse_dynamic_map(output):
+    """
+    Parses show crypto dynamic-map
+
+    :param str output: Command output
+    :return: Dictionary of map name to CryptoMap
+    """
+
+    maps = {}
+    current = None
+    for line in output.splitlines():
+        match = DYNAMIC_MAP_HEADER.search(line)
+        if match:
+            priority = int(match.group(2)) if match.group(2) else None
+            current = maps[match.group(1)] = CryptoMap(match.group(1), priority)
+            continue
+        if current is None:
+            continue
+        match = SA_LIFETIME.search(line)
+        if match:
+            current.lifetime = int(match.group(1))
+            continue
+        match = PFS.search(line)
+        if match:
+            current.pfs = match.group(1)
+            continue
+        match = TRANSFORM_SETS.search(line)
+        if match:
+            current.transforms = tuple(match.group(1).split())
+    return maps
+
+
+def parse_ipsec_map_id(output):
+    """
+    Parses show crypto ipsec ipsec-map-id
+
+    :param str output: Command output
+    :return: Dictionary of map name to map ID
+    """
+
+    ids = {}
+    for row in iter_table(output):
+        name = _column(row, "mapname", "name", "map")
+        map_id = _column(row, "mapid", "id")
+        if name:
+            ids[name] = map_id
+    return ids
+
+
+def parse_ipsec_map_peers(output):
+    """
+    Peers listed by show crypto ipsec ipsec-map-id
+
+    :param str output: Command output
+    :return: Dictionary of peer IP to map name, empty if the table has no peer column
+    """
+
+    peers = {}
+    for row in iter_table(output):
+        name = _column(row, "mapname", "name", "map")
+        peer = _column(row, "peerip", "peer", "remoteip", "dstip")
+        if name and peer:
+            peers[peer] = name
+    return peers
+
+
+class CryptoState:
+    """Linked IPsec/ISAKMP state of a controller.
+
+    Security associations are indexed by peer IP and by SPI (inbound and
+    outbound) and linked to the crypto map that governs their lifetime: the
+    map the SA names by name or ipsec-map-id, else the map listing its
+    peer, else the highest priority map.
+    The map configuration changes rarely, so refresh() re-pulls only the SA
+    tables unless the maps are older than map_ttl or a refresh is forced.
+    Expiry times are kept in a heap for rekey monitoring.
+    """
+
+    def __init__(self, controller, map_ttl=CRYPTO_MAP_TTL_SECONDS, clock=time.time):
+        self.controller = controller
+        self.map_ttl = map_ttl
+        self._clock = clock
+        self.maps = {}
+        self.map_ids = {}
+        self.map_peers = {}
+        self.by_peer = {}
+        self.by_spi = {}
+        self._expiry = []
+        self._maps_pulled = None
+        self._maps_digest = None
+
+    def _default_map(self):
+        if not self.maps:
+            return None
+        return min(self.maps.values(), key=lambda cmap: (cmap.priority is None, cmap.priority or 0))
+
+    def _map_of(self, peer, map_ref, by_id):
+        """
+        Crypto map of an SA or peer
+
+        :param str peer: Peer IP
+        :param str map_ref: Map name or ipsec-map-id given by the SA, empty if none
+        :param dict by_id: Map ID to CryptoMap
+        :return: Instance of CryptoMap, None if the map is unknown
+        """
+
+        if map_ref:
+            cmap = self.maps.get(map_ref) or by_id.get(map_ref)
+            if cmap is not None:
+                return cmap
+        return self.maps.get(self.map_peers.get(peer))
+
+    def refresh_maps(self):
+        """Re-pulls the dynamic map and ipsec-map-id configuration."""
+
+        dynamic_map = self.controller.show_crypto_dynamic_map()
+        map_ids = self.controller.show_crypto_ipsec_map_id()
+        self._maps_pulled = self._clock()
+        digest = hashlib.sha1((dynamic_map + "\0" + map_ids).encode()).hexdigest()
+        if digest == self._maps_digest:
+            logger.debug("Crypto map configuration unchanged")
+            return False
+
+        self._maps_digest = digest
+        self.maps = parse_dynamic_map(dynamic_map)
+        self.map_ids = parse_ipsec_map_id(map_ids)
+        self.map_peers = parse_ipsec_map_peers(map_ids)
+        for name, cmap in self.maps.items():
+            cmap.map_id = self.map_ids.get(name)
+        return True
+
+    def _maps_stale(self):
+        if self._maps_pulled is None:
+            return True
+        return self._clock() - self._maps_pulled >= self.map_ttl
+
+    def refresh(self, force_maps=False):
+        """
+        Re-pulls the SA tables and relinks them
+
+        :param bool force_maps: Re-pull the crypto map configuration as well
+        :return: None
+        """
+
+        if force_maps or self._maps_stale():
+            self.refresh_maps()
+
+        now = self._clock()
+        isakmp = parse_isakmp(self.controller.show_crypto_isakmp(), now)
+        ipsec = parse_ipsec_sa(self.controller.show_crypto_ipsec_security_associations(), now)
+        self._link(isakmp, ipsec)
+        logger.debug("Linked %d ISAKMP and %d IPsec SAs", len(isakmp), len(ipsec))
+
+    def _link(self, isakmp, ipsec):
+        peers = {}
+        for sa in isakmp:
+            peer = peers.setdefault(sa.peer, CryptoPeer(sa.peer))
+            peer.isakmp = sa
+
+        by_id = {cmap.map_id: cmap for cmap in self.maps.values() if cmap.map_id}
+        default_map = self._default_map()
+        by_spi = {}
+        expiry = []
+        for sa in ipsec:
+            if sa.responder in peers and sa.initiator not in peers:
+                sa.peer = sa.responder
+            peer = peers.setdefault(sa.peer, CryptoPeer(sa.peer))
+            peer.ipsec.append(sa)
+            sa.map = self._map_of(sa.peer, sa.map_ref, by_id)
+            if sa.map is not None and peer.map is None:
+                peer.map = sa.map
+            sa.map = sa.map or default_map
+            lifetime = sa.map.lifetime if sa.map else DEFAULT_SA_LIFETIME_SECONDS
+            if sa.start is not None:
+                sa.expires = sa.start + lifetime
+                # Keyed by an SPI indexed in by_spi; an SA with neither SPI cannot be looked up.
+                spi = sa.spi_in or sa.spi_out
+                if spi:
+                    expiry.append((sa.expires, spi, sa.peer))
+            for spi in (sa.spi_in, sa.spi_out):
+                if spi:
+                    by_spi[spi] = sa
+
+        for peer in peers.values():
+            if peer.map is None:
+                peer.map = self._map_of(peer.ip, "", by_id) or default_map
+
+        heapq.heapify(expiry)
+        self.by_peer = peers
+        self.by_spi = by_spi
+        self._expiry = expiry
+
+    def peer(self, ip):
+        return self.by_peer.get(ip)
+
+    def sa(self, spi):
+        return self.by_spi.get(spi)
+
+    def next_expiry(self):
+        """
+        Earliest expiring IPsec SA
+
+        :return: Tuple of (expiry epoch seconds, inbound SPI or outbound if none, peer IP), None without SAs
+        """
+
+        return self._expiry[0] if self._expiry else None
+
+    def expiring(self, within):
+        """
+        IPsec SAs due for rekey within the given number of seconds
+
+        :param float within: Look ahead in seconds
+        :return: List of IpsecSA ordered by expiry
+        """
+
+        deadline = self._clock() + within
+        heap = self._expiry
+        due = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            (expires, spi, _), index = heapq.heappop(frontier)
+            if expires > deadline:
+                break
+            due.append(self.by_spi[spi])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return due
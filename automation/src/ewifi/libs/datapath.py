@@ -0,0 +1,171 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import time
+
+from ewifi.libs.parsers import iter_table
+
+logger = logging.getLogger(__name__)
+
+COUNTER_BITS = 32
+COUNTER_COLUMNS = ("Decaps", "Encaps", "Heartbeats")
+COUNTER_KEYWORDS = ("bytes", "pkts", "packets")
+
+
+def _is_counter(column):
+    return column in COUNTER_COLUMNS or any(word in column.lower() for word in COUNTER_KEYWORDS)
+
+
+class Tunnel:
+    """Datapath tunnel entry with its counters"""
+
+    __slots__ = ("tunnel_id", "source", "destination", "protocol", "type", "mtu", "vlan", "bssid",
+                 "flags", "counters")
+
+    def __init__(self, tunnel_id, source="", destination="", protocol="", type="", mtu="", vlan="",
+                 bssid="", flags="", counters=None):
+        self.tunnel_id = tunnel_id
+        self.source = source
+        self.destination = destination
+        self.protocol = protocol
+        self.type = type
+        self.mtu = mtu
+        self.vlan = vlan
+        self.bssid = bssid
+        self.flags = flags
+        self.counters = counters or {}
+
+
+def parse_datapath_tunnels(output):
+    """
+    Parses show datapath tunnel
+
+    Numeric packet and byte columns (Decaps, Encaps, Heartbeats and any
+    Bytes/Pkts column of the release) are collected into Tunnel.counters.
+
+    :param str output: Command output
+    :return: Dictionary of tunnel ID to Tunnel
+    """
+
+    tunnels = {}
+    for row in iter_table(output):
+        tunnel_id = row.get("#", "")
+        if not tunnel_id.isdigit():
+            continue
+        counters = {}
+        for column, value in row.items():
+            if _is_counter(column) and value.isdigit():
+                counters[column] = int(value)
+        tunnels[int(tunnel_id)] = Tunnel(int(tunnel_id),
+                                         source=row.get("Source", ""),
+                                         destination=row.get("Destination", ""),
+                                         protocol=row.get("Prt", ""),
+                                         type=row.get("Type", ""),
+                                         mtu=row.get("MTU", ""),
+                                         vlan=row.get("VLAN", ""),
+                                         bssid=row.get("BSSID", ""),
+                                         flags=row.get("Flags", ""),
+                                         counters=counters)
+    return tunnels
+
+
+def counter_delta(previous, current, bits=COUNTER_BITS):
+    """
+    Increase of a monotonic counter between two samples
+
+    A decrease is taken as a wrap when the previous value was in the upper
+    half of the counter range, otherwise as a reset of the counter.
+
+    :param int previous: Earlier counter value
+    :param int current: Later counter value
+    :param int bits: Counter width
+    :return: Increase of the counter
+    """
+
+    if current >= previous:
+        return current - previous
+    modulus = 1 << bits
+    if previous >= modulus // 2 and previous < modulus:
+        return current + modulus - previous
+    return current
+
+
+class TunnelRates:
+    """Result of one TunnelSampler sample"""
+
+    def __init__(self, timestamp, tunnels, rates, appeared, vanished):
+        self.timestamp = timestamp
+        self.tunnels = tunnels
+        self.rates = rates
+        self.appeared = appeared
+        self.vanished = vanished
+
+
+class TunnelSampler:
+    """Samples datapath tunnel counters and computes per tunnel rates.
+
+    Each sample is compared with the previous sample of the same tunnel;
+    rates are counter increases per second. Tunnels missing from a full
+    sample are reported as vanished and forgotten, new tunnels are reported
+    as appeared and get rates from their second sample on.
+    """
+
+    def __init__(self, controller, counter_bits=COUNTER_BITS, clock=time.time):
+        self.controller = controller
+        self.counter_bits = counter_bits
+        self._clock = clock
+        self._last = {}
+
+    def _fetch(self, tunnel_ids):
+        if tunnel_ids is None:
+            return parse_datapath_tunnels(self.controller.show_datapath_tunnel(None))
+        tunnels = {}
+        for output in self.controller.show_datapath_tunnels(list(tunnel_ids)).values():
+            tunnels.update(parse_datapath_tunnels(output))
+        return tunnels
+
+    def sample(self, tunnel_ids=None):
+        """
+        Pulls tunnel counters and computes rates since the previous sample
+
+        :param tunnel_ids: Tunnel IDs to fetch in one serial session, all tunnels if None
+        :return: Instance of TunnelRates
+        """
+
+        now = self._clock()
+        tunnels = self._fetch(tunnel_ids)
+        return self.update(tunnels, now, requested=tunnel_ids)
+
+    def update(self, tunnels, timestamp, requested=None):
+        """
+        Computes rates from already parsed tunnels
+
+        :param dict tunnels: Tunnel ID to Tunnel, as from parse_datapath_tunnels
+        :param float timestamp: Sample time in seconds since epoch
+        :param requested: Tunnel IDs the sample was limited to, None for a full table
+        :return: Instance of TunnelRates
+        """
+
+        expected = self._last.keys() if requested is None else {int(i) for i in requested} & self._last.keys()
+        vanished = sorted(set(expected) - tunnels.keys())
+        for tunnel_id in vanished:
+            del self._last[tunnel_id]
+
+        rates = {}
+        appeared = []
+        for tunnel_id, tunnel in tunnels.items():
+            previous = self._last.get(tunnel_id)
+            self._last[tunnel_id] = (timestamp, tunnel.counters)
+            if previous is None:
+                appeared.append(tunnel_id)
+                continue
+            elapsed = timestamp - previous[0]
+            if elapsed <= 0:
+                continue
+            rates[tunnel_id] = {column: counter_delta(previous[1][column], value, self.counter_bits) / elapsed
+                                for column, value in tunnel.counters.items() if column in previous[1]}
+
+        if vanished:
+            logger.info("Tunnels vanished: %s", ", ".join(map(str, vanished)))
+        return TunnelRates(timestamp, tunnels, rates, sorted(appeared), vanished)
@@ -18,3 +18,6 @@ class SerialCommandError(Exception):
 
 class SerialTimeoutError(Exception):
     """Raises serial timeout error."""
+
+class CircuitOpenError(ControllerError):
+    """Raises when commands to an unhealthy controller are shed."""
@@ -0,0 +1,322 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import re
+
+import numpy as np
+
+from ewifi.libs.parsers import iter_table, parse_ap_database, parse_user_table
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 86400.0
+FORECAST_HORIZON_DAYS = 90
+# Share of a limit at which a forecast crossing is reported before it happens.
+WARNING_RATIO = 0.9
+
+METRICS = ("aps", "aps_up", "users")
+
+# License service type prefix, lower case, to the metric it limits. AP and
+# PEF licenses are both counted per AP.
+LICENSE_METRICS = {
+    "access points": "aps",
+    "ap": "aps",
+    "policy enforcement firewall": "aps",
+    "pef": "aps",
+}
+
+SERVICE_COUNT = re.compile(r"^(.*?):\s*(\d+)\s*$")
+
+OK = "ok"
+WARNING = "warning"
+FORECAST = "forecast"
+EXCEEDED = "exceeded"
+
+
+def parse_license(output):
+    """
+    Licensed counts per service from show license, expired licenses left out
+
+    :param str output: Command output
+    :return: Dictionary of service type to total licensed count
+    """
+
+    services = {}
+    for row in iter_table(output):
+        match = SERVICE_COUNT.match(row.get("Service Type", ""))
+        if not match or "expired" in row.get("Expires", "").lower():
+            continue
+        service = match.group(1).strip()
+        services[service] = services.get(service, 0) + int(match.group(2))
+    return services
+
+
+def license_limits(services):
+    """
+    Limits per metric from licensed counts
+
+    :param dict services: Result of parse_license
+    :return: Dictionary of (metric, limit name) to limit
+    """
+
+    limits = {}
+    for service, count in services.items():
+        lowered = service.lower()
+        for prefix, metric in LICENSE_METRICS.items():
+            if lowered == prefix or lowered.startswith(prefix + " "):
+                limits[(metric, service)] = count
+                break
+    return limits
+
+
+def usage(users, aps):
+    """
+    Load of a controller
+
+    :param users: Rows of parse_user_table
+    :param aps: Rows of parse_ap_database
+    :return: Dictionary of metric to value
+    """
+
+    return {"aps": len(aps), "aps_up": sum(1 for ap in aps if ap.get("Status", "").startswith("Up")),
+            "users": len(users)}
+
+
+class LinearTrends:
+    """Least squares lines of several series, kept as running sums
+
+    Each series keeps its count and the sums of t, y, t*t and t*y, so new
+    samples are folded in with a few array operations and the fit is a
+    closed form over the sums; the history is never refitted. With a half
+    life, older samples are weighted down exponentially so the line
+    follows recent growth. Time is in days since the first sample.
+    """
+
+    def __init__(self, names, half_life_days=None):
+        self.names = list(names)
+        self.half_life_days = half_life_days
+        self.origin = None
+        self.last = None
+        self.latest = None
+        self.samples = 0
+        self._sums = np.zeros((5, len(self.names)))
+
+    def update(self, timestamps, values):
+        """
+        Folds in new samples
+
+        :param timestamps: Sample times in seconds since epoch, ascending and after the previous ones
+        :param values: Matrix of shape (samples, series), NaN where a series has no value
+        :return: None
+        """
+
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(timestamps), len(self.names))
+        if not len(timestamps):
+            return
+        if self.origin is None:
+            self.origin = timestamps[0]
+        days = (timestamps - self.origin) / SECONDS_PER_DAY
+        latest = days[-1]
+        weights = np.ones(len(days))
+        if self.half_life_days:
+            if self.last is not None:
+                self._sums *= 0.5 ** ((latest - self.last) / self.half_life_days)
+            weights = 0.5 ** ((latest - days) / self.half_life_days)
+        present = ~np.isnan(values)
+        weights = np.where(present, weights[:, None], 0.0)
+        values = np.where(present, values, 0.0)
+        days = days[:, None]
+        self._sums += np.stack([weights.sum(axis=0), (weights * days).sum(axis=0), (weights * values).sum(axis=0),
+                                (weights * days * days).sum(axis=0), (weights * days * values).sum(axis=0)])
+        self.last = latest
+        self.latest = float(timestamps[-1])
+        self.samples += len(timestamps)
+
+    def fit(self):
+        """
+        Current lines
+
+        :return: Tuple of (slope per day, intercept at origin) arrays, NaN for series without two distinct times
+        """
+
+        n, st, sy, stt, sty = self._sums
+        with np.errstate(divide="ignore", invalid="ignore"):
+            denominator = n * stt - st * st
+            slope = np.where(np.abs(denominator) > 1e-12, (n * sty - st * sy) / denominator, np.nan)
+            intercept = np.where(n > 0, (sy - np.nan_to_num(slope) * st) / n, np.nan)
+        return slope, intercept
+
+    def predict(self, timestamp):
+        slope, intercept = self.fit()
+        return intercept + slope * ((timestamp - self.origin) / SECONDS_PER_DAY)
+
+    def crossing(self, limits, series=None):
+        """
+        When lines reach limits
+
+        :param limits: Array of limits
+        :param series: Index of the series of each limit, one limit per series in order if not given
+        :return: Array of times in seconds since epoch, NaN if the line is flat or falling
+        """
+
+        slope, intercept = self.fit()
+        if series is not None:
+            slope, intercept = slope[series], intercept[series]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days = np.where(slope > 0, (np.asarray(limits, dtype=np.float64) - intercept) / slope, np.nan)
+        return self.origin + days * SECONDS_PER_DAY
+
+
+class CapacityForecaster:
+    """Projects controller load against license and capacity limits
+
+    One LinearTrends per controller follows the METRICS series. Samples
+    are added as they are polled or read back from an OutputArchive;
+    only samples newer than the last one are folded in.
+    """
+
+    def __init__(self, half_life_days=None, horizon_days=FORECAST_HORIZON_DAYS, warning_ratio=WARNING_RATIO):
+        self.half_life_days = half_life_days
+        self.horizon_days = horizon_days
+        self.warning_ratio = warning_ratio
+        self.trends = {}
+        self.current = {}
+        self.limits = {}
+
+    def _trend(self, controller):
+        trend = self.trends.get(controller)
+        if trend is None:
+            trend = self.trends[controller] = LinearTrends(METRICS, self.half_life_days)
+        return trend
+
+    def last_sample(self, controller):
+        trend = self.trends.get(controller)
+        return trend.latest if trend is not None else None
+
+    def add(self, controller, timestamps, samples):
+        """
+        Adds samples of a controller
+
+        :param str controller: Controller name
+        :param timestamps: Sample times in seconds since epoch, ascending
+        :param samples: Dictionaries of metric to value, as returned by usage()
+        :return: Number of samples added, older ones are skipped
+        """
+
+        last = self.last_sample(controller)
+        rows = [(timestamp, sample) for timestamp, sample in zip(timestamps, samples)
+                if last is None or timestamp > last]
+        if not rows:
+            return 0
+        values = np.array([[sample.get(metric, np.nan) for metric in METRICS] for _, sample in rows],
+                          dtype=np.float64)
+        self._trend(controller).update([timestamp for timestamp, _ in rows], values)
+        self.current[controller] = dict(rows[-1][1])
+        return len(rows)
+
+    def set_limits(self, controller, limits):
+        """
+        Sets the limits of a controller
+
+        :param str controller: Controller name
+        :param dict limits: (metric, limit name) to limit, e.g. from license_limits, or metric to limit
+        :return: None
+        """
+
+        self.limits[controller] = {key if isinstance(key, tuple) else (key, key): value
+                                   for key, value in limits.items()}
+
+    def forecast(self, now):
+        """
+        Projection of every limited metric
+
+        :param float now: Time of the forecast in seconds since epoch
+        :return: List of dictionaries with controller, metric, limit name, limit, current, slope per day,
+                 projected value at the horizon, crossing time and status
+        """
+
+        horizon = now + self.horizon_days * SECONDS_PER_DAY
+        results = []
+        for controller, limits in sorted(self.limits.items()):
+            trend = self.trends.get(controller)
+            if trend is None or not limits:
+                continue
+            keys = sorted(limits)
+            series = [METRICS.index(metric) for metric, _ in keys]
+            bounds = np.array([limits[key] for key in keys], dtype=np.float64)
+            slope = trend.fit()[0][series]
+            projected = trend.predict(horizon)[series]
+            crossing = trend.crossing(bounds, series)
+            warning = trend.crossing(bounds * self.warning_ratio, series)
+            current = self.current.get(controller, {})
+            for position, (metric, name) in enumerate(keys):
+                value = current.get(metric)
+                crosses = crossing[position]
+                if value is not None and value >= bounds[position]:
+                    status = EXCEEDED
+                elif now <= crosses <= horizon:
+                    status = FORECAST
+                elif value is not None and value >= bounds[position] * self.warning_ratio or \
+                        now <= warning[position] <= horizon:
+                    status = WARNING
+                else:
+                    status = OK
+                results.append({"controller": controller, "metric": metric, "limit_name": name,
+                                "limit": float(bounds[position]), "current": value,
+                                "slope_per_day": None if np.isnan(slope[position]) else float(slope[position]),
+                                "projected": None if np.isnan(projected[position]) else float(projected[position]),
+                                "crosses_at": None if np.isnan(crosses) else float(crosses),
+                                "status": status})
+        return results
+
+    def alerts(self, now):
+        return [result for result in self.forecast(now) if result["status"] != OK]
+
+
+def ingest_archive(forecaster, archive, controller):
+    """
+    Feeds a forecaster with the archived outputs of a controller
+
+    Every show user-table capture newer than the last sample becomes a
+    sample, with the show ap database capture in effect at that time.
+    Captures whose content did not change are not read back nor parsed
+    again. The latest show license capture sets the license limits.
+
+    :param forecaster: Instance of CapacityForecaster
+    :param archive: Instance of ewifi.libs.output_archive.OutputArchive
+    :param str controller: Controller name
+    :return: Number of samples added
+    """
+
+    last = forecaster.last_sample(controller)
+    timestamps = []
+    samples = []
+    parsed = {}
+
+    def rows(command, capture, parser):
+        if capture is None:
+            return []
+        if parsed.get(command, (None,))[0] != capture.recipe:
+            parsed[command] = (capture.recipe, parser("".join(archive.iter_text(capture))))
+        return parsed[command][1]
+
+    for entry in archive.history(controller, "show user-table"):
+        if last is not None and entry["time"] <= last:
+            continue
+        users = rows("show user-table", archive.lookup(controller, "show user-table", entry["time"]),
+                     parse_user_table)
+        aps = rows("show ap database", archive.lookup(controller, "show ap database", entry["time"]),
+                   parse_ap_database)
+        timestamps.append(entry["time"])
+        samples.append(usage(users, aps))
+
+    licenses = archive.get(controller, "show license")
+    if licenses is not None:
+        limits = dict(forecaster.limits.get(controller, {}))
+        limits.update(license_limits(parse_license(licenses)))
+        forecaster.set_limits(controller, limits)
+    added = forecaster.add(controller, timestamps, samples)
+    logger.info("%s: %d archived samples added to the forecast", controller, added)
+    return added
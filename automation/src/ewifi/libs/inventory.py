@@ -0,0 +1,239 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import os
+import pickle
+
+from ewifi.libs.common import ConfigureReader
+from ewifi.libs.errors import FrameworkError
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_CACHE_SUFFIX = ".cache"
+INVENTORY_CACHE_VERSION = 2
+
+
+class ControllerEntry:
+    """Single controller listed in the fleet inventory"""
+
+    __slots__ = ("name", "config", "site", "model", "groups", "tags")
+
+    def __init__(self, name, config, site=None, model=None, groups=(), tags=()):
+        self.name = name
+        self.config = config
+        self.site = site
+        self.model = model
+        self.groups = tuple(groups)
+        self.tags = tuple(tags)
+
+    def __repr__(self):
+        return f"ControllerEntry({self.name!r}, site={self.site!r}, model={self.model!r})"
+
+
+def _names(entry, key, value):
+    """
+    Group or tag names of an inventory entry
+
+    A single name may be given without a list, e.g. ``tags: lab``.
+
+    :param str entry: Controller name, for errors
+    :param str key: "groups" or "tags"
+    :param value: Value read from the inventory
+    :return: Tuple of names
+    :raises FrameworkError: If the value is neither a name nor a list of names
+    """
+
+    if value is None:
+        return ()
+    if isinstance(value, (str, int, float)):
+        return (str(value),)
+    if isinstance(value, list) and all(isinstance(item, (str, int, float)) for item in value):
+        return tuple(str(item) for item in value)
+    raise FrameworkError(f"Inventory entry {entry}: {key} should be a name or a list of names")
+
+
+class FleetInventory:
+    """Indexed view of every controller listed in a fleet inventory file.
+
+    The inventory file is a YAML document with a ``controllers`` list. Each
+    entry names a controller and references its per-controller configuration
+    file (device ID and credentials), relative to the inventory file::
+
+        controllers:
+          - name: controller1
+            config: controller1.yaml
+            site: san-jose
+            model: 650
+            groups: [cmpe-295a]
+            tags: [lab, vrrp-master]
+
+    Entries are indexed by name, site, model, group and tag once at load
+    time, so selections are set intersections and never scan the fleet.
+    """
+
+    def __init__(self, entries, base_dir="."):
+        self.base_dir = base_dir
+        self._by_name = {}
+        self._by_site = {}
+        self._by_model = {}
+        self._by_group = {}
+        self._by_tag = {}
+        for entry in entries:
+            if entry.name in self._by_name:
+                raise FrameworkError(f"Duplicate controller {entry.name} in inventory")
+            self._by_name[entry.name] = entry
+            self._by_site.setdefault(entry.site, set()).add(entry.name)
+            self._by_model.setdefault(entry.model, set()).add(entry.name)
+            for group in entry.groups:
+                self._by_group.setdefault(group, set()).add(entry.name)
+            for tag in entry.tags:
+                self._by_tag.setdefault(tag, set()).add(entry.name)
+
+        for index in (self._by_site, self._by_model, self._by_group, self._by_tag):
+            for key in index:
+                index[key] = frozenset(index[key])
+
+    @classmethod
+    def load(cls, inventory_file, use_cache=True):
+        """
+        Loads the fleet inventory, reusing the on-disk index when it is current
+
+        :param str inventory_file: Fleet inventory file in YAML format
+        :param bool use_cache: Read and write the pickled index next to the file
+        :return: Instance of FleetInventory
+        :raises FrameworkError: On unfound or malformed inventory file
+        """
+
+        if not os.path.exists(inventory_file):
+            logger.error("Inventory file %s not found", inventory_file)
+            raise FrameworkError("Inventory file doesn't exist")
+
+        stat = os.stat(inventory_file)
+        stamp = (INVENTORY_CACHE_VERSION, stat.st_mtime_ns, stat.st_size)
+        cache_file = inventory_file + INVENTORY_CACHE_SUFFIX
+        if use_cache and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "rb") as cache:
+                    cached_stamp, inventory = pickle.load(cache)
+                if cached_stamp == stamp:
+                    logger.debug("Loaded inventory index from %s", cache_file)
+                    inventory.base_dir = os.path.dirname(os.path.abspath(inventory_file))
+                    return inventory
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+                logger.warning("Ignoring unreadable inventory index %s", cache_file)
+
+        inventory = cls.from_yaml(inventory_file)
+        if use_cache:
+            try:
+                with open(cache_file, "wb") as cache:
+                    pickle.dump((stamp, inventory), cache, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError:
+                logger.warning("Unable to write inventory index %s", cache_file)
+        return inventory
+
+    @classmethod
+    def from_yaml(cls, inventory_file):
+        """
+        Builds the inventory index from the YAML file
+
+        :param str inventory_file: Fleet inventory file in YAML format
+        :return: Instance of FleetInventory
+        :raises FrameworkError: On malformed inventory file
+        """
+
+        content = ConfigureReader(inventory_file) or {}
+        controllers = content.get("controllers")
+        if not isinstance(controllers, list):
+            raise FrameworkError("Inventory file should list controllers")
+
+        entries = []
+        for item in controllers:
+            if not isinstance(item, dict) or not item.get("name"):
+                raise FrameworkError("Inventory entry without controller name")
+            name = str(item["name"])
+            model = item.get("model")
+            entries.append(ControllerEntry(name,
+                                           item.get("config", f"{name}.yaml"),
+                                           site=item.get("site"),
+                                           model=str(model) if model is not None else None,
+                                           groups=_names(name, "groups", item.get("groups")),
+                                           tags=_names(name, "tags", item.get("tags"))))
+        logger.info("Indexed %d controllers from %s", len(entries), inventory_file)
+        return cls(entries, base_dir=os.path.dirname(os.path.abspath(inventory_file)))
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def __iter__(self):
+        return iter(self._by_name.values())
+
+    def get(self, name):
+        """
+        Get inventory entry of a controller
+
+        :param str name: Name of the controller
+        :return: Instance of ControllerEntry
+        :raises FrameworkError: If controller is not in the inventory
+        """
+
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise FrameworkError(f"Controller {name} not in inventory") from None
+
+    def config_file(self, name):
+        """
+        Get the configuration file referenced by a controller entry
+
+        :param str name: Name of the controller
+        :return: Path to the controller configuration file
+        """
+
+        return os.path.join(self.base_dir, self.get(name).config)
+
+    def sites(self):
+        return sorted(site for site in self._by_site if site is not None)
+
+    def models(self):
+        return sorted(model for model in self._by_model if model is not None)
+
+    def groups(self):
+        return sorted(self._by_group)
+
+    def tags(self):
+        return sorted(self._by_tag)
+
+    def select(self, site=None, model=None, group=None, tags=()):
+        """
+        Select controllers matching every given criterion
+
+        :param str site: Site of the controllers
+        :param model: Controller model, e.g. 650
+        :param str group: Group the controllers belong to
+        :param tags: Tags the controllers should all carry
+        :return: Sorted list of ControllerEntry
+        """
+
+        if isinstance(tags, str):
+            tags = (tags,)
+
+        candidates = []
+        if site is not None:
+            candidates.append(self._by_site.get(site, frozenset()))
+        if model is not None:
+            candidates.append(self._by_model.get(str(model), frozenset()))
+        if group is not None:
+            candidates.append(self._by_group.get(group, frozenset()))
+        for tag in tags:
+            candidates.append(self._by_tag.get(tag, frozenset()))
+
+        if not candidates:
+            names = self._by_name.keys()
+        else:
+            candidates.sort(key=len)
+            names = candidates[0].intersection(*candidates[1:])
+        return [self._by_name[name] for name in sorted(names)]
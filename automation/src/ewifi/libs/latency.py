@@ -0,0 +1,207 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+LATENCY_FILE = os.path.expanduser("~/.ewifi/latency.json")
+LATENCY_SAMPLES = 200
+# Samples needed before the model overrides the default timeout.
+LATENCY_MIN_SAMPLES = 5
+TIMEOUT_MARGIN = 2.0
+TIMEOUT_SLACK_SECONDS = 2.0
+TIMEOUT_FLOOR_SECONDS = 3.0
+TIMEOUT_CEILING_SECONDS = 6000.0
+SAVE_EVERY = 20
+
+
+def command_key(command):
+    return " ".join(command.split())
+
+
+def percentile(values, fraction):
+    """Nearest rank percentile of a non-empty sequence."""
+
+    ordered = sorted(values)
+    index = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[index]
+
+
+class CommandLatency:
+    """Recent (seconds, output characters) samples of one command on one controller"""
+
+    def __init__(self, samples=()):
+        self.samples = deque(samples, maxlen=LATENCY_SAMPLES)
+        self.timeouts = 0
+
+    def fit(self):
+        """
+        Least squares fit of seconds = fixed + per_char * characters
+
+        :return: Tuple of (fixed seconds, seconds per character)
+        """
+
+        count = len(self.samples)
+        mean_size = sum(size for _, size in self.samples) / count
+        mean_seconds = sum(seconds for seconds, _ in self.samples) / count
+        variance = sum((size - mean_size) ** 2 for _, size in self.samples)
+        if not variance:
+            return mean_seconds, 0.0
+        covariance = sum((size - mean_size) * (seconds - mean_seconds) for seconds, size in self.samples)
+        per_char = max(0.0, covariance / variance)
+        return max(0.0, mean_seconds - per_char * mean_size), per_char
+
+    def timeout(self, default):
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return default
+        seconds = [sample for sample, _ in self.samples]
+        sizes = [size for _, size in self.samples]
+        fixed, per_char = self.fit()
+        expected = max(percentile(seconds, 0.99), fixed + per_char * max(sizes))
+        timeout = TIMEOUT_MARGIN * expected + TIMEOUT_SLACK_SECONDS
+        return min(TIMEOUT_CEILING_SECONDS, max(TIMEOUT_FLOOR_SECONDS, timeout))
+
+    def stats(self, default):
+        seconds = [sample for sample, _ in self.samples]
+        stats = {"count": len(seconds), "timeouts": self.timeouts, "timeout": self.timeout(default)}
+        if seconds:
+            fixed, per_char = self.fit()
+            stats.update({"p50": percentile(seconds, 0.5), "p90": percentile(seconds, 0.9),
+                          "p99": percentile(seconds, 0.99), "max_chars": max(size for _, size in self.samples),
+                          "fixed_seconds": fixed, "chars_per_second": 1 / per_char if per_char else None})
+        return stats
+
+
+class LatencyModel:
+    """Observed command latencies per controller, used to derive timeouts.
+
+    Each command keeps its last LATENCY_SAMPLES durations together with
+    the size of the output. The timeout is a margin over the larger of the
+    99th percentile duration and the duration predicted for the largest
+    output seen, so small commands fail fast while large dumps get time
+    proportional to their size. Timeouts are recorded as samples of the
+    full timeout, which raises the next one. The model is kept in a JSON
+    file across runs.
+    """
+
+    def __init__(self, path=LATENCY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._commands = {}
+        self._unsaved = 0
+        self.load()
+
+    def _entry(self, controller, command):
+        return self._commands.setdefault(controller, {}).setdefault(command_key(command), CommandLatency())
+
+    def timeout(self, controller, command, default):
+        """
+        Timeout for the next run of a command
+
+        :param str controller: Name of the controller
+        :param str command: Command to run
+        :param float default: Timeout used until enough samples are seen
+        :return: Timeout in seconds
+        """
+
+        with self._lock:
+            entry = self._commands.get(controller, {}).get(command_key(command))
+            return entry.timeout(default) if entry else default
+
+    def record(self, controller, command, seconds, size, timed_out=False):
+        """
+        Adds an observation
+
+        :param str controller: Name of the controller
+        :param str command: Command that was run
+        :param float seconds: Time until the prompt, or the timeout
+        :param int size: Characters of output received
+        :param bool timed_out: Whether the command timed out
+        :return: None
+        """
+
+        with self._lock:
+            entry = self._entry(controller, command)
+            entry.samples.append((seconds, size))
+            if timed_out:
+                entry.timeouts += 1
+            self._unsaved += 1
+            save = self._unsaved >= SAVE_EVERY
+        if save:
+            self.save()
+
+    def stats(self, controller=None, default=None, overrides=None):
+        """
+        Latency statistics for inspection
+
+        :param str controller: Limit to one controller
+        :param float default: Default timeout reported for cold commands
+        :param dict overrides: Command key to the default timeout of that command, e.g. COMMAND_TIMEOUT_SECONDS
+        :return: Dictionary of controller to command to statistics
+        """
+
+        overrides = overrides or {}
+        with self._lock:
+            return {name: {command: entry.stats(overrides.get(command, default)) for command, entry in commands.items()}
+                    for name, commands in self._commands.items()
+                    if controller is None or name == controller}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as model:
+                content = json.load(model)
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable latency model %s", self.path)
+            return
+        with self._lock:
+            for controller, commands in content.items():
+                for command, entry in commands.items():
+                    latency = CommandLatency(tuple(sample) for sample in entry.get("samples", ()))
+                    latency.timeouts = entry.get("timeouts", 0)
+                    self._commands.setdefault(controller, {})[command] = latency
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            content = {controller: {command: {"samples": list(entry.samples), "timeouts": entry.timeouts}
+                                    for command, entry in commands.items()}
+                       for controller, commands in self._commands.items()}
+            self._unsaved = 0
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as model:
+                json.dump(content, model)
+            os.replace(temporary, self.path)
+        except OSError:
+            logger.warning("Unable to save latency model %s", self.path)
+
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def latency_model(path=LATENCY_FILE):
+    """
+    Latency model shared by every controller in this process
+
+    :param str path: JSON file the model is kept in
+    :return: Instance of LatencyModel
+    """
+
+    with _models_lock:
+        model = _models.get(path)
+        if model is None:
+            model = _models[path] = LatencyModel(path)
+            atexit.register(model.save)
+        return model
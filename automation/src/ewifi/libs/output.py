@@ -0,0 +1,119 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import re
+
+# Characters of console output handled per step when compacting.
+COMPACT_CHUNK_CHARS = 64 * 1024
+
+NON_BLANK = re.compile(r"\S")
+
+
+def _line_end(text, position, end):
+    """Index of the line break ending the line at position, end if there is none."""
+
+    newline = text.find("\n", position, end)
+    carriage = text.find("\r", position, newline if newline >= 0 else end)
+    breaks = [index for index in (newline, carriage) if index >= 0]
+    return min(breaks) if breaks else end
+
+
+def _body_bounds(text):
+    """Span between the echoed command line and the trailing prompt line."""
+
+    first = NON_BLANK.search(text)
+    if first is None:
+        return 0, 0
+    start = _line_end(text, first.start(), len(text))
+    end = len(text)
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    last = max(text.rfind("\n", start, end), text.rfind("\r", start, end))
+    if last < start:
+        return start, start
+    return start, last
+
+
+def _iter_chunks(text, chunk_size):
+    """Yields the stripped non-blank body lines, one list per chunk of text."""
+
+    position, end = _body_bounds(text)
+    while position < end:
+        stop = min(position + chunk_size, end)
+        if stop < end:
+            newline = text.find("\n", stop, end)
+            stop = end if newline < 0 else newline
+        lines = [stripped for line in text[position:stop].splitlines() if (stripped := line.strip())]
+        if lines:
+            yield lines
+        position = stop
+
+
+def compact_output(text, chunk_size=COMPACT_CHUNK_CHARS):
+    """
+    Strips the echoed command and trailing prompt from console output
+
+    Blank lines are dropped and every line is stripped. The body is handled
+    a chunk at a time, so besides the result only one chunk worth of lines
+    is alive at once.
+
+    :param str text: Console output before the prompt match
+    :param int chunk_size: Characters handled per step
+    :return: Output body joined by newlines
+    """
+
+    return "\n".join("\n".join(lines) for lines in _iter_chunks(text, chunk_size))
+
+
+def iter_output_lines(text, chunk_size=COMPACT_CHUNK_CHARS):
+    """
+    Iterates the stripped, non-blank lines of the output body
+
+    :param str text: Console output before the prompt match
+    :param int chunk_size: Characters handled per step
+    :return: Iterator of lines without the echoed command and trailing prompt
+    """
+
+    for lines in _iter_chunks(text, chunk_size):
+        yield from lines
+
+
+class StreamingCompactor:
+    """Compacts console output as it arrives and writes the body to a file.
+
+    Gives the same body as compact_output on the whole text: the first
+    non-blank line (the echoed command) is skipped, the remaining complete
+    lines are stripped and written unless blank, and the unfinished last
+    line, which holds the prompt, is dropped at close(). Only the current
+    chunk and one partial line are held in memory.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lines = 0
+        self.chars = 0
+        self._pending = ""
+        self._echoed = False
+
+    def feed(self, text):
+        text = self._pending + text
+        end = max(text.rfind("\n"), text.rfind("\r"))
+        if end < 0:
+            self._pending = text
+            return
+        self._pending = text[end + 1:]
+        for line in text[:end + 1].splitlines():
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if not self._echoed:
+                self._echoed = True
+                continue
+            self.stream.write(stripped)
+            self.stream.write("\n")
+            self.lines += 1
+            self.chars += len(stripped) + 1
+
+    def close(self):
+        """Drops the trailing prompt line."""
+        self._pending = ""
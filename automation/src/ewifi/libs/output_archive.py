@@ -0,0 +1,242 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import bisect
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.latency import command_key
+
+logger = logging.getLogger(__name__)
+
+# Commands whose outputs the controller archives when an "archive" directory is configured.
+ARCHIVED_COMMANDS = ("show run", "show ap database", "show vlan", "show user-table", "show license")
+
+# A chunk ends after a line whose hash has these low bits clear, so about
+# one line in 16 closes a chunk. Boundaries depend on line content only:
+# an inserted or removed line changes one chunk, not every chunk after it.
+CHUNK_MASK = 0xF
+CHUNK_MIN_LINES = 4
+CHUNK_MAX_BYTES = 16 * 1024
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("_") or "_"
+
+
+def iter_chunks(lines):
+    """
+    Splits lines into content defined chunks
+
+    :param lines: Iterable of lines without line breaks
+    :return: Generator of chunk text, each line followed by a line break
+    """
+
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line) + 1
+        if (len(chunk) >= CHUNK_MIN_LINES and not zlib.crc32(line.encode("utf-8", "replace")) & CHUNK_MASK) or \
+                size >= CHUNK_MAX_BYTES:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+            size = 0
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+class Capture:
+    """Manifest entry of one archived output"""
+
+    __slots__ = ("time", "recipe", "size", "chunks")
+
+    def __init__(self, time, recipe, size, chunks):
+        self.time = time
+        self.recipe = recipe
+        self.size = size
+        self.chunks = chunks
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class OutputArchive:
+    """Deduplicated, content addressed archive of command outputs
+
+    Outputs are split into content defined chunks; every chunk is stored
+    once as a zlib compressed object named by its SHA-1, so captures that
+    barely change cost only their changed chunks. The ordered chunk list of
+    a capture is itself an object (its recipe), so an unchanged capture
+    costs one manifest line. Each controller and command has an append only
+    manifest of (time, recipe) kept sorted in memory, so the capture in
+    effect at any time is found by bisection.
+
+    Layout under the root directory: objects/ab/cdef..., and
+    manifests/<controller>/<command>.jsonl.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._manifests = {}
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "manifests"), exist_ok=True)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def _manifest_path(self, controller, command):
+        return os.path.join(self.root, "manifests", _slug(controller), _slug(command_key(command)) + ".jsonl")
+
+    def _put_object(self, data):
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as stream:
+            stream.write(zlib.compress(data))
+        os.replace(temporary, path)
+        return digest, True
+
+    def _get_object(self, digest):
+        try:
+            with open(self._object_path(digest), "rb") as stream:
+                return zlib.decompress(stream.read())
+        except FileNotFoundError:
+            raise FrameworkError(f"Archive object {digest} missing from {self.root}")
+
+    def _manifest(self, controller, command):
+        key = (controller, command_key(command))
+        manifest = self._manifests.get(key)
+        if manifest is None:
+            times, captures = [], []
+            path = self._manifest_path(controller, command)
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as stream:
+                    entries = [Capture(**json.loads(line)) for line in stream if line.strip()]
+                entries.sort(key=lambda entry: entry.time)
+                times = [entry.time for entry in entries]
+                captures = entries
+            manifest = self._manifests[key] = (times, captures)
+        return manifest
+
+    def put_lines(self, controller, command, lines, timestamp=None):
+        """
+        Archives an output given as lines
+
+        :param str controller: Controller name
+        :param str command: Command that produced the output
+        :param lines: Iterable of lines without line breaks, e.g. a file being read
+        :param float timestamp: Capture time, now by default
+        :return: Instance of Capture
+        """
+
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            chunks = []
+            size = 0
+            new = 0
+            for chunk in iter_chunks(lines):
+                data = chunk.encode("utf-8", "replace")
+                digest, stored = self._put_object(data)
+                chunks.append(digest)
+                size += len(data)
+                new += stored
+            recipe, _ = self._put_object(json.dumps(chunks).encode("utf-8"))
+            capture = Capture(timestamp, recipe, size, len(chunks))
+
+            times, captures = self._manifest(controller, command)
+            path = self._manifest_path(controller, command)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as stream:
+                stream.write(json.dumps(capture.as_dict()) + "\n")
+            index = bisect.bisect_right(times, timestamp)
+            times.insert(index, timestamp)
+            captures.insert(index, capture)
+        logger.info("%s: Archived %s: %d bytes in %d chunks, %d new", controller, command, size, len(chunks), new)
+        return capture
+
+    def put(self, controller, command, output, timestamp=None):
+        """Archives an output, see put_lines."""
+        return self.put_lines(controller, command, output.split("\n") if output else [], timestamp)
+
+    def lookup(self, controller, command, at=None):
+        """
+        Capture in effect at a time
+
+        :param float at: Time, latest capture if not given
+        :return: Instance of Capture, None if nothing was archived by then
+        """
+
+        with self._lock:
+            times, captures = self._manifest(controller, command)
+            index = len(times) if at is None else bisect.bisect_right(times, at)
+            return captures[index - 1] if index else None
+
+    def iter_text(self, capture):
+        """Yields the chunks of a capture in order, decoded."""
+        for digest in json.loads(self._get_object(capture.recipe)):
+            yield self._get_object(digest).decode("utf-8", "replace")
+
+    def get(self, controller, command, at=None):
+        """
+        Reconstructs an archived output
+
+        :param str controller: Controller name
+        :param str command: Command that produced the output
+        :param float at: Time, latest capture if not given
+        :return: Output as it was at that time, None if nothing was archived by then
+        """
+
+        capture = self.lookup(controller, command, at)
+        if capture is None:
+            return None
+        return "".join(self.iter_text(capture))[:-1]
+
+    def history(self, controller, command):
+        """
+        Captures of a command, oldest first, with whether the output changed
+
+        :return: List of dictionaries with time, size, recipe and changed
+        """
+
+        with self._lock:
+            _, captures = self._manifest(controller, command)
+            return [dict(capture.as_dict(), changed=index == 0 or capture.recipe != captures[index - 1].recipe)
+                    for index, capture in enumerate(captures)]
+
+    def stats(self):
+        """
+        Logical size of every capture against the bytes actually stored
+
+        :return: Dictionary with captures, logical_bytes, objects, stored_bytes and ratio
+        """
+
+        captures = 0
+        logical = 0
+        manifests = os.path.join(self.root, "manifests")
+        for directory, _, files in os.walk(manifests):
+            for file in files:
+                with open(os.path.join(directory, file), encoding="utf-8") as stream:
+                    for line in stream:
+                        if line.strip():
+                            captures += 1
+                            logical += json.loads(line)["size"]
+        objects = 0
+        stored = 0
+        for directory, _, files in os.walk(os.path.join(self.root, "objects")):
+            for file in files:
+                objects += 1
+                stored += os.path.getsize(os.path.join(directory, file))
+        return {"captures": captures, "logical_bytes": logical, "objects": objects, "stored_bytes": stored,
+                "ratio": logical / stored if stored else 0.0}
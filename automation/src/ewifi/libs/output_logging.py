@@ -0,0 +1,197 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import atexit
+import gzip
+import hashlib
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+
+logger = logging.getLogger(__name__)
+
+# Full command output bodies are logged at DEBUG on this logger. It is kept
+# at INFO whatever the root level, so bodies are only written on request.
+OUTPUT_LOGGER = "ewifi.output"
+# Full command output bodies for the capture store, silent unless configured.
+CAPTURE_LOGGER = "ewifi.capture"
+
+CAPTURE_MAX_BYTES = 64 * 1024 * 1024
+CAPTURE_BACKUP_COUNT = 10
+
+output_logger = logging.getLogger(OUTPUT_LOGGER)
+output_logger.setLevel(logging.INFO)
+capture_logger = logging.getLogger(CAPTURE_LOGGER)
+capture_logger.propagate = False
+capture_logger.setLevel(logging.CRITICAL + 1)
+
+
+def summarize(output):
+    """
+    Summary of a command output
+
+    :param str output: Command output
+    :return: Tuple of (line count, size in bytes, SHA-1 hex digest)
+    """
+
+    encoded = output.encode("utf-8", "replace")
+    lines = output.count("\n") + 1 if output else 0
+    return lines, len(encoded), hashlib.sha1(encoded).hexdigest()
+
+
+def log_output(name, command, output):
+    """
+    Logs a command output at a cost matching the enabled log levels
+
+    A summary (line count, bytes, digest) is logged at INFO, the full body
+    at DEBUG on the ewifi.output logger, and the full body is sent to the
+    capture store when one is configured. Nothing is computed for levels
+    that are disabled.
+
+    :param str name: Name of the controller
+    :param str command: Command that produced the output
+    :param str output: Command output
+    :return: None
+    """
+
+    if logger.isEnabledFor(logging.INFO):
+        lines, size, digest = summarize(output)
+        logger.info("%s: %s: %d lines, %d bytes, sha1 %s", name, command, lines, size, digest)
+    if output_logger.isEnabledFor(logging.DEBUG):
+        output_logger.debug("%s: %s", name, output)
+    if capture_logger.isEnabledFor(logging.DEBUG):
+        capture_logger.debug("%s: %s\n%s", name, command, output)
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as plain, gzip.open(dest, "wb") as compressed:
+        shutil.copyfileobj(plain, compressed)
+    os.remove(source)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records unformatted; formatting happens on the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+
+class AsyncLogging:
+    """Moves log I/O off the calling thread.
+
+    start() replaces the root handlers with a queue; a listener thread
+    drains it into the original handlers. With a capture file, full output
+    bodies are written by a second listener to a size rotated log whose
+    rotated files are gzip compressed.
+    """
+
+    def __init__(self, capture_file=None, max_bytes=CAPTURE_MAX_BYTES, backup_count=CAPTURE_BACKUP_COUNT):
+        self.capture_file = capture_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._listeners = []
+        self._root_handlers = []
+        self._capture_handler = None
+
+    def start(self):
+        """
+        Starts the queue listeners
+
+        :return: self
+        """
+
+        root = logging.getLogger()
+        self._root_handlers = list(root.handlers)
+        log_queue = queue.SimpleQueue()
+        for handler in self._root_handlers:
+            root.removeHandler(handler)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        self._listeners.append(logging.handlers.QueueListener(log_queue, *self._root_handlers,
+                                                              respect_handler_level=True))
+
+        if self.capture_file:
+            handler = logging.handlers.RotatingFileHandler(self.capture_file, maxBytes=self.max_bytes,
+                                                           backupCount=self.backup_count)
+            handler.namer = _gzip_namer
+            handler.rotator = _gzip_rotator
+            handler.setFormatter(logging.Formatter("%(asctime)s: %(message)s", datefmt="%Y-%m-%d %H:%M:%S"))
+            capture_queue = queue.SimpleQueue()
+            self._capture_handler = _DeferredQueueHandler(capture_queue)
+            capture_logger.addHandler(self._capture_handler)
+            capture_logger.setLevel(logging.DEBUG)
+            self._listeners.append(logging.handlers.QueueListener(capture_queue, handler))
+            logger.info("Capturing command outputs to %s", self.capture_file)
+
+        for listener in self._listeners:
+            listener.start()
+        atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        """
+        Flushes the queues and restores the root handlers
+
+        :return: None
+        """
+
+        if not self._listeners:
+            return
+        for listener in self._listeners:
+            listener.stop()
+            for handler in listener.handlers:
+                if handler not in self._root_handlers:
+                    handler.close()
+        self._listeners = []
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, _DeferredQueueHandler):
+                root.removeHandler(handler)
+        for handler in self._root_handlers:
+            root.addHandler(handler)
+        if self._capture_handler:
+            capture_logger.removeHandler(self._capture_handler)
+            capture_logger.setLevel(logging.CRITICAL + 1)
+            self._capture_handler = None
+        atexit.unregister(self.stop)
+
+
+def add_logging_arguments(parser, full_output=True):
+    """
+    Adds the --capture, --full-output and --summary-only options
+
+    :param parser: Instance of argparse.ArgumentParser
+    :param bool full_output: Whether full outputs are logged by default; pollers log summaries only
+    :return: None
+    """
+
+    parser.add_argument("--capture", metavar="FILE",
+                        help="Write full command outputs to this size rotated, gzip compressed log")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--full-output", dest="full_output", action="store_true", default=full_output,
+                       help="Log full command outputs" + (" (default)" if full_output else ""))
+    group.add_argument("--summary-only", dest="full_output", action="store_false",
+                       help="Log only line count, size and digest of command outputs" +
+                            ("" if full_output else " (default)"))
+
+
+def start_logging(capture_file=None, full_output=True):
+    """
+    Moves the log I/O of a tool off its threads
+
+    Show tools exist to show outputs, so full outputs are logged unless
+    turned off; library callers that never start logging get summaries.
+
+    :param str capture_file: Capture log of full command outputs, none if empty
+    :param bool full_output: Log full command outputs on the ewifi.output logger
+    :return: Instance of AsyncLogging, stopped at exit
+    """
+
+    output_logger.setLevel(logging.DEBUG if full_output else logging.INFO)
+    return AsyncLogging(capture_file).start()
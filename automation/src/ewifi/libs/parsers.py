@@ -0,0 +1,201 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import re
+
+# Lines closing an ArubaOS table: flag legends and entry totals.
+TABLE_FOOTER = re.compile(r"^(Flags:|Total\b|Num \w+:|[\w ]*Entries:|Curr/Cum\b)")
+SEPARATOR = re.compile(r"^[\s-]*-[\s-]*$")
+DASHES = re.compile(r"-+")
+
+
+def _is_separator(line):
+    return bool(SEPARATOR.match(line))
+
+
+def _boundaries(line, starts):
+    """Moves column boundaries that fall inside an overflowing value to the next blank."""
+
+    cuts = []
+    for start in starts[1:]:
+        while 0 < start < len(line) and not line[start - 1].isspace() and not line[start].isspace():
+            start += 1
+        cuts.append(start)
+    return cuts
+
+
+def _cells(line, starts):
+    cuts = _boundaries(line, starts)
+    cells = []
+    begin = starts[0]
+    for cut in cuts:
+        cells.append(line[begin:cut].strip())
+        begin = max(cut, begin)
+    cells.append(line[begin:].strip())
+    return cells
+
+
+def _header_index(lines):
+    """Finds the dashed line under the column headers, -1 if there is none."""
+
+    index = -1
+    groups = 0
+    for number, line in enumerate(lines):
+        if number == 0 or not _is_separator(line) or _is_separator(lines[number - 1]):
+            continue
+        if not lines[number - 1].strip():
+            continue
+        count = len(DASHES.findall(line))
+        if count >= groups:
+            index, groups = number, count
+    return index
+
+
+def iter_table(output):
+    """
+    Parses a column aligned ArubaOS table
+
+    Column boundaries are taken from the dashed line under the headers, so
+    empty cells and values with embedded blanks are kept in their columns.
+    Rows stop at the first blank line or flag legend/total footer.
+
+    :param str output: Command output holding one table
+    :return: Iterator of dictionaries keyed by column header
+    """
+
+    lines = output.splitlines()
+    index = _header_index(lines)
+    if index < 0:
+        return
+
+    separator = lines[index]
+    starts = [match.start() for match in DASHES.finditer(separator)]
+    headers = _cells(lines[index - 1].ljust(len(separator)), starts)
+    for line in lines[index + 1:]:
+        if not line.strip() or TABLE_FOOTER.match(line):
+            break
+        yield dict(zip(headers, _cells(line, starts)))
+
+
+def parse_table(output):
+    """
+    Parses a column aligned ArubaOS table
+
+    :param str output: Command output holding one table
+    :return: List of dictionaries keyed by column header
+    """
+
+    return list(iter_table(output))
+
+
+def parse_parameters(output):
+    """
+    Parses a Parameter/Value profile table, e.g. show wlan virtual-ap <vap>
+
+    :param str output: Command output holding the profile table
+    :return: Dictionary of parameter to value
+    """
+
+    parameters = {}
+    for row in iter_table(output):
+        values = list(row.values())
+        if len(values) >= 2 and values[0]:
+            parameters[values[0]] = values[1]
+    return parameters
+
+
+def parse_control_plane_security(output):
+    """
+    Parses show control-plane-security
+
+    Parameter names are lower cased, since their casing varies between
+    ArubaOS releases; look them up with parameter.lower().
+
+    :param str output: Command output
+    :return: Dictionary of lower case parameter name to value
+    """
+
+    return {key.lower(): value for key, value in parse_parameters(output).items()}
+
+
+def parse_ap_database(output):
+    """
+    Parses show ap database
+
+    :param str output: Command output
+    :return: List of dictionaries keyed by column header (Name, Group, AP Type, IP Address, Status, ...)
+    """
+
+    return [row for row in iter_table(output) if row.get("Name")]
+
+
+def parse_user_table(output):
+    """
+    Parses show user-table
+
+    The Essid/Bssid/Phy column is split into ESSID, BSSID and Phy keys.
+
+    :param str output: Command output
+    :return: List of dictionaries keyed by column header
+    """
+
+    users = []
+    for row in iter_table(output):
+        if not row.get("MAC"):
+            continue
+        essid, _, rest = row.get("Essid/Bssid/Phy", "").partition("/")
+        bssid, _, phy = rest.partition("/")
+        row["ESSID"] = essid
+        row["BSSID"] = bssid
+        row["Phy"] = phy
+        users.append(row)
+    return users
+
+
+def parse_essids(output):
+    """
+    Parses show ap essid
+
+    :param str output: Command output
+    :return: List of dictionaries keyed by column header (ESSID, APs, Clients, VLAN(s), Encryption)
+    """
+
+    return [row for row in iter_table(output) if row.get("ESSID")]
+
+
+AUTH_TRACE_LINE = re.compile(r"^(\w{3}\s+\d+\s+\d\d:\d\d:\d\d)\s+(\S+)\s+(\S+)\s+(.*)$")
+MAC_ADDRESS = re.compile(r"^[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}$")
+
+
+def parse_auth_tracebuf(output):
+    """
+    Parses show auth-tracebuf
+
+    Each line holds the time, event, direction marker, station MAC, BSSID,
+    ID, length and a free text detail. AP events (ap-up, ...) carry only
+    the BSSID.
+
+    :param str output: Command output
+    :return: List of dictionaries with time, event, direction, station, bssid, id, length and detail
+    """
+
+    events = []
+    for line in output.splitlines():
+        match = AUTH_TRACE_LINE.match(line.strip())
+        if not match:
+            continue
+        stamp, event, direction, rest = match.groups()
+        tokens = rest.split()
+        macs = []
+        while tokens and MAC_ADDRESS.match(tokens[0]):
+            macs.append(tokens.pop(0).lower())
+        if len(macs) == 1 and event.startswith("ap-"):
+            macs.insert(0, "")
+        station = macs[0] if macs else ""
+        bssid = macs[1] if len(macs) > 1 else ""
+        entry_id = tokens.pop(0) if tokens else ""
+        length = tokens.pop(0) if tokens else ""
+        events.append({"time": " ".join(stamp.split()), "event": event, "direction": direction,
+                       "station": station, "bssid": bssid, "id": entry_id, "length": length,
+                       "detail": " ".join(tokens)})
+    return events
@@ -0,0 +1,219 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import re
+import time
+from collections import deque
+
+from ewifi.libs.parsers import iter_table
+
+logger = logging.getLogger(__name__)
+
+PORT_SAMPLES = 256
+# Seconds the history of a port or interface no longer reported is kept, so
+# one that comes back (module reset, VLAN interface recreated) keeps its totals.
+ABSENT_GRACE_SECONDS = 3600
+
+ABSENT = "absent"
+
+INTERFACE_LINE = re.compile(r"^(\S.*?)\s+(\S+)\s*/\s*(\S+)\s+(up|down)\s+(up|down)\s*$", re.I)
+
+# show port status column to PortStatus attribute; the columns vary between releases.
+PORT_COLUMNS = {
+    "slot-port": "port",
+    "porttype": "type",
+    "adminstate": "admin",
+    "operstate": "oper",
+    "poe": "poe",
+    "trusted": "trusted",
+    "spanningtree": "stp",
+    "portmode": "mode",
+    "speed": "speed",
+    "duplex": "duplex",
+    "vlan": "vlan",
+}
+
+
+class PortStatus:
+    """Row of show port status"""
+
+    __slots__ = ("port", "type", "admin", "oper", "poe", "trusted", "stp", "mode", "speed", "duplex", "vlan")
+
+    def __init__(self, port, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name, ""))
+        self.port = port
+
+    @property
+    def up(self):
+        return self.oper.lower() == "up"
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Interface:
+    """Row of show ip interface brief"""
+
+    __slots__ = ("name", "ip", "netmask", "admin", "protocol")
+
+    def __init__(self, name, ip="", netmask="", admin="", protocol=""):
+        self.name = name
+        self.ip = ip
+        self.netmask = netmask
+        self.admin = admin
+        self.protocol = protocol
+
+    @property
+    def up(self):
+        return self.protocol.lower() == "up"
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def parse_port_status(output):
+    """
+    Parses show port status
+
+    Speed, duplex and VLAN are filled in on releases that print them.
+
+    :param str output: Command output
+    :return: Dictionary of slot/port to PortStatus
+    """
+
+    ports = {}
+    for row in iter_table(output):
+        values = {PORT_COLUMNS[key.lower()]: value for key, value in row.items() if key.lower() in PORT_COLUMNS}
+        port = values.pop("port", "")
+        if port:
+            ports[port] = PortStatus(port, **values)
+    return ports
+
+
+def parse_ip_interface_br(output):
+    """
+    Parses show ip interface brief
+
+    :param str output: Command output
+    :return: Dictionary of interface name to Interface
+    """
+
+    interfaces = {}
+    for line in output.splitlines():
+        match = INTERFACE_LINE.match(line.strip())
+        if match:
+            name, ip, netmask, admin, protocol = match.groups()
+            interfaces[name] = Interface(name, ip, netmask, admin.lower(), protocol.lower())
+    return interfaces
+
+
+class StateHistory:
+    """Recent states of one port or interface, with lifetime flap and duration totals
+
+    The last samples are kept in a ring buffer; totals are a handful of
+    counters per state, so memory does not grow with polling time.
+    """
+
+    __slots__ = ("samples", "state", "since", "flaps", "durations", "last_seen")
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.state = None
+        self.since = None
+        self.flaps = 0
+        self.durations = {}
+        self.last_seen = None
+
+    def add(self, timestamp, state):
+        """
+        Records a sample
+
+        :return: True if the state changed since the previous sample
+        """
+
+        changed = self.state is not None and state != self.state
+        if self.last_seen is not None:
+            self.durations[self.state] = self.durations.get(self.state, 0.0) + timestamp - self.last_seen
+        if changed:
+            self.flaps += 1
+        if changed or self.state is None:
+            self.since = timestamp
+        self.state = state
+        self.last_seen = timestamp
+        self.samples.append((timestamp, state))
+        return changed
+
+    def recent_flaps(self):
+        return sum(1 for previous, current in zip(self.samples, list(self.samples)[1:]) if previous[1] != current[1])
+
+    def report(self, now):
+        return {"state": self.state, "since": self.since, "in_state_seconds": now - self.since if self.since else 0.0,
+                "flaps": self.flaps, "recent_flaps": self.recent_flaps(), "samples": len(self.samples),
+                "seconds_by_state": dict(self.durations)}
+
+
+class PortSampler:
+    """Polls port status and interfaces together and tracks their up/down history
+
+    Each sample runs show port status and show ip interface brief over one
+    serial session. Ports are tracked by operational state and interfaces
+    by protocol state. An entry that is no longer reported goes to the
+    "absent" state and its history is dropped once it has been absent for
+    longer than the grace period.
+    """
+
+    def __init__(self, controller, samples=PORT_SAMPLES, clock=time.time, grace=ABSENT_GRACE_SECONDS):
+        self.controller = controller
+        self.size = samples
+        self.grace = grace
+        self._clock = clock
+        self.ports = {}
+        self.interfaces = {}
+        self.history = {}
+
+    def _update(self, kind, entries, timestamp):
+        changed = []
+        current = set()
+        for name, entry in entries.items():
+            key = (kind, name)
+            current.add(key)
+            history = self.history.get(key)
+            if history is None:
+                history = self.history[key] = StateHistory(self.size)
+            if history.add(timestamp, "up" if entry.up else "down"):
+                changed.append(key)
+        for key in [key for key in self.history if key[0] == kind and key not in current]:
+            history = self.history[key]
+            if history.state == ABSENT and timestamp - history.since > self.grace:
+                del self.history[key]
+            elif history.add(timestamp, ABSENT):
+                changed.append(key)
+        return changed
+
+    def sample(self):
+        """
+        Polls once
+
+        :return: List of (kind, name) whose state changed, kind being "port" or "interface"
+        """
+
+        port_status, interfaces = self.controller.run_batch(["show port status", "show ip interface br"])
+        timestamp = self._clock()
+        self.ports = parse_port_status(port_status)
+        self.interfaces = parse_ip_interface_br(interfaces)
+        changed = self._update("port", self.ports, timestamp) + self._update("interface", self.interfaces, timestamp)
+        for kind, name in changed:
+            logger.info("%s %s is now %s", kind, name, self.history[(kind, name)].state)
+        return changed
+
+    def report(self):
+        """
+        Current state, time in state, flap counts and time per state
+
+        :return: Dictionary of "kind name" to report dictionary
+        """
+
+        now = self._clock()
+        return {f"{kind} {name}": history.report(now) for (kind, name), history in sorted(self.history.items())}
@@ -0,0 +1,157 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Output files with these extensions get collapsed stacks, anything else Chrome trace JSON.
+COLLAPSED_EXTENSIONS = (".folded", ".collapsed")
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "category", "args", "start", "children")
+
+    def __init__(self, profiler, name, category, args):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.args = args
+        self.start = None
+        self.children = 0.0
+
+    def __enter__(self):
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        end = time.perf_counter()
+        stack = self.profiler._stack()
+        stack.pop()
+        duration = end - self.start
+        if stack:
+            stack[-1].children += duration
+        self.profiler._add(self, [span.name for span in stack] + [self.name], duration)
+        return False
+
+
+class Profiler:
+    """Records nested timing spans of a run
+
+    Spans are timed with perf_counter and nest per thread. The trace is
+    written as Chrome trace JSON (chrome://tracing, Perfetto, speedscope)
+    or, for .folded/.collapsed files, as collapsed stacks with self time
+    in microseconds for flamegraph.pl.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self.events = []
+        self.stacks = {}
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _add(self, span, path, duration):
+        event = {"name": span.name, "cat": span.category, "ph": "X", "pid": os.getpid(),
+                 "tid": threading.get_ident(), "ts": (span.start - self._origin) * 1e6, "dur": duration * 1e6}
+        if span.args:
+            event["args"] = span.args
+        key = ";".join(path)
+        with self._lock:
+            self.events.append(event)
+            self.stacks[key] = self.stacks.get(key, 0.0) + duration - span.children
+
+    def span(self, name, category="", **args):
+        return _Span(self, name, category, args)
+
+    def write(self, path):
+        """
+        Writes the recorded spans
+
+        :param str path: Output file, collapsed stacks for COLLAPSED_EXTENSIONS, Chrome trace JSON otherwise
+        :return: None
+        """
+
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+            stacks = dict(self.stacks)
+        with open(path, "w", encoding="utf-8") as stream:
+            if path.endswith(COLLAPSED_EXTENSIONS):
+                for key, seconds in sorted(stacks.items()):
+                    stream.write(f"{key} {max(int(seconds * 1e6), 0)}\n")
+            else:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, stream)
+        logger.info("Profile of %d spans written to %s", len(events), path)
+
+
+_profiler = None
+
+
+def span(name, category="", **args):
+    """
+    Times a block when profiling is on, does nothing otherwise
+
+    :param str name: Span name
+    :param str category: Span category, e.g. "init" or "serial"
+    :param args: Values shown with the span
+    :return: Context manager
+    """
+
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name, category, **args)
+
+
+def add_profile_argument(parser):
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Write a trace of the run: collapsed stacks for .folded files, Chrome trace JSON otherwise")
+
+
+def start_profiling(path, name=None):
+    """
+    Profiles the rest of the run and writes the trace at exit
+
+    The whole run is one root span named after the tool.
+
+    :param str path: Output file, nothing is done if empty
+    :param str name: Root span name, the script name by default
+    :return: Instance of Profiler, None if not profiling
+    """
+
+    global _profiler
+    if not path:
+        return None
+    _profiler = Profiler()
+    root = _profiler.span(name or os.path.basename(sys.argv[0]) or "run", "tool")
+    root.__enter__()
+
+    def finish():
+        root.__exit__(None, None, None)
+        _profiler.write(path)
+
+    atexit.register(finish)
+    return _profiler
@@ -0,0 +1,289 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import random
+import threading
+import time
+
+from ewifi.libs.errors import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Commands without side effects on the controller, safe to send again.
+IDEMPOTENT_PREFIXES = ("show ",)
+IDEMPOTENT_COMMANDS = ("no paging",)
+
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_RESET_SECONDS = 60
+
+
+def is_read_only(command):
+    """
+    Tells whether a command can be retried without side effects
+
+    :param str command: Controller command
+    :return: True for show commands and other idempotent reads
+    """
+
+    command = " ".join(command.split())
+    return command.startswith(IDEMPOTENT_PREFIXES) or command in IDEMPOTENT_COMMANDS
+
+
+class RetryPolicy:
+    """Number of attempts and jittered exponential backoff between them"""
+
+    def __init__(self, attempts=1, base_delay=1.0, max_delay=10.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry):
+        """
+        Backoff before the given retry, with full jitter
+
+        :param int retry: Retry number, starting at 0
+        :return: Seconds to wait
+        """
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+
+READ_RETRY_POLICY = RetryPolicy(attempts=3, base_delay=1.0, max_delay=8.0)
+WRITE_RETRY_POLICY = RetryPolicy(attempts=1)
+
+
+def retry_policy(commands):
+    """
+    Retry policy of a command, or of a batch of commands run together
+
+    :param commands: Command string or list of command strings
+    :return: READ_RETRY_POLICY if every command is read only, else WRITE_RETRY_POLICY
+    """
+
+    if isinstance(commands, str):
+        commands = [commands]
+    return READ_RETRY_POLICY if all(is_read_only(command) for command in commands) else WRITE_RETRY_POLICY
+
+
+class CircuitBreaker:
+    """Sheds commands to a controller that keeps failing.
+
+    After failure_threshold consecutive failures the breaker opens and
+    commands fail fast with CircuitOpenError. Once reset_timeout has passed
+    one trial command (or health probe) is let through; its success closes
+    the breaker, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_SECONDS,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened is None:
+            return self.CLOSED
+        if self._clock() - self._opened >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """
+        Admits a command
+
+        :return: None
+        :raises CircuitOpenError: If the controller is considered unhealthy
+        """
+
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                logger.info("%s: Circuit half-open, letting a trial command through", self.name)
+                return
+        raise CircuitOpenError(f"{self.name}: controller unhealthy, circuit open")
+
+    def record_success(self):
+        with self._lock:
+            if self._opened is not None:
+                logger.info("%s: Circuit closed", self.name)
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def release(self):
+        """Ends a trial that neither succeeded nor failed, so the next command can try again."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial = False
+            if self._opened is not None or self._failures >= self.failure_threshold:
+                if self._opened is None:
+                    logger.warning("%s: Circuit opened after %d failures", self.name, self._failures)
+                self._opened = self._clock()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(name):
+    """
+    Circuit breaker shared by every user of a controller in this process
+
+    :param str name: Controller name or serial device ID
+    :return: Instance of CircuitBreaker
+    """
+
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def call_with_retry(function, policy, breaker, retry_on, name="", fail_on=(), sleep=time.sleep):
+    """
+    Calls function under the retry policy and circuit breaker
+
+    :param function: Callable without arguments
+    :param policy: Instance of RetryPolicy
+    :param breaker: Instance of CircuitBreaker
+    :param retry_on: Exception types that count as failures of the controller and are retried
+    :param str name: Name used in log messages
+    :param fail_on: Exception types that count as failures of the controller but are not retried
+    :param sleep: Waits the backoff delay, time.sleep by default
+    :return: Result of function
+    :raises CircuitOpenError: If the breaker sheds the call
+    """
+
+    for attempt in range(policy.attempts):
+        breaker.allow()
+        try:
+            result = function()
+        except retry_on as error:
+            breaker.record_failure()
+            if attempt + 1 >= policy.attempts:
+                raise
+            delay = policy.delay(attempt)
+            logger.warning("%s: Attempt %d failed (%s), retrying in %.1f seconds",
+                           name, attempt + 1, error, delay)
+            sleep(delay)
+        except fail_on:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Not the controller's fault; a half-open trial must not stay taken.
+            breaker.release()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesces concurrent identical calls into one execution.
+
+    The first caller of a key runs the function; callers arriving while it
+    is in flight wait for it and receive the same result or exception.
+    Nothing is cached: a call arriving after completion runs again.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        """
+        Runs function unless an identical call is in flight
+
+        :param key: Hashable identity of the call
+        :param function: Callable without arguments
+        :return: Result of function, possibly from another caller's execution
+        """
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.executions += 1
+            else:
+                flight.waiters += 1
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function()
+            return flight.result
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+            if flight.waiters:
+                logger.debug("%s: %r shared with %d callers", self.name, key, flight.waiters)
+
+    def stats(self):
+        with self._lock:
+            calls = self.executions + self.shared
+            return {"executions": self.executions, "saved": self.shared, "in_flight": len(self._flights),
+                    "saved_ratio": self.shared / calls if calls else 0.0}
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def single_flight(name):
+    """
+    Single-flight group shared by every user of a controller in this process
+
+    :param str name: Controller name or serial device ID
+    :return: Instance of SingleFlight
+    """
+
+    with _flights_lock:
+        group = _flights.get(name)
+        if group is None:
+            group = _flights[name] = SingleFlight(name)
+        return group
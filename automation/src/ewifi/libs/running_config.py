@@ -0,0 +1,157 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import difflib
+import hashlib
+import logging
+import mmap
+
+logger = logging.getLogger(__name__)
+
+# Line closing a top level block of show run.
+BLOCK_END = b"!"
+
+
+class MappedConfig:
+    """Running configuration file memory-mapped for reading
+
+    The file is paged in by the OS as it is read, so walking or searching
+    a configuration of any size costs a small, fixed amount of memory.
+    Files are the ones written by AurubaController.save_running_config,
+    one stripped line per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            self.data = b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.data)
+
+    def line(self, start, end):
+        return self.data[start:end].decode("utf-8", "replace")
+
+    def iter_spans(self):
+        """Yields (start, end) byte offsets of each line, newline excluded."""
+        start = 0
+        size = len(self.data)
+        while start < size:
+            end = self.data.find(b"\n", start)
+            if end < 0:
+                end = size
+            yield start, end
+            start = end + 1
+
+    def iter_lines(self):
+        for start, end in self.iter_spans():
+            yield self.line(start, end)
+
+    def find(self, text):
+        """
+        Lines containing text
+
+        :param str text: Text to look for
+        :return: List of matching lines
+        """
+
+        needle = text.encode("utf-8")
+        lines = []
+        position = self.data.find(needle)
+        while position >= 0:
+            start = self.data.rfind(b"\n", 0, position) + 1
+            end = self.data.find(b"\n", position)
+            end = len(self.data) if end < 0 else end
+            lines.append(self.line(start, end))
+            position = self.data.find(needle, end)
+        return lines
+
+    def blocks(self):
+        """
+        Top level blocks, each running from its first line up to a "!" line
+
+        Repeated headers, such as several "vlan" lines, are told apart by a
+        " #n" suffix on the key.
+
+        :return: Dictionary of block header to (start, end, digest), in file order
+        """
+
+        blocks = {}
+
+        def close(header, first, end, digest):
+            key = header
+            count = 1
+            while key in blocks:
+                count += 1
+                key = f"{header} #{count}"
+            blocks[key] = (first, end, digest.digest())
+
+        first = None
+        header = None
+        digest = None
+        last = 0
+        for start, end in self.iter_spans():
+            if first is None:
+                if self.data[start:end] == BLOCK_END:
+                    continue
+                first, header, digest = start, self.line(start, end), hashlib.sha1()
+            digest.update(self.data[start:end + 1])
+            last = end
+            if self.data[start:end] == BLOCK_END:
+                close(header, first, end, digest)
+                first = None
+        if first is not None:
+            # The last block of the file need not be closed by a "!" line.
+            close(header, first, last, digest)
+        return blocks
+
+    def block_lines(self, span):
+        start, end = span[:2]
+        return self.data[start:end].decode("utf-8", "replace").split("\n")
+
+
+def diff_configs(old_path, new_path, context=3):
+    """
+    Compares two saved running configurations block by block
+
+    Blocks are matched by header and compared by digest; only blocks that
+    differ are decoded and diffed, so two large, mostly identical
+    configurations are compared without loading either of them.
+
+    :param str old_path: Earlier configuration file
+    :param str new_path: Later configuration file
+    :param int context: Lines of context in each block diff
+    :return: Dictionary with "added" and "removed" block headers and "changed", header to unified diff lines
+    """
+
+    with MappedConfig(old_path) as old, MappedConfig(new_path) as new:
+        old_blocks = old.blocks()
+        new_blocks = new.blocks()
+        changed = {}
+        for header, span in new_blocks.items():
+            previous = old_blocks.get(header)
+            if previous is None or previous[2] == span[2]:
+                continue
+            changed[header] = list(difflib.unified_diff(old.block_lines(previous), new.block_lines(span),
+                                                        old_path, new_path, n=context, lineterm=""))
+    result = {"added": [header for header in new_blocks if header not in old_blocks],
+              "removed": [header for header in old_blocks if header not in new_blocks],
+              "changed": changed}
+    logger.info("Running configuration diff: %d blocks added, %d removed, %d changed",
+                len(result["added"]), len(result["removed"]), len(changed))
+    return result
@@ -7,16 +7,25 @@ import logging
 import time
 
 from serial import Serial
-from pexpect.fdpexpect import fdspawn
 from pexpect.exceptions import TIMEOUT
 from pexpect import EOF
 
 from ewifi.libs.common import ConfigureReader
-from ewifi.libs.errors import FrameworkError, SetupError
+from ewifi.libs.console import CONSOLE_READ_BYTES, PROMPT_SEARCH_WINDOW, compile_prompt, matched_prompt, spawn_console
+from ewifi.libs.errors import FrameworkError, SerialTimeoutError, SetupError
+from ewifi.libs.latency import command_key, latency_model
+from ewifi.libs.output import StreamingCompactor, compact_output
+from ewifi.libs.profiling import span
+from ewifi.libs.resilience import is_read_only
+from ewifi.libs.session_archive import REDACTED, SessionArchive
 
 logger = logging.getLogger(__name__)
 
 SERIAL_COMMAND_TIMEOUT_SECONDS = 10
+# Timeouts of commands known to be slow, until their latency has been learned.
+COMMAND_TIMEOUT_SECONDS = {
+    "show run": 6000,
+}
 
 
 class PROMPT:
@@ -30,6 +39,7 @@ class PROMPT:
 
 
 PROMPTS = [PROMPT.BOOTLOADER_MODE, PROMPT.LOGIN_USER, PROMPT.PASSWORD, PROMPT.USER_MODE, PROMPT.ADMIN_MODE]
+PROMPT_PATTERNS = compile_prompt(PROMPTS)
 
 
 class SerialOutput:
@@ -43,7 +53,7 @@ class SerialOutput:
 class AurubaControllerSerial:
     """Class for controlling Auruba controller via serial communication."""
 
-    def __init__(self, device_id, baudrate, prompt, name=""):
+    def __init__(self, device_id, baudrate, prompt, name="", recorder=None):
         """
         Constructs ArubaControllerSerial
 
@@ -51,6 +61,7 @@ class AurubaControllerSerial:
         :param int baudrate: Supported baudrate
         :param str prompt: Default controller prompt
         :param str name: Name of the controller
+        :param recorder: Instance of SessionRecorder saving every exchange, if any
         :raises SerialCommandError: IF serial is not connected
         """
         if not device_id:
@@ -69,6 +80,11 @@ class AurubaControllerSerial:
         if not name:
             name = "device"
         self._name = name
+        self.latency = latency_model()
+        self.recorder = recorder
+        self._secret_next = False
+        self.state = None
+        self._paging_disabled = False
 
     @property
     def prompt_status(self):
@@ -84,36 +100,53 @@ class AurubaControllerSerial:
         if not os.path.exists(self.device_id):
             raise SetupError("Unable to detect serial connection")
 
-        with Serial(self.device_id, self.baudrate) as device:
-          p = fdspawn(device, encoding="utf-8", codec_errors="replace", maxread=4092)
+        with span("prompt probe", "serial"), Serial(self.device_id, self.baudrate) as device:
+          p = spawn_console(device)
           if not p.isalive():
               raise SetupError("Serial is not alive")
 
+          start = time.monotonic()
           try:
               p.sendline("\r")
-              status = p.expect(PROMPTS, timeout=timeout)
-              return PROMPTS[status]
+              status = p.expect(PROMPT_PATTERNS, timeout=timeout)
+              self._record(None, None, p.before, PROMPTS[status], start)
+              return self._observe(PROMPTS[status])
           except TIMEOUT:
+              self._observe(None)
+              self._record(None, None, p.before, None, start, timed_out=True)
               logger.exception("%s: Timeout occured during command processing", self._name)
               logger.error("%s: %s", self._name, p.before)
               return None
 
-    def login(self, username, password):
+    def _observe(self, after):
+        """Tracks the prompt last seen, so callers need not probe for it again."""
+
+        after = after.strip() if isinstance(after, str) else None
+        self.state = next((prompt for prompt in PROMPTS if prompt.strip() == after), None)
+        if self.state in (PROMPT.BOOTLOADER_MODE, PROMPT.LOGIN_USER):
+            # A new CLI session starts with paging on.
+            self._paging_disabled = False
+        return self.state
+
+    def login(self, username, password, status=None):
         """
         Login into Aruba controller 
 
         :param str username: Name of the user 
         :param str password: Password to login 
+        :param str status: Prompt just seen, probed if not given
         :return: None
         :raises FrameworkError: Failed to turn on admin mode
         """
         
-        if self.prompt_status == PROMPT.BOOTLOADER_MODE:
+        status = status or self.prompt_status
+        if status == PROMPT.BOOTLOADER_MODE:
             self.run("boot", prompt=EOF)
             time.sleep(60)
+            status = self.prompt_status
         output = SerialOutput(None, None)
         logging.info("Logging into Controller")
-        if self.prompt_status == PROMPT.LOGIN_USER:
+        if status == PROMPT.LOGIN_USER:
             logger.debug("%s: Entering username", self._name)
             output = self.run(username, prompt=PROMPT.PASSWORD)
          
@@ -121,75 +154,273 @@ class AurubaControllerSerial:
             logger.debug("%s: Entering user password", self._name)
             output = self.run(password, PROMPT.USER_MODE)
             
-        if self.prompt_status not in [PROMPT.USER_MODE, PROMPT.ADMIN_MODE]:
+        if output.after is not None:
+            status = self.state
+        if status not in [PROMPT.USER_MODE, PROMPT.ADMIN_MODE]:
             raise FrameworkError("Unable to login")
         logger.debug("%s: Successfully logged into controller", self._name)
 
-    def enable_admin_mode(self, password):
+    def enable_admin_mode(self, password, status=None):
         """
         Enables admin mode to run privilaged commands
 
         :param str password: Password to enable admin mode
+        :param str status: Prompt just seen, probed if not given
         :return: None
         :raises FrameworkError: Failed to turn on admin mode
         """
 
         self._admin = False
-        prompt_status = self.prompt_status
+        prompt_status = status or self.prompt_status
         if prompt_status != PROMPT.ADMIN_MODE:
             if prompt_status != PROMPT.USER_MODE:
                 raise FrameworkError("User mode should be enabled")
             
             output = self.run("enable", PROMPT.PASSWORD)
             if output.after == PROMPT.PASSWORD:
-                self.run(password, PROMPT.ADMIN_MODE)
+                output = self.run(password, PROMPT.ADMIN_MODE)
 
-            if self.prompt_status != PROMPT.ADMIN_MODE:
+            if self.state != PROMPT.ADMIN_MODE and self.prompt_status != PROMPT.ADMIN_MODE:
                 raise FrameworkError("Unable to enable admin mode")
 
         self._admin = True
         logger.debug("%s: Controller is in admin mode", self._name)
 
+    def _record(self, command, prompt, before, after, start, timed_out=False):
+        if self.recorder:
+            after = after if isinstance(after, str) else None
+            self.recorder.record(command, prompt, before, after, time.monotonic() - start, timed_out,
+                                 password_prompt=PROMPT.PASSWORD)
+
+    def _session(self, device, timeout):
+        p = spawn_console(device)
+        if not p.isalive():
+            raise SetupError("Serial is not alive")
+        # Paging is a setting of the CLI session, which outlives the serial
+        # connection, so it is turned off once rather than per connection.
+        if self._admin and not self._paging_disabled:
+            try:
+               with span("no paging", "serial"):
+                   p.sendline("no paging\r")
+                   p.expect(compile_prompt(PROMPT.ADMIN_MODE), timeout=timeout)
+               self._paging_disabled = True
+            except:
+                logger.warning("%s: Unable to disable paging", self._name)
+        return p
+
+    def command_timeout(self, command):
+        """
+        Timeout of a command derived from its observed latency
+
+        :param str command: Command to execute on controller
+        :return: Timeout in seconds
+        """
+
+        default = COMMAND_TIMEOUT_SECONDS.get(command_key(command), SERIAL_COMMAND_TIMEOUT_SECONDS)
+        return self.latency.timeout(self._name, command, default)
+
+    def _exchange(self, p, command, prompt, timeout, learn):
+        learn = learn and is_read_only(command)
+        if not timeout:
+            timeout = self.command_timeout(command) if learn else SERIAL_COMMAND_TIMEOUT_SECONDS
+        # Spans never name a line typed at the password prompt.
+        label = REDACTED if self._secret_next else command_key(command)
+        self._secret_next = False
+        start = time.monotonic()
+        try:
+          with span(label, "serial", prompt=str(prompt)):
+            p.sendline(command+"\r")
+            p.expect(compile_prompt(prompt), timeout=timeout)
+            after = matched_prompt(p)
+            self._secret_next = isinstance(after, str) and after.strip() == PROMPT.PASSWORD.strip()
+            self._observe(after)
+            if learn:
+                self.latency.record(self._name, command, time.monotonic() - start, len(p.before))
+            self._record(command, prompt, p.before, after, start)
+            return SerialOutput(p.before, after.strip())
+        except TIMEOUT:
+            self._observe(None)
+            self._record(command, prompt, p.before, None, start, timed_out=True)
+            if learn:
+                self.latency.record(self._name, command, timeout, len(p.before or ""), timed_out=True)
+            logger.debug("%s: prompt %s before %s after %s", self._name, prompt, p.before, p.after)
+            logger.error("%s: Timeout occured during command processing", self._name)
+            logger.error("%s: Entered command: %s", self._name, command)
+            raise SerialTimeoutError(f"Timed out waiting for prompt after {command}")
+
     def run(self, command, prompt=None, timeout=None):
         """
         Runs command on Aruba controller.
 
         :param str command: Command to execute on controller
         :param str prompt: Expected prompt after execution
-        :param int timeout: Command timeout in seconds
+        :param int timeout: Command timeout in seconds, learned from past runs if not given
         :return: Instance of SerialOutput
-        :raises SerialCommandError: IF serial is not connected 
-        :raises FrameworkError: Failed to execute command
+        :raises SetupError: IF serial is not connected
+        :raises SerialTimeoutError: If the prompt doesn't show up in time
         """
 
+        # Only reads answered by the regular prompt feed the latency model;
+        # login and configuration lines may carry credentials.
+        learn = not prompt
         if not prompt:
             prompt = self.prompt
-
-        if not timeout:
-            timeout = SERIAL_COMMAND_TIMEOUT_SECONDS
         
         if not os.path.exists(self.device_id):
             raise SetupError("Unable to detect serial connection")
 
         with Serial(self.device_id, self.baudrate) as device:
-          p = fdspawn(device, encoding="utf-8", codec_errors="replace", maxread=4092)
-          if not p.isalive():
-              raise SetupError("Serial is not alive")
-          if self._admin:
+          p = self._session(device, SERIAL_COMMAND_TIMEOUT_SECONDS)
+          return self._exchange(p, command, prompt, timeout, learn)
+
+    def run_batch(self, commands, prompt=None, timeout=None, on_output=None):
+        """
+        Runs several commands on Aruba controller over one serial session.
+
+        :param list commands: Commands to execute on controller, in order
+        :param str prompt: Expected prompt after each command
+        :param int timeout: Timeout of each command in seconds, learned from past runs if not given
+        :param on_output: Called with each command and its SerialOutput as soon as it is answered;
+                          an exception it raises ends the batch
+        :return: List of SerialOutput in command order
+        :raises SerialTimeoutError: If the prompt doesn't show up in time
+        """
+
+        learn = not prompt
+        if not prompt:
+            prompt = self.prompt
+
+        if not os.path.exists(self.device_id):
+            raise SetupError("Unable to detect serial connection")
+
+        with Serial(self.device_id, self.baudrate) as device:
+          p = self._session(device, SERIAL_COMMAND_TIMEOUT_SECONDS)
+          outputs = []
+          for command in commands:
+              outputs.append(self._exchange(p, command, prompt, timeout, learn))
+              if on_output:
+                  on_output(command, outputs[-1])
+          return outputs
+
+
+    def run_to_file(self, command, path, timeout=None):
+        """
+        Runs command on Aruba controller and streams its output to a file.
+
+        Output is compacted as it arrives, as compact_output would: the echo,
+        blank lines and the trailing prompt are dropped. Memory use is one
+        console read and the prompt search window, whatever the output size.
+        Streamed exchanges are not recorded in the session archive.
+
+        :param str command: Command to execute on controller
+        :param str path: Output file, overwritten
+        :param int timeout: Command timeout in seconds, learned from past runs if not given
+        :return: Number of lines written
+        :raises SetupError: IF serial is not connected
+        :raises SerialTimeoutError: If the prompt doesn't show up in time
+        """
+
+        learn = is_read_only(command)
+        if not timeout:
+            timeout = self.command_timeout(command) if learn else SERIAL_COMMAND_TIMEOUT_SECONDS
+        pattern = compile_prompt(self.prompt)
+
+        if not os.path.exists(self.device_id):
+            raise SetupError("Unable to detect serial connection")
+
+        with span(command_key(command), "serial", streamed=path), Serial(self.device_id, self.baudrate) as device, \
+                open(path, "w", encoding="utf-8") as stream:
+          p = self._session(device, SERIAL_COMMAND_TIMEOUT_SECONDS)
+          compactor = StreamingCompactor(stream)
+          tail = ""
+          start = time.monotonic()
+          deadline = start + timeout
+          p.sendline(command+"\r")
+          while not pattern.search(tail):
+              remaining = deadline - time.monotonic()
               try:
-                 p.sendline("no paging\r")
-                 p.expect(PROMPT.ADMIN_MODE, timeout=timeout)
-              except:
-                  logger.warning("%s: Unable to disable paging", self._name)
-          try:
-              p.sendline(command+"\r")
-              p.expect(prompt, timeout=timeout)
-              return SerialOutput(p.before.strip(), p.after.strip())
-          except TIMEOUT:
-              logger.debug("%s: prompt %s before %s after %s", self._name, prompt, p.before, p.after)
-              if prompt in p.before.split():
-                  return SerialOutput(p.before.strip(), p.after.strip())
-              logger.exception("%s: Timeout occured during command processing", self._name)
-              logger.error("%s: Entered command: %s", self._name, p.before)
-              logger.error("%s: Now it is prompting: %s", self._name, p.after)
-              raise FrameworkError("Failed to run command")
+                  if remaining <= 0:
+                      raise TIMEOUT("deadline")
+                  chunk = p.read_nonblocking(CONSOLE_READ_BYTES, timeout=remaining)
+              except (TIMEOUT, EOF):
+                  if learn:
+                      self.latency.record(self._name, command, timeout, compactor.chars, timed_out=True)
+                  logger.error("%s: Timeout occured while streaming %s to %s", self._name, command, path)
+                  raise SerialTimeoutError(f"Timed out waiting for prompt after {command}")
+              compactor.feed(chunk)
+              tail = (tail + chunk)[-PROMPT_SEARCH_WINDOW:]
+          compactor.close()
+          if learn:
+              self.latency.record(self._name, command, time.monotonic() - start, compactor.chars)
+        logger.info("%s: Streamed %d lines of %s to %s", self._name, compactor.lines, command, path)
+        return compactor.lines
+
+
+class ReplaySerial(AurubaControllerSerial):
+    """Serves a recorded console session in place of the serial device.
+
+    Answers come from a SessionArchive in recorded order, after the
+    recorded delay divided by speed (0 answers at once). Recorded timeouts
+    raise SerialTimeoutError again. Nothing is sent anywhere and the
+    latency model is left untouched.
+    """
+
+    def __init__(self, archive, prompt, name="", speed=1.0):
+        """
+        Constructs ReplaySerial
+
+        :param archive: Path of a session archive, or an instance of SessionArchive
+        :param str prompt: Default controller prompt
+        :param str name: Name of the controller
+        :param float speed: Replay speed factor, 0 for no delay
+        """
+
+        self.archive = archive if isinstance(archive, SessionArchive) else SessionArchive(archive)
+        self.device_id = self.archive.path
+        self.baudrate = None
+        self.prompt = prompt
+        self.speed = speed
+        self.recorder = None
+        self._admin = False
+        self._name = name or "device"
+        self._secret_next = False
+        self.state = None
+        self._paging_disabled = False
+        logger.info("%s: Replaying %d recorded exchanges from %s", self._name, len(self.archive), self.device_id)
+
+    def _replay(self, command):
+        label = "prompt probe" if command is None else REDACTED if self._secret_next else command_key(command)
+        with span(label, "replay"):
+            record = self.archive.next(command, secret=command is not None and self._secret_next)
+            self._secret_next = (record["after"] or "").strip() == PROMPT.PASSWORD.strip()
+            if self.speed:
+                time.sleep(record["seconds"] / self.speed)
+        if record["timed_out"]:
+            raise SerialTimeoutError(f"Timed out waiting for prompt after {command}")
+        return record
+
+    @property
+    def prompt_status(self):
+        try:
+            return self._observe(self._replay(None)["after"])
+        except SerialTimeoutError:
+            return self._observe(None)
+
+    def run(self, command, prompt=None, timeout=None):
+        record = self._replay(command)
+        self._observe(record["after"])
+        return SerialOutput(record["before"], (record["after"] or "").strip())
+
+    def run_batch(self, commands, prompt=None, timeout=None, on_output=None):
+        outputs = []
+        for command in commands:
+            outputs.append(self.run(command, prompt, timeout))
+            if on_output:
+                on_output(command, outputs[-1])
+        return outputs
+
+    def run_to_file(self, command, path, timeout=None):
+        output = compact_output(self._replay(command)["before"])
+        with open(path, "w", encoding="utf-8") as stream:
+            stream.write(output + "\n" if output else "")
+        return output.count("\n") + 1 if output else 0
@@ -0,0 +1,139 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.latency import command_key
+
+logger = logging.getLogger(__name__)
+
+SESSION_ARCHIVE_VERSION = 1
+# Stand-in for commands typed at a password prompt, never written to the archive.
+REDACTED = "<redacted>"
+# Key of prompt probes, which send an empty line.
+PROBE = None
+
+
+class SessionRecorder:
+    """Appends console exchanges to a gzip compressed JSON lines archive
+
+    The first line is a header naming the controller; every following line
+    is one exchange: the command, the expected prompt, the raw text before
+    the prompt, the matched prompt, the seconds until it showed up and
+    whether the command timed out. Prompt probes are recorded with a null
+    command. A command answered to a password prompt is replaced by
+    REDACTED.
+    """
+
+    def __init__(self, path, name=""):
+        self.path = path
+        self.name = name
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._started = time.time()
+        self._secret_next = False
+        self._write({"version": SESSION_ARCHIVE_VERSION, "controller": name, "started": self._started})
+        atexit.register(self.close)
+        logger.info("%s: Recording console session to %s", name, path)
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def record(self, command, prompt, before, after, seconds, timed_out=False, password_prompt=None):
+        """
+        Adds an exchange
+
+        :param str command: Command sent, None for a prompt probe
+        :param str prompt: Prompt expected after the command
+        :param str before: Raw console text before the prompt
+        :param str after: Matched prompt
+        :param float seconds: Seconds until the prompt, or the timeout
+        :param bool timed_out: Whether the prompt never showed up
+        :param str password_prompt: Prompt after which the next command is a secret
+        :return: None
+        """
+
+        with self._lock:
+            if self._file is None:
+                return
+            if command is not None and self._secret_next:
+                command = REDACTED
+            self._secret_next = bool(password_prompt) and (after or "").strip() == password_prompt.strip()
+            self._write({"offset": round(time.time() - self._started, 6), "command": command,
+                         "prompt": prompt if isinstance(prompt, str) else None, "before": before, "after": after,
+                         "seconds": round(seconds, 6), "timed_out": timed_out})
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        atexit.unregister(self.close)
+
+
+class SessionArchive:
+    """Exchanges of a recorded session, queued per command for replay
+
+    Each command replays its recorded answers in order; once they are used
+    up the last one is served again, so a short recording can drive a long
+    benchmark. Secrets typed at a password prompt are looked up as
+    REDACTED.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header = {}
+        self.records = []
+        self._queues = {}
+        self._lock = threading.Lock()
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            for number, line in enumerate(archive):
+                record = json.loads(line)
+                if number == 0:
+                    if record.get("version") != SESSION_ARCHIVE_VERSION:
+                        raise FrameworkError(f"Unsupported session archive version in {path}")
+                    self.header = record
+                    continue
+                self.records.append(record)
+                key = record["command"] if record["command"] in (PROBE, REDACTED) else command_key(record["command"])
+                self._queues.setdefault(key, []).append(record)
+        self._positions = dict.fromkeys(self._queues, 0)
+
+    def __len__(self):
+        return len(self.records)
+
+    def commands(self):
+        return sorted(key for key in self._queues if key not in (PROBE, REDACTED))
+
+    def next(self, command, secret=False):
+        """
+        Next recorded answer to a command
+
+        :param str command: Command sent, None for a prompt probe
+        :param bool secret: Whether the command answers a password prompt
+        :return: Record dictionary
+        :raises FrameworkError: If the command was never recorded
+        """
+
+        key = REDACTED if secret else command if command is None else command_key(command)
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                raise FrameworkError(f"Command {command!r} not in session archive {self.path}")
+            position = self._positions[key]
+            self._positions[key] = min(position + 1, len(queue) - 1)
+            return queue[position]
+
+    def rewind(self):
+        with self._lock:
+            self._positions = dict.fromkeys(self._queues, 0)
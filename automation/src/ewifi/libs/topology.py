@@ -0,0 +1,320 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import re
+import threading
+import time
+
+from ewifi.libs.errors import ControllerError, SerialTimeoutError, SetupError
+from ewifi.libs.parsers import iter_table
+from ewifi.libs.resilience import CircuitBreaker, is_read_only
+
+logger = logging.getLogger(__name__)
+
+TOPOLOGY_TTL_SECONDS = 300
+VRRP_CHECK_SECONDS = 30
+LATENCY_SMOOTHING = 0.2
+
+ROLE_MASTER = "master"
+ROLE_STANDBY = "standby"
+ROLE_LOCAL = "local"
+
+VIRTUAL_ROUTER = re.compile(r"^Virtual Router (\d+):")
+VRRP_FIELDS = {
+    "admin_state": re.compile(r"Admin State (\S+)"),
+    "state": re.compile(r"VR State (\S+)"),
+    "ip": re.compile(r"IP Address (\d+\.\d+\.\d+\.\d+)"),
+    "mac": re.compile(r"MAC Address ([0-9a-fA-F:]{17})"),
+    "vlan": re.compile(r"vlan (\d+)"),
+    "priority": re.compile(r"Priority (\d+)"),
+}
+CONTROLLER_IP = re.compile(r"IP Address:\s*(\d+\.\d+\.\d+\.\d+)")
+
+# Errors of one controller during discovery; it is skipped and the others are still read.
+DISCOVERY_ERRORS = (ControllerError, SerialTimeoutError, SetupError, OSError)
+
+
+def parse_vrrp(output):
+    """
+    Parses show vrrp
+
+    :param str output: Command output
+    :return: Dictionary of virtual router ID to dictionary with description, admin_state, state, ip, mac, vlan and priority
+    """
+
+    routers = {}
+    router = None
+    for line in output.splitlines():
+        line = line.strip()
+        match = VIRTUAL_ROUTER.match(line)
+        if match:
+            router = routers[int(match.group(1))] = {"description": ""}
+            continue
+        if router is None:
+            continue
+        if line.startswith("Description"):
+            router["description"] = line[len("Description"):].strip()
+        for field, pattern in VRRP_FIELDS.items():
+            found = pattern.search(line)
+            if found and field not in router:
+                router[field] = found.group(1)
+    return routers
+
+
+def parse_switches(output):
+    """
+    Parses show switches
+
+    :param str output: Command output
+    :return: Dictionary of IP address to dictionary keyed by column header (Name, Type, Model, Status, ...)
+    """
+
+    return {row["IP Address"]: row for row in iter_table(output) if row.get("IP Address")}
+
+
+def parse_controller_ip(output):
+    """
+    Parses show controller-ip
+
+    :param str output: Command output
+    :return: Controller IP address, None if not found
+    """
+
+    match = CONTROLLER_IP.search(output)
+    return match.group(1) if match else None
+
+
+class ControllerNode:
+    """Controller of the cluster with its discovered role and current load"""
+
+    def __init__(self, name, controller):
+        self.name = name
+        self.controller = controller
+        self.ip = None
+        self.role = None
+        self.vrrp = {}
+        self.switch = {}
+        self.inflight = 0
+        self.served = 0
+        self.latency = None
+        self.lock = threading.Lock()
+
+    @property
+    def available(self):
+        breaker = getattr(self.controller, "breaker", None)
+        return breaker is None or breaker.state != CircuitBreaker.OPEN
+
+    def vrrp_states(self):
+        return {router: entry.get("state") for router, entry in self.vrrp.items()}
+
+    def as_dict(self):
+        return {"name": self.name, "ip": self.ip, "role": self.role, "vrrp": self.vrrp_states(),
+                "inflight": self.inflight, "served": self.served, "latency": self.latency,
+                "available": self.available}
+
+
+class TopologyResolver:
+    """Discovers the master/standby/local layout and routes commands on it
+
+    Roles come from show switches (master or local type of the controller
+    IP given by show controller-ip) and show vrrp: a master type controller
+    whose virtual routers are all BACKUP is the standby. The layout is
+    cached for ttl; every vrrp_check seconds only show vrrp is read, and a
+    change of any VR state triggers a full rediscovery.
+
+    Read-only commands go to the available controller with the fewest
+    commands in flight, then the lowest smoothed latency. Configuration
+    goes to the master. Commands to one controller are serialized, since
+    they share its console.
+    """
+
+    def __init__(self, controllers, ttl=TOPOLOGY_TTL_SECONDS, vrrp_check=VRRP_CHECK_SECONDS, clock=time.monotonic):
+        """
+        Constructs TopologyResolver
+
+        :param dict controllers: Controller name to AurubaController
+        :param int ttl: Seconds the discovered layout is trusted
+        :param int vrrp_check: Seconds between VRRP state checks
+        """
+
+        self.nodes = {name: ControllerNode(name, controller) for name, controller in controllers.items()}
+        self.ttl = ttl
+        self.vrrp_check = vrrp_check
+        self._clock = clock
+        self._lock = threading.RLock()
+        # Serializes rediscoveries, which talk to the consoles outside _lock.
+        self._discovery = threading.Lock()
+        self._discovered = None
+        self._checked = None
+
+    def _current(self):
+        """Cached roles if still trusted, None when a rediscovery is due"""
+
+        with self._lock:
+            if self._discovered is None:
+                return None
+            now = self._clock()
+            if now - self._discovered >= self.ttl:
+                return None
+            check = now - self._checked >= self.vrrp_check
+            if check:
+                # Claimed under the lock so concurrent callers do not all check.
+                self._checked = now
+            roles = self.roles()
+        if check and self._vrrp_changed():
+            return None
+        return roles
+
+    def discover(self, force=False):
+        """
+        Reads the layout from every controller unless the cached one is current
+
+        The consoles are read without holding the routing lock, so commands
+        keep being routed on the previous layout until the new one is in.
+
+        :param bool force: Rediscover even when the cache is current
+        :return: Dictionary of controller name to role
+        """
+
+        requested = self._clock()
+        if not force:
+            roles = self._current()
+            if roles is not None:
+                return roles
+
+        with self._discovery:
+            with self._lock:
+                if not force and self._discovered is not None and self._discovered >= requested:
+                    # Rediscovered by another thread while this one waited.
+                    return self.roles()
+
+            layouts = {}
+            for node in self.nodes.values():
+                if not node.available:
+                    continue
+                try:
+                    vrrp, switches, controller_ip = self._run(node, node.controller.run_batch,
+                                                              ["show vrrp", "show switches", "show controller-ip"])
+                except DISCOVERY_ERRORS as error:
+                    logger.warning("%s: Unable to discover role: %s", node.name, error)
+                    continue
+                ip = parse_controller_ip(controller_ip)
+                layouts[node] = (parse_vrrp(vrrp), ip, parse_switches(switches).get(ip, {}))
+
+            with self._lock:
+                for node, (vrrp, ip, switch) in layouts.items():
+                    node.vrrp, node.ip, node.switch = vrrp, ip, switch
+                    node.role = self._role(node)
+                self._discovered = self._checked = self._clock()
+                roles = self.roles()
+        logger.info("Controller topology: %s", ", ".join(f"{name} {role}" for name, role in sorted(roles.items())))
+        return roles
+
+    @staticmethod
+    def _role(node):
+        states = {entry.get("state") for entry in node.vrrp.values()}
+        if node.switch.get("Type", "").lower() == ROLE_MASTER or (not node.switch and "MASTER" in states):
+            return ROLE_STANDBY if states and "MASTER" not in states else ROLE_MASTER
+        return ROLE_LOCAL
+
+    def _vrrp_changed(self):
+        for node in self.nodes.values():
+            if not node.available:
+                continue
+            try:
+                states = {router: entry.get("state")
+                          for router, entry in parse_vrrp(self._run(node, node.controller.run, "show vrrp")).items()}
+            except DISCOVERY_ERRORS as error:
+                logger.warning("%s: Unable to check VRRP state: %s", node.name, error)
+                continue
+            if states != node.vrrp_states():
+                logger.info("%s: VRRP state changed from %s to %s", node.name, node.vrrp_states(), states)
+                return True
+        return False
+
+    def roles(self):
+        with self._lock:
+            return {name: node.role for name, node in self.nodes.items()}
+
+    def master(self):
+        """
+        Controller that takes configuration
+
+        :return: Instance of ControllerNode
+        :raises ControllerError: If no available master is known
+        """
+
+        self.discover()
+        masters = [node for node in self.nodes.values() if node.role == ROLE_MASTER and node.available]
+        if not masters:
+            raise ControllerError("No available master controller")
+        return masters[0]
+
+    def least_loaded(self):
+        """
+        Controller for the next read-only command
+
+        :return: Instance of ControllerNode
+        :raises ControllerError: If no controller is available
+        """
+
+        self.discover()
+        with self._lock:
+            candidates = [node for node in self.nodes.values() if node.available and node.role]
+            if not candidates:
+                raise ControllerError("No available controller")
+            return min(candidates, key=lambda node: (node.inflight, node.latency or 0.0, node.served))
+
+    def route(self, commands):
+        """
+        Controller a command, or a batch of commands, should run on
+
+        :param commands: Command string or list of command strings
+        :return: Instance of ControllerNode
+        """
+
+        if isinstance(commands, str):
+            commands = [commands]
+        if all(is_read_only(command) for command in commands):
+            return self.least_loaded()
+        return self.master()
+
+    def _run(self, node, function, *args):
+        with self._lock:
+            node.inflight += 1
+        start = self._clock()
+        try:
+            with node.lock:
+                return function(*args)
+        finally:
+            elapsed = self._clock() - start
+            with self._lock:
+                node.inflight -= 1
+                node.served += 1
+                node.latency = elapsed if node.latency is None else (
+                    LATENCY_SMOOTHING * elapsed + (1 - LATENCY_SMOOTHING) * node.latency)
+
+    def run(self, command, prompt=None, timeout=None):
+        """
+        Runs a command on the controller chosen by route()
+
+        :return: Tuple of (controller name, compacted output)
+        """
+
+        node = self.route(command)
+        return node.name, self._run(node, node.controller.run, command, prompt, timeout)
+
+    def run_batch(self, commands, prompt=None, timeout=None):
+        """
+        Runs commands over one session on the controller chosen by route()
+
+        :return: Tuple of (controller name, list of compacted outputs)
+        """
+
+        node = self.route(commands)
+        return node.name, self._run(node, node.controller.run_batch, commands, prompt, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {name: node.as_dict() for name, node in self.nodes.items()}
@@ -0,0 +1,319 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from ewifi.libs.errors import ControllerError, FrameworkError, SerialTimeoutError, SetupError
+from ewifi.libs.parsers import parse_control_plane_security
+
+logger = logging.getLogger(__name__)
+
+FLEET_MAX_WORKERS = 4
+
+# Errors ending a transaction on one controller; it is rolled back rather than left half applied.
+TRANSACTION_ERRORS = (ControllerError, FrameworkError, SetupError, SerialTimeoutError, OSError)
+
+# Lines ArubaOS prints when it rejects a configuration command.
+CONFIG_ERROR = re.compile(r"^\s*(% ?Invalid input|% ?Incomplete command|% ?Ambiguous command|Error:)", re.M)
+
+CPSEC_COMMAND = "show control-plane-security"
+RUNNING_CONFIG_COMMAND = "show run"
+
+# control-plane-security settings and the show control-plane-security parameter each one sets.
+CPSEC_SETTINGS = {
+    "cpsec-enable": "Control Plane Security",
+    "auto-cert-prov": "Auto Cert Provisioning",
+    "auto-cert-allow-all": "Auto Cert Allow All",
+}
+
+
+def config_error(output):
+    """
+    First error line of a configuration command output
+
+    :param str output: Command output
+    :return: Error line, or None if the command was accepted
+    """
+
+    match = CONFIG_ERROR.search(output or "")
+    return match.group(0).strip() if match else None
+
+
+class ConfigChange:
+    """Staged configuration line with its undo line and expected effect"""
+
+    __slots__ = ("line", "undo", "expect", "in_running_config")
+
+    def __init__(self, line, undo=None, expect=None, in_running_config=False):
+        self.line = line
+        self.undo = undo
+        self.expect = dict(expect or {})
+        self.in_running_config = in_running_config
+
+
+class TransactionResult:
+    """Outcome of a configuration transaction on one controller"""
+
+    def __init__(self, name):
+        self.name = name
+        self.applied = False
+        self.verified = False
+        self.rolled_back = False
+        self.errors = []
+        self.outputs = {}
+
+    @property
+    def ok(self):
+        return self.applied and self.verified and not self.errors
+
+    def as_dict(self):
+        return {"name": self.name, "ok": self.ok, "applied": self.applied, "verified": self.verified,
+                "rolled_back": self.rolled_back, "errors": list(self.errors)}
+
+
+class _Rejected(Exception):
+    """Ends the batch of a transaction at the first line the controller rejects"""
+
+
+class ConfigTransaction:
+    """Configuration lines applied together, verified, and undone on failure
+
+    The state the staged changes check (show control-plane-security, and
+    show run for changes that ask for it) is read before anything is sent.
+    Lines are then sent in order over one session, stopping at the first
+    that is rejected or fails to get an answer. The result is checked
+    against the expected parameter values and show run. If a line is
+    rejected, a command fails, or a check does not hold, only changes that
+    were sent, accepted and actually changed state from the snapshot are
+    undone, newest first; a setting that was already in place is left as
+    it was.
+    """
+
+    def __init__(self, controller, name=""):
+        self.controller = controller
+        self.name = name or "Controller"
+        self.changes = []
+
+    def stage(self, line, undo=None, expect=None, in_running_config=False):
+        """
+        Adds a configuration line
+
+        :param str line: Configuration command
+        :param str undo: Command reverting it, if the change can be undone
+        :param dict expect: show control-plane-security parameters and values expected afterwards
+        :param bool in_running_config: Whether the line should show up verbatim in show run
+        :return: self
+        """
+
+        self.changes.append(ConfigChange(line, undo, expect, in_running_config))
+        return self
+
+    def stage_cpsec(self, setting, enable=True):
+        """
+        Stages a control-plane-security setting with its undo and check
+
+        :param str setting: One of CPSEC_SETTINGS
+        :param bool enable: Enable or disable the setting
+        :return: self
+        """
+
+        if setting not in CPSEC_SETTINGS:
+            raise FrameworkError(f"Unknown control-plane-security setting {setting}")
+        on = f"control-plane-security {setting}"
+        off = f"control-plane-security no {setting}"
+        return self.stage(on if enable else off, undo=off if enable else on,
+                          expect={CPSEC_SETTINGS[setting]: "Enabled" if enable else "Disabled"})
+
+    def _send(self, lines):
+        outputs = self.controller.run_batch(lines)
+        return dict(zip(lines, outputs))
+
+    def _snapshot(self):
+        """
+        Reads the state the staged changes are checked against
+
+        :return: Tuple of (parameter name in lower case to value, set of show run lines), None where not needed
+        """
+
+        commands = []
+        if any(change.expect for change in self.changes):
+            commands.append(CPSEC_COMMAND)
+        if any(change.in_running_config for change in self.changes):
+            commands.append(RUNNING_CONFIG_COMMAND)
+        if not commands:
+            return None, None
+        outputs = self._send(commands)
+        parameters = None
+        running = None
+        if CPSEC_COMMAND in outputs:
+            parameters = parse_control_plane_security(outputs[CPSEC_COMMAND])
+        if RUNNING_CONFIG_COMMAND in outputs:
+            running = {line.strip() for line in outputs[RUNNING_CONFIG_COMMAND].splitlines()}
+        return parameters, running
+
+    @staticmethod
+    def _holds(change, parameters, running):
+        """
+        Whether the state shows a change in effect
+
+        :return: True or False, None if the change has nothing to check
+        """
+
+        checks = []
+        if change.expect and parameters is not None:
+            checks.append(all((parameters.get(parameter.lower()) or "").lower().startswith(expected.lower())
+                              for parameter, expected in change.expect.items()))
+        if change.in_running_config and running is not None:
+            checks.append(change.line.strip() in running)
+        return all(checks) if checks else None
+
+    def _verify(self, result):
+        parameters, running = self._snapshot()
+        if parameters is None and running is None:
+            return True
+        for change in self.changes:
+            for parameter, expected in change.expect.items():
+                value = parameters.get(parameter.lower())
+                if value is None or not value.lower().startswith(expected.lower()):
+                    result.errors.append(f"{change.line}: {parameter} is {value}, expected {expected}")
+            if change.in_running_config and change.line.strip() not in running:
+                result.errors.append(f"{change.line}: not in running configuration")
+        return not result.errors
+
+    def rollback(self, result, before, accepted, unanswered=None):
+        """
+        Undoes the changes that took effect, newest first
+
+        :param result: Instance of TransactionResult receiving the errors
+        :param tuple before: Snapshot taken before applying, see _snapshot
+        :param accepted: Lines sent and accepted by the controller
+        :param str unanswered: Line sent without an answer, which may or may not have been applied
+        :return: None
+        """
+
+        after = (None, None)
+        if unanswered is not None:
+            try:
+                after = self._snapshot()
+            except TRANSACTION_ERRORS as error:
+                result.errors.append(f"unable to read state after {unanswered}: {error}")
+
+        undo = []
+        for change in reversed(self.changes):
+            if not change.undo or (change.line not in accepted and change.line != unanswered):
+                continue
+            if self._holds(change, *before) is True:
+                logger.info("%s: %s was already in effect, leaving it", result.name, change.line)
+                continue
+            if change.line == unanswered and self._holds(change, *after) is not True:
+                if self._holds(change, *after) is None:
+                    result.errors.append(f"{change.line}: unknown whether it was applied, not undone")
+                continue
+            undo.append(change.undo)
+        if not undo:
+            return
+        logger.warning("%s: Rolling back %d configuration lines", result.name, len(undo))
+        try:
+            outputs = self._send(undo)
+        except TRANSACTION_ERRORS as error:
+            result.errors.append(f"rollback failed: {error}")
+            return
+        for line, output in outputs.items():
+            error = config_error(output)
+            if error:
+                result.errors.append(f"rollback {line}: {error}")
+        result.rolled_back = True
+
+    def apply(self):
+        """
+        Applies, verifies and if needed rolls back the staged lines
+
+        :return: Instance of TransactionResult
+        """
+
+        result = TransactionResult(self.name)
+        if not self.changes:
+            result.applied = result.verified = True
+            return result
+
+        try:
+            before = self._snapshot()
+        except TRANSACTION_ERRORS as error:
+            result.errors.append(f"unable to read state before applying: {error}")
+            logger.error("%s: Configuration transaction not applied: %s", result.name, error)
+            return result
+
+        logger.info("%s: Applying %d configuration lines", result.name, len(self.changes))
+        lines = [change.line for change in self.changes]
+        accepted = []
+
+        def answered(line, output):
+            result.outputs[line] = output
+            error = config_error(output)
+            if error:
+                result.errors.append(f"{line}: {error}")
+                raise _Rejected(line)
+            accepted.append(line)
+
+        unanswered = None
+        try:
+            self.controller.run_batch(lines, on_output=answered)
+        except _Rejected:
+            pass
+        except TRANSACTION_ERRORS as error:
+            result.errors.append(str(error))
+            # Lines are answered in order, so the first one without an answer is the one in flight.
+            unanswered = next((line for line in lines if line not in result.outputs), None)
+        if not result.errors:
+            result.applied = True
+            try:
+                result.verified = self._verify(result)
+            except TRANSACTION_ERRORS as error:
+                result.errors.append(str(error))
+
+        if not result.ok:
+            logger.error("%s: Configuration transaction failed: %s", result.name, "; ".join(result.errors))
+            self.rollback(result, before, accepted, unanswered)
+        else:
+            logger.info("%s: Configuration transaction applied and verified", result.name)
+        return result
+
+
+def apply_fleet(targets, stage, max_workers=FLEET_MAX_WORKERS, controller_class=None):
+    """
+    Runs one configuration transaction per controller with bounded concurrency
+
+    :param dict targets: Controller name to configuration file
+    :param stage: Callable staging lines on a ConfigTransaction
+    :param int max_workers: Controllers configured at the same time
+    :param controller_class: Controller type, AurubaController by default
+    :return: Dictionary of controller name to TransactionResult
+    """
+
+    if controller_class is None:
+        from ewifi.libs.controller import AurubaController as controller_class
+
+    def configure(name, conf_file):
+        try:
+            transaction = controller_class(conf_file, name=name).transaction()
+        except TRANSACTION_ERRORS as error:
+            result = TransactionResult(name)
+            result.errors.append(f"unable to open controller: {error}")
+            return result
+        stage(transaction)
+        return transaction.apply()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(configure, name, conf_file) for name, conf_file in targets.items()}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as error:
+                # One controller failing in an unexpected way must not hide the results of the others.
+                logger.exception("%s: Configuration transaction crashed", name)
+                results[name] = TransactionResult(name)
+                results[name].errors.append(f"transaction crashed: {error}")
+    return results
@@ -0,0 +1,91 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+VERSION_FILE = os.path.expanduser("~/.ewifi/versions.json")
+
+
+class VersionCache:
+    """ArubaOS version of each controller, kept in a JSON file across runs
+
+    Entries are keyed by controller name and remember the serial device
+    they were read on; a different device is a different controller. The
+    controller drops its entry whenever it finds the console back at the
+    login or boot loader prompt, which is where a reboot leaves it.
+    """
+
+    def __init__(self, path=VERSION_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._versions = {}
+        self.load()
+
+    def get(self, controller, device_id):
+        with self._lock:
+            entry = self._versions.get(controller)
+        if entry and entry.get("device_id") == device_id:
+            return entry.get("version")
+        return None
+
+    def put(self, controller, device_id, version):
+        with self._lock:
+            self._versions[controller] = {"device_id": device_id, "version": version}
+        self.save()
+
+    def invalidate(self, controller):
+        with self._lock:
+            if self._versions.pop(controller, None) is None:
+                return
+        logger.info("%s: Cached version dropped", controller)
+        self.save()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as cache:
+                content = json.load(cache)
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable version cache %s", self.path)
+            return
+        with self._lock:
+            self._versions.update(content)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            content = dict(self._versions)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temporary = f"{self.path}.{os.getpid()}.tmp"
+            with open(temporary, "w") as cache:
+                json.dump(content, cache)
+            os.replace(temporary, self.path)
+        except OSError:
+            logger.warning("Unable to save version cache %s", self.path)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def version_cache(path=VERSION_FILE):
+    """
+    Version cache shared by every controller in this process
+
+    :param str path: JSON file the cache is kept in
+    :return: Instance of VersionCache
+    """
+
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = VersionCache(path)
+        return cache
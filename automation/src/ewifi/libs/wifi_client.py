@@ -0,0 +1,394 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ewifi.libs.errors import ControllerError, FrameworkError, SerialTimeoutError, SetupError
+from ewifi.libs.latency import percentile
+from ewifi.libs.parsers import parse_auth_tracebuf, parse_user_table
+from ewifi.libs.wifi_scan import SCAN_FIELDS, parse_wifi_list, split_terse
+
+logger = logging.getLogger(__name__)
+
+NMCLI_TIMEOUT_SECONDS = 30
+CONNECT_TIMEOUT_SECONDS = 30
+POLL_INTERVAL_SECONDS = 0.05
+
+# NetworkManager device states, as reported by GENERAL.STATE.
+STATE_DISCONNECTED = 30
+STATE_PREPARE = 40
+STATE_CONFIG = 50
+STATE_NEED_AUTH = 60
+STATE_IP_CONFIG = 70
+STATE_ACTIVATED = 100
+STATE_FAILED = 120
+
+PHASES = ("scan", "associate", "auth", "dhcp")
+
+# Errors of a controller lookup; the attempt is then correlated from a later snapshot.
+OBSERVE_ERRORS = (ControllerError, FrameworkError, SerialTimeoutError, SetupError, OSError)
+
+
+def _run_command(argv, timeout):
+    result = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True,
+                            timeout=timeout)
+    if result.returncode:
+        raise FrameworkError(f"{' '.join(argv)}: {result.stderr.strip() or result.returncode}")
+    return result.stdout
+
+
+class NmcliBackend:
+    """One Wi-Fi interface driven through nmcli
+
+    The runner takes the argument list and a timeout and returns stdout; it
+    defaults to subprocess and is replaced by SimulatedNmcli for load tests
+    without radios.
+    """
+
+    def __init__(self, ifname, sudo=True, runner=None, timeout=NMCLI_TIMEOUT_SECONDS):
+        self.ifname = ifname
+        self.sudo = sudo
+        self.timeout = timeout
+        self._runner = runner or _run_command
+
+    def nmcli(self, *args):
+        argv = (["sudo"] if self.sudo else []) + ["nmcli"] + list(args)
+        return self._runner(argv, self.timeout)
+
+    def scan(self):
+        """
+        Rescans and lists the visible networks
+
+        :return: List of ScanRecord
+        """
+
+        self.nmcli("dev", "wifi", "rescan", "ifname", self.ifname)
+        return parse_wifi_list(self.nmcli("-t", "-f", SCAN_FIELDS, "dev", "wifi", "list", "ifname", self.ifname))
+
+    def connect(self, ssid, password=None):
+        """Starts connecting to an SSID without waiting for activation."""
+
+        args = ["--wait", "0", "dev", "wifi", "connect", ssid]
+        if password:
+            args += ["password", password]
+        self.nmcli(*args + ["ifname", self.ifname])
+
+    def device(self):
+        """
+        Current device state
+
+        :return: Dictionary with state (int), hwaddr and ip
+        """
+
+        output = self.nmcli("-t", "-f", "GENERAL.STATE,GENERAL.HWADDR,IP4.ADDRESS", "dev", "show", self.ifname)
+        device = {"state": 0, "hwaddr": "", "ip": ""}
+        for line in output.splitlines():
+            fields = split_terse(line)
+            key, value = fields[0], ":".join(fields[1:])
+            if key == "GENERAL.STATE":
+                state = value.split()[0] if value else ""
+                device["state"] = int(state) if state.isdigit() else 0
+            elif key == "GENERAL.HWADDR":
+                device["hwaddr"] = value.lower()
+            elif key.startswith("IP4.ADDRESS") and not device["ip"]:
+                device["ip"] = value.partition("/")[0]
+        return device
+
+    def disconnect(self):
+        self.nmcli("dev", "disconnect", self.ifname)
+
+
+class SimulatedNmcli:
+    """Stands in for nmcli on one simulated client radio
+
+    Each connect draws a duration for association, authentication and
+    DHCP from a log-normal distribution around the given medians, and
+    fails with failure_rate. GENERAL.STATE then walks through the
+    NetworkManager states as time passes, like a real device would.
+    """
+
+    def __init__(self, networks=(), medians=None, failure_rate=0.0, seed=None, clock=time.monotonic,
+                 scan_seconds=0.0):
+        self.networks = list(networks)
+        self.medians = dict({"associate": 0.2, "auth": 0.1, "dhcp": 0.5}, **(medians or {}))
+        self.failure_rate = failure_rate
+        self.scan_seconds = scan_seconds
+        self._random = random.Random(seed)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.hwaddr = "02:" + ":".join(f"{self._random.randrange(256):02x}" for _ in range(5))
+        self._connected = None
+        self._durations = {}
+        self._fails = False
+
+    def _draw(self, median):
+        return median * self._random.lognormvariate(0, 0.5) if median else 0.0
+
+    def _state(self):
+        if self._connected is None:
+            return STATE_DISCONNECTED, ""
+        elapsed = self._clock() - self._connected
+        boundary = 0.0
+        for phase, state in (("associate", STATE_CONFIG), ("auth", STATE_NEED_AUTH), ("dhcp", STATE_IP_CONFIG)):
+            boundary += self._durations[phase]
+            if elapsed < boundary:
+                return state, ""
+            if self._fails and phase == "auth":
+                return STATE_FAILED, ""
+        octets = self.hwaddr.split(":")
+        return STATE_ACTIVATED, f"10.{int(octets[3], 16)}.{int(octets[4], 16)}.{int(octets[5], 16) or 1}"
+
+    def __call__(self, argv, timeout):
+        args = argv[argv.index("nmcli") + 1:]
+        with self._lock:
+            if "rescan" in args:
+                time.sleep(self.scan_seconds)
+                return ""
+            if "list" in args:
+                return "\n".join(":".join(str(field).replace(":", "\\:") for field in network)
+                                 for network in self.networks)
+            if "connect" in args:
+                self._connected = self._clock()
+                self._durations = {phase: self._draw(median) for phase, median in self.medians.items()}
+                self._fails = self._random.random() < self.failure_rate
+                return ""
+            if "disconnect" in args:
+                self._connected = None
+                return ""
+            if "show" in args:
+                state, ip = self._state()
+                lines = [f"GENERAL.STATE:{state} (simulated)", "GENERAL.HWADDR:" + self.hwaddr.replace(":", "\\:")]
+                if ip:
+                    lines.append(f"IP4.ADDRESS[1]:{ip}/24")
+                return "\n".join(lines)
+        raise FrameworkError(f"Unsupported simulated nmcli command: {' '.join(args)}")
+
+
+def simulated_backends(count, ssid, failure_rate=0.0, medians=None, seed=None):
+    """
+    Backends for a load test without radios
+
+    :param int count: Number of simulated clients
+    :param str ssid: SSID the simulated clients see
+    :param float failure_rate: Fraction of attempts failing authentication
+    :param dict medians: Median seconds of associate, auth and dhcp
+    :param seed: Random seed for reproducible runs
+    :return: List of NmcliBackend
+    """
+
+    seeder = random.Random(seed)
+    networks = [(ssid, "00:24:6c:00:00:01", 36, 80, "WPA2")]
+    return [NmcliBackend(f"sim{index}", sudo=False,
+                         runner=SimulatedNmcli(networks, medians, failure_rate, seeder.random()))
+            for index in range(count)]
+
+
+class AttemptResult:
+    """Outcome and per-phase latencies of one onboarding attempt"""
+
+    __slots__ = ("client", "mac", "ssid", "started", "ok", "error", "ip", "phases", "total", "observed", "user")
+
+    def __init__(self, client, mac="", ssid="", started=0.0):
+        self.client = client
+        self.mac = mac
+        self.ssid = ssid
+        self.started = started
+        self.ok = False
+        self.error = ""
+        self.ip = ""
+        self.phases = {}
+        self.total = 0.0
+        self.observed = False
+        self.user = None
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class OnboardingHarness:
+    """Runs onboarding attempts on many clients in parallel
+
+    Each attempt scans, starts the connection and polls the device state.
+    The phases are timed from the NetworkManager state transitions:
+    associate until the device leaves config (association and key
+    exchange), auth while it waits in need-auth, dhcp from ip-config to
+    activated. Attempts on one client run in sequence, clients run
+    concurrently. With an observer, what the controller sees of the client
+    is read after each attempt, before the client disconnects.
+    """
+
+    def __init__(self, backends, ssid, password=None, timeout=CONNECT_TIMEOUT_SECONDS,
+                 poll_interval=POLL_INTERVAL_SECONDS, scan=True, clock=time.monotonic, observe=None):
+        """
+        Constructs OnboardingHarness
+
+        :param observe: Callable taking an AttemptResult and returning its user-table row or None,
+                        e.g. user_table_observer(controller)
+        """
+
+        self.observe = observe
+        self.backends = list(backends)
+        self.ssid = ssid
+        self.password = password
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.scan = scan
+        self._clock = clock
+
+    def attempt(self, backend):
+        """
+        One scan, connect and wait for activation
+
+        :param backend: Instance of NmcliBackend
+        :return: Instance of AttemptResult
+        """
+
+        result = AttemptResult(backend.ifname, ssid=self.ssid, started=time.time())
+        start = self._clock()
+        try:
+            if self.scan:
+                networks = backend.scan()
+                result.phases["scan"] = self._clock() - start
+                if not any(network.ssid == self.ssid for network in networks):
+                    raise FrameworkError(f"SSID {self.ssid} not visible")
+            self._connect(backend, result)
+        except (FrameworkError, OSError, subprocess.SubprocessError) as error:
+            result.error = str(error)
+        result.total = self._clock() - start
+        return result
+
+    def _connect(self, backend, result):
+        start = self._clock()
+        backend.connect(self.ssid, self.password)
+        entered = {}
+        deadline = start + self.timeout
+        while True:
+            device = backend.device()
+            now = self._clock()
+            result.mac = device["hwaddr"] or result.mac
+            state = device["state"]
+            for boundary in (STATE_NEED_AUTH, STATE_IP_CONFIG, STATE_ACTIVATED):
+                if state >= boundary and state != STATE_FAILED:
+                    entered.setdefault(boundary, now)
+            if state == STATE_ACTIVATED:
+                result.ip = device["ip"]
+                result.ok = True
+                break
+            if state == STATE_FAILED or (entered and state <= STATE_DISCONNECTED):
+                raise FrameworkError(f"Connection to {self.ssid} failed in state {state}")
+            if now >= deadline:
+                raise FrameworkError(f"Connection to {self.ssid} timed out in state {state}")
+            time.sleep(self.poll_interval)
+
+        auth_start = entered.get(STATE_NEED_AUTH, entered[STATE_IP_CONFIG])
+        result.phases["associate"] = auth_start - start
+        result.phases["auth"] = entered[STATE_IP_CONFIG] - auth_start
+        result.phases["dhcp"] = entered[STATE_ACTIVATED] - entered[STATE_IP_CONFIG]
+
+    def _client(self, backend, attempts):
+        results = []
+        for number in range(attempts):
+            result = self.attempt(backend)
+            logger.info("%s: attempt %d: %s in %.2f seconds%s", backend.ifname, number + 1,
+                        "connected" if result.ok else "failed", result.total,
+                        f" ({result.error})" if result.error else "")
+            results.append(result)
+            if self.observe and result.mac:
+                try:
+                    result.user = self.observe(result)
+                    result.observed = True
+                except OBSERVE_ERRORS as error:
+                    logger.warning("%s: Unable to look %s up on the controller: %s", backend.ifname, result.mac, error)
+            try:
+                backend.disconnect()
+            except (FrameworkError, OSError, subprocess.SubprocessError) as error:
+                logger.warning("%s: Unable to disconnect: %s", backend.ifname, error)
+        return results
+
+    def run(self, attempts=1):
+        """
+        Runs attempts on every client concurrently
+
+        :param int attempts: Attempts per client
+        :return: List of AttemptResult in completion order of the clients
+        """
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.backends))) as executor:
+            futures = [executor.submit(self._client, backend, attempts) for backend in self.backends]
+            return [result for future in futures for result in future.result()]
+
+
+def summarize_attempts(results):
+    """
+    Aggregates attempt results
+
+    :param results: List of AttemptResult
+    :return: Dictionary with counts, attempts per second and p50/p90/p99/max of each phase
+    """
+
+    summary = {"attempts": len(results), "succeeded": sum(1 for result in results if result.ok)}
+    summary["failed"] = summary["attempts"] - summary["succeeded"]
+    if results:
+        span = max(result.started + result.total for result in results) - min(result.started for result in results)
+        summary["attempts_per_second"] = len(results) / span if span else None
+    phases = {}
+    for phase in PHASES + ("total",):
+        values = [result.total if phase == "total" else result.phases[phase]
+                  for result in results if result.ok and (phase == "total" or phase in result.phases)]
+        if values:
+            phases[phase] = {"p50": percentile(values, 0.5), "p90": percentile(values, 0.9),
+                             "p99": percentile(values, 0.99), "max": max(values)}
+    summary["phases"] = phases
+    return summary
+
+
+def user_table_observer(controller):
+    """
+    Observer looking each client up in the user table while it is still associated
+
+    Lookups share the controller console, so they run one at a time.
+
+    :param controller: Instance of AurubaController
+    :return: Callable taking an AttemptResult and returning its user-table row, None if absent
+    """
+
+    lock = threading.Lock()
+
+    def observe(result):
+        with lock:
+            output = controller.run(f"show user-table mac {result.mac}")
+        return next((row for row in parse_user_table(output) if row["MAC"].lower() == result.mac), None)
+
+    return observe
+
+
+def correlate(results, user_table, auth_tracebuf):
+    """
+    Matches attempts with what the controller saw of each client
+
+    Attempts observed while associated use that user-table row; the
+    others are looked up in user_table.
+
+    :param results: List of AttemptResult
+    :param str user_table: show user-table output, None if every attempt was observed
+    :param str auth_tracebuf: show auth-tracebuf output
+    :return: List of dictionaries with the attempt, its user-table row (or None) and its auth events
+    """
+
+    users = {row["MAC"].lower(): row for row in parse_user_table(user_table or "")}
+    events = {}
+    for event in parse_auth_tracebuf(auth_tracebuf):
+        if event["station"]:
+            events.setdefault(event["station"], []).append(event)
+
+    correlated = []
+    for result in results:
+        user = result.user if result.observed else users.get(result.mac)
+        correlated.append({"attempt": result.as_dict(), "user": user, "auth_events": events.get(result.mac, []),
+                           "consistent": result.ok == (user is not None)})
+    return correlated
@@ -0,0 +1,193 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import logging
+import threading
+import time
+from collections import deque
+
+from ewifi.libs.parsers import parse_ap_database, parse_essids
+
+logger = logging.getLogger(__name__)
+
+SCAN_FIELDS = "SSID,BSSID,CHAN,SIGNAL,SECURITY"
+SCAN_MAX_AGE_SECONDS = 30
+SIGNAL_HISTORY = 32
+
+
+def split_terse(line):
+    """
+    Splits a line of nmcli --terse output on unescaped colons
+
+    :param str line: Line of nmcli -t output
+    :return: List of field values with \\: and \\\\ unescaped
+    """
+
+    fields = [""]
+    escaped = False
+    for char in line:
+        if escaped:
+            fields[-1] += char
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ":":
+            fields.append("")
+        else:
+            fields[-1] += char
+    return fields
+
+
+class ScanRecord:
+    """BSS heard in a Wi-Fi scan, with its recent signal levels"""
+
+    __slots__ = ("bssid", "ssid", "channel", "signal", "security", "first_seen", "last_seen", "history")
+
+    def __init__(self, bssid, ssid="", channel="", signal=None, security=""):
+        self.bssid = bssid
+        self.ssid = ssid
+        self.channel = channel
+        self.signal = signal
+        self.security = security
+        self.first_seen = None
+        self.last_seen = None
+        self.history = deque(maxlen=SIGNAL_HISTORY)
+
+    def as_dict(self):
+        record = {name: getattr(self, name) for name in self.__slots__}
+        record["history"] = list(self.history)
+        return record
+
+
+def parse_wifi_list(output):
+    """
+    Parses nmcli -t -f SSID,BSSID,CHAN,SIGNAL,SECURITY dev wifi list
+
+    :param str output: Command output
+    :return: List of ScanRecord, hidden SSIDs have an empty ssid
+    """
+
+    records = []
+    for line in output.splitlines():
+        fields = split_terse(line)
+        if len(fields) < 5 or not fields[1]:
+            continue
+        ssid, bssid, channel, signal, security = fields[:5]
+        records.append(ScanRecord(bssid.lower(), "" if ssid == "--" else ssid, channel,
+                                  int(signal) if signal.isdigit() else None,
+                                  "" if security == "--" else security))
+    return records
+
+
+class ScanDiff:
+    """Result of a scan: the cache and what changed since the last scan"""
+
+    def __init__(self, records, appeared=(), disappeared=(), cached=False):
+        self.records = records
+        self.appeared = list(appeared)
+        self.disappeared = list(disappeared)
+        self.cached = cached
+
+
+class WifiScanner:
+    """BSSID keyed cache of Wi-Fi scan results
+
+    A scan younger than max_age is answered from the cache without asking
+    the radio to rescan. Each fresh scan refreshes last_seen and appends to
+    the signal history of the BSSes heard; BSSes missing from the scan are
+    dropped from the cache and reported as disappeared.
+    """
+
+    def __init__(self, backend, max_age=SCAN_MAX_AGE_SECONDS, clock=time.time):
+        self.backend = backend
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records = {}
+        self._scanned = None
+
+    @property
+    def records(self):
+        with self._lock:
+            return dict(self._records)
+
+    def is_fresh(self):
+        return self._scanned is not None and self._clock() - self._scanned < self.max_age
+
+    def scan(self, force=False):
+        """
+        Scans unless the cached results are still fresh
+
+        :param bool force: Rescan even when the cache is fresh
+        :return: Instance of ScanDiff
+        """
+
+        with self._lock:
+            if not force and self.is_fresh():
+                return ScanDiff(dict(self._records), cached=True)
+            heard = self.backend.scan()
+            now = self._clock()
+            self._scanned = now
+
+            appeared = []
+            current = {}
+            for record in heard:
+                known = self._records.get(record.bssid)
+                if known is None:
+                    known = record
+                    known.first_seen = now
+                    appeared.append(known)
+                else:
+                    known.ssid, known.channel, known.security = record.ssid, record.channel, record.security
+                    known.signal = record.signal
+                known.last_seen = now
+                known.history.append((now, record.signal))
+                current[known.bssid] = known
+            disappeared = [record for bssid, record in self._records.items() if bssid not in current]
+            self._records = current
+
+        if appeared or disappeared:
+            logger.info("%s: %d BSSes appeared, %d disappeared", self.backend.ifname, len(appeared), len(disappeared))
+        return ScanDiff(dict(current), appeared, disappeared)
+
+    def ssids(self):
+        """
+        BSSes of the cache grouped by SSID
+
+        :return: Dictionary of SSID to list of ScanRecord
+        """
+
+        grouped = {}
+        for record in self.records.values():
+            grouped.setdefault(record.ssid, []).append(record)
+        return grouped
+
+
+def coverage_audit(records, essids_output, ap_database_output):
+    """
+    Cross references scan results with the controller view
+
+    :param records: Iterable of ScanRecord
+    :param str essids_output: show ap essid output
+    :param str ap_database_output: show ap database output
+    :return: Dictionary with per ESSID BSS counts and signal, ESSIDs not heard, SSIDs unknown to the controller, and AP counts
+    """
+
+    heard = {}
+    for record in records:
+        heard.setdefault(record.ssid, []).append(record)
+    essids = {row["ESSID"]: row for row in parse_essids(essids_output)}
+    aps = parse_ap_database(ap_database_output)
+
+    coverage = {}
+    for essid, row in essids.items():
+        bsses = heard.get(essid, [])
+        signals = [record.signal for record in bsses if record.signal is not None]
+        coverage[essid] = {"controller_aps": row.get("APs", ""), "clients": row.get("Clients", ""),
+                           "bsses_heard": len(bsses), "best_signal": max(signals) if signals else None,
+                           "channels": sorted({record.channel for record in bsses})}
+    return {"essids": coverage,
+            "not_heard": sorted(essid for essid in essids if essid not in heard),
+            "unknown_ssids": sorted(ssid for ssid in heard if ssid and ssid not in essids),
+            "aps_total": len(aps),
+            "aps_up": sum(1 for ap in aps if ap.get("Status", "").startswith("Up"))}
@@ -0,0 +1,187 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import hashlib
+import logging
+import threading
+
+from ewifi.libs.parsers import iter_table, parse_parameters
+from ewifi.libs.ports import parse_ip_interface_br
+from ewifi.libs.topology import parse_switches
+
+logger = logging.getLogger(__name__)
+
+VAP = "vap"
+SSID_PROFILE = "ssid-profile"
+AAA_PROFILE = "aaa-profile"
+VLAN = "vlan"
+ESSID = "essid"
+INTERFACE = "interface"
+PORT = "port"
+
+LIST_COMMANDS = ["show wlan virtual-ap", "show vlan", "show ip interface br", "show switches"]
+UNSET = ("", "N/A", "none")
+
+
+def _digest(output):
+    return hashlib.sha1(output.encode("utf-8", "replace")).digest()
+
+
+def _values(value):
+    return [item.strip() for item in value.replace(",", " ").split() if item.strip() not in UNSET]
+
+
+class WlanTopology:
+    """Graph of virtual APs, SSID and AAA profiles, ESSIDs, VLANs, interfaces and ports
+
+    Edges run from each virtual AP to its SSID profile, AAA profile and
+    VLANs, from an SSID profile to its ESSID and from a VLAN to its
+    interface and ports. Everything a virtual AP reaches is related, so
+    after each refresh every node gets a precomputed map of the related
+    nodes of each kind; "which ESSIDs land on VLAN 20" is a dictionary hit.
+
+    A refresh reads the lists (virtual APs, VLANs, interfaces, switches)
+    in one session. Virtual AP profiles are pulled in a second session,
+    only for new virtual APs, or for all of them when the cluster Config
+    ID moved; then referenced SSID profiles that are new or whose virtual
+    AP changed, or all of them when the Config ID moved, are pulled in a
+    third. Profiles whose output digest did not change are not parsed
+    again.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self._lock = threading.Lock()
+        self.vaps = {}
+        self.ssid_profiles = {}
+        self.vlans = {}
+        self.interfaces = {}
+        self._digests = {}
+        self._config_id = None
+        self._edges = {}
+        self._related = {}
+
+    def refresh(self):
+        """
+        Pulls what changed and rebuilds the indexes
+
+        :return: List of virtual AP names whose profile was pulled
+        """
+
+        with self._lock:
+            vap_list, vlans, interfaces, switches = self.controller.run_batch(LIST_COMMANDS)
+            names = [row["Name"] for row in iter_table(vap_list) if row.get("Name")]
+            self.vlans = {row["VLAN"]: row for row in iter_table(vlans) if row.get("VLAN")}
+            self.interfaces = parse_ip_interface_br(interfaces)
+            config_id = tuple(sorted(row.get("Config ID", "") for row in parse_switches(switches).values()))
+
+            for name in [name for name in self.vaps if name not in names]:
+                del self.vaps[name]
+            reconfigured = config_id != self._config_id
+            if reconfigured:
+                pull = names
+            else:
+                pull = [name for name in names if name not in self.vaps]
+            self._config_id = config_id
+
+            changed = self._pull(VAP, pull, "show wlan virtual-ap {}", self.vaps)
+            referenced = {profile.get("SSID Profile") for profile in self.vaps.values()} - set(UNSET) - {None}
+            for name in [name for name in self.ssid_profiles if name not in referenced]:
+                del self.ssid_profiles[name]
+            profiles = sorted(name for name in referenced if reconfigured or name not in self.ssid_profiles or
+                              any(self.vaps[vap].get("SSID Profile") == name for vap in changed))
+            self._pull(SSID_PROFILE, profiles, "show wlan ssid-profile {}", self.ssid_profiles)
+            self._index()
+            logger.info("WLAN topology: %d virtual APs (%d pulled, %d changed), %d SSID profiles, %d VLANs",
+                        len(self.vaps), len(pull), len(changed), len(self.ssid_profiles), len(self.vlans))
+            return pull
+
+    def _pull(self, kind, names, template, store):
+        if not names:
+            return []
+        outputs = self.controller.run_batch([template.format(name) for name in names])
+        changed = []
+        for name, output in zip(names, outputs):
+            digest = _digest(output)
+            if self._digests.get((kind, name)) == digest and name in store:
+                continue
+            self._digests[(kind, name)] = digest
+            store[name] = parse_parameters(output)
+            changed.append(name)
+        return changed
+
+    def _index(self):
+        edges = {}
+
+        def link(source, target):
+            edges.setdefault(source, set()).add(target)
+
+        for vlan, row in self.vlans.items():
+            for port in _values(row.get("Ports", "")):
+                link((VLAN, vlan), (PORT, port))
+            if f"vlan {vlan}" in self.interfaces:
+                link((VLAN, vlan), (INTERFACE, f"vlan {vlan}"))
+        for name, profile in self.ssid_profiles.items():
+            essid = profile.get("ESSID", "")
+            if essid not in UNSET:
+                link((SSID_PROFILE, name), (ESSID, essid))
+        for name, profile in self.vaps.items():
+            edges.setdefault((VAP, name), set())
+            if profile.get("SSID Profile", "") not in UNSET:
+                link((VAP, name), (SSID_PROFILE, profile["SSID Profile"]))
+            if profile.get("AAA Profile", "") not in UNSET:
+                link((VAP, name), (AAA_PROFILE, profile["AAA Profile"]))
+            for vlan in _values(profile.get("VLAN", "")):
+                link((VAP, name), (VLAN, vlan))
+
+        related = {}
+        for node in [node for node in edges if node[0] == VAP]:
+            reached = {node}
+            frontier = [node]
+            while frontier:
+                for target in edges.get(frontier.pop(), ()):
+                    if target not in reached:
+                        reached.add(target)
+                        frontier.append(target)
+            for source in reached:
+                for target in reached:
+                    if source != target:
+                        related.setdefault(source, {}).setdefault(target[0], set()).add(target[1])
+        self._edges = edges
+        self._related = related
+
+    def related(self, kind, name, target_kind):
+        """
+        Nodes of target_kind sharing a virtual AP with a node
+
+        :param str kind: Kind of the node, e.g. VLAN
+        :param str name: Name of the node, e.g. "20"
+        :param str target_kind: Kind wanted, e.g. ESSID
+        :return: Sorted list of names
+        """
+
+        with self._lock:
+            return sorted(self._related.get((kind, str(name)), {}).get(target_kind, ()))
+
+    def essids_on_vlan(self, vlan):
+        return self.related(VLAN, vlan, ESSID)
+
+    def vlans_for_essid(self, essid):
+        return self.related(ESSID, essid, VLAN)
+
+    def vaps_on_vlan(self, vlan):
+        return self.related(VLAN, vlan, VAP)
+
+    def vaps_using_aaa_profile(self, profile):
+        return self.related(AAA_PROFILE, profile, VAP)
+
+    def describe(self, vap):
+        """
+        Everything a virtual AP maps to
+
+        :param str vap: Virtual AP name
+        :return: Dictionary of kind to sorted names, empty if unknown
+        """
+
+        with self._lock:
+            return {kind: sorted(names) for kind, names in self._related.get((VAP, vap), {}).items()}
@@ -0,0 +1,8 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import os
+import sys
+
+# Tests import ewifi the way the tools do, from the directory above them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,64 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import math
+
+import numpy as np
+
+from ewifi.libs.forecast import FORECAST, OK, SECONDS_PER_DAY, CapacityForecaster, LinearTrends
+
+DAYS = np.arange(10, dtype=np.float64)
+TIMES = DAYS * SECONDS_PER_DAY
+
+
+def test_fit_known_slopes_with_nan_series():
+    values = np.column_stack([2 * DAYS + 5, 100 - DAYS, np.full(len(DAYS), np.nan)])
+    values[3, 1] = np.nan
+    trends = LinearTrends(["rising", "falling", "empty"])
+    trends.update(TIMES, values)
+    slope, intercept = trends.fit()
+    assert np.allclose(slope[:2], [2.0, -1.0])
+    assert np.allclose(intercept[:2], [5.0, 100.0])
+    assert math.isnan(slope[2]) and math.isnan(intercept[2])
+
+
+def test_crossing_of_rising_line_only():
+    trends = LinearTrends(["rising", "falling"])
+    trends.update(TIMES, np.column_stack([2 * DAYS + 5, 100 - DAYS]))
+    crossing = trends.crossing([25.0, 50.0])
+    assert crossing[0] == 10 * SECONDS_PER_DAY
+    assert math.isnan(crossing[1])
+
+
+def test_half_life_follows_recent_growth_and_updates_incrementally():
+    days = np.arange(20, dtype=np.float64)
+    values = np.where(days < 10, 0.0, 10 * (days - 10))[:, None]
+    plain = LinearTrends(["users"])
+    plain.update(days * SECONDS_PER_DAY, values)
+    decayed = LinearTrends(["users"], half_life_days=1)
+    decayed.update(days * SECONDS_PER_DAY, values)
+    assert decayed.fit()[0][0] > 8 > plain.fit()[0][0]
+
+    chunked = LinearTrends(["users"], half_life_days=1)
+    chunked.update(days[:7] * SECONDS_PER_DAY, values[:7])
+    chunked.update(days[7:] * SECONDS_PER_DAY, values[7:])
+    assert np.allclose(chunked.fit(), decayed.fit())
+
+
+def test_forecast_ignores_crossings_in_the_past():
+    forecaster = CapacityForecaster()
+    forecaster.add("c", [0.0, SECONDS_PER_DAY, 2 * SECONDS_PER_DAY], [{"users": 0}, {"users": 100}, {"users": 50}])
+    forecaster.set_limits("c", {"users": 80})
+    now = 10 * SECONDS_PER_DAY
+    [result] = forecaster.forecast(now)
+    assert result["crosses_at"] < now
+    assert result["status"] == OK
+
+
+def test_forecast_reports_crossing_within_horizon():
+    forecaster = CapacityForecaster()
+    forecaster.add("c", TIMES, [{"users": day} for day in DAYS])
+    forecaster.set_limits("c", {"users": 95})
+    [result] = forecaster.forecast(9 * SECONDS_PER_DAY)
+    assert result["status"] == FORECAST
+    assert math.isclose(result["crosses_at"], 95 * SECONDS_PER_DAY)
@@ -0,0 +1,39 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+from ewifi.libs.running_config import MappedConfig, diff_configs
+
+CONFIG = """hostname controller-1
+!
+vlan 10
+!
+interface vlan 10
+ ip address 10.0.0.1 255.255.255.0
+!
+wlan ssid-profile corp
+ essid corp
+ opmode wpa2-aes
+"""
+
+
+def _write(directory, name, text):
+    path = directory / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_blocks_keeps_unclosed_last_block(tmp_path):
+    with MappedConfig(_write(tmp_path, "running.cfg", CONFIG)) as config:
+        blocks = config.blocks()
+        assert list(blocks) == ["hostname controller-1", "vlan 10", "interface vlan 10", "wlan ssid-profile corp"]
+        assert config.block_lines(blocks["wlan ssid-profile corp"]) == [
+            "wlan ssid-profile corp", " essid corp", " opmode wpa2-aes"]
+
+
+def test_diff_finds_change_in_last_block(tmp_path):
+    old = _write(tmp_path, "old.cfg", CONFIG)
+    new = _write(tmp_path, "new.cfg", CONFIG.replace("wpa2-aes", "wpa3-sae-aes"))
+    changes = diff_configs(old, new)
+    assert changes["added"] == [] and changes["removed"] == []
+    assert list(changes["changed"]) == ["wlan ssid-profile corp"]
+    assert "+ opmode wpa3-sae-aes" in changes["changed"]["wlan ssid-profile corp"]
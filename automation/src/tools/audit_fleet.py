@@ -0,0 +1,60 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import json
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.audit import AUDIT_RULES_FILE, ERROR, FAIL, audit_fleet, load_rules
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.inventory import FleetInventory
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.INFO,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Fleet compliance audit")
+parser.add_argument("--inventory", default="../ewifi/configure/fleet.yaml", help="Fleet inventory file")
+parser.add_argument("--controller", action="append", default=[], help="Audit only this controller")
+parser.add_argument("--site", help="Audit controllers at this site")
+parser.add_argument("--group", help="Audit controllers in this group")
+parser.add_argument("--tag", action="append", default=[], help="Audit controllers carrying this tag")
+parser.add_argument("--rules", default=AUDIT_RULES_FILE, help="Audit rules file")
+parser.add_argument("--rule", action="append", default=[], help="Evaluate only this rule ID")
+parser.add_argument("--workers", type=int, help="Controllers audited at once, all by default")
+parser.add_argument("--output", help="JSON file for the findings, standard output if not given")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+inventory = FleetInventory.load(args.inventory)
+entries = inventory.select(site=args.site, group=args.group, tags=args.tag)
+targets = {entry.name: inventory.config_file(entry.name) for entry in entries
+           if not args.controller or entry.name in args.controller}
+if not targets:
+    raise FrameworkError("No controller selected")
+rules = [rule for rule in load_rules(args.rules) if not args.rule or rule.id in args.rule]
+
+findings = audit_fleet(targets, rules, max_workers=args.workers)
+failures = [finding for finding in findings if finding["status"] in (FAIL, ERROR)]
+for finding in failures:
+    logger.warning("%s: %s %s: %s", finding["controller"], finding["rule"], finding.get("subject", ""),
+                   finding.get("error") or finding.get("actual"))
+logger.info("%d controllers, %d findings, %d failures", len(targets), len(findings), len(failures))
+
+report = json.dumps(findings, indent=2)
+if args.output:
+    with open(args.output, "w") as output:
+        output.write(report)
+else:
+    print(report)
@@ -0,0 +1,60 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../../")
+
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.inventory import FleetInventory
+from ewifi.libs.transaction import CPSEC_SETTINGS, FLEET_MAX_WORKERS, apply_fleet
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Control plane security configuration")
+parser.add_argument("--controller", action="append", default=[], help="Name of the controller")
+parser.add_argument("--inventory", default="../../ewifi/configure/fleet.yaml", help="Fleet inventory file")
+parser.add_argument("--site", help="Configure controllers at this site")
+parser.add_argument("--group", help="Configure controllers in this group")
+parser.add_argument("--enable", action="append", default=[], choices=sorted(CPSEC_SETTINGS),
+                    help="Setting to enable")
+parser.add_argument("--disable", action="append", default=[], choices=sorted(CPSEC_SETTINGS),
+                    help="Setting to disable")
+parser.add_argument("--workers", type=int, default=FLEET_MAX_WORKERS, help="Controllers configured at once")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+if args.controller:
+    targets = {name: "../../ewifi/configure/{}.yaml".format(name) for name in args.controller}
+else:
+    inventory = FleetInventory.load(args.inventory)
+    targets = {entry.name: inventory.config_file(entry.name)
+               for entry in inventory.select(site=args.site, group=args.group)}
+if not targets:
+    raise FrameworkError("No controller selected")
+
+
+def stage(transaction):
+    for setting in args.enable:
+        transaction.stage_cpsec(setting, enable=True)
+    for setting in args.disable:
+        transaction.stage_cpsec(setting, enable=False)
+
+
+results = apply_fleet(targets, stage, max_workers=args.workers)
+for name, result in sorted(results.items()):
+    logger.info("%s: %s", name, result.as_dict())
+if not all(result.ok for result in results.values()):
+    raise FrameworkError("Control plane security configuration failed on some controllers")
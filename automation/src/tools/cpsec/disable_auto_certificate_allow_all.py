@@ -10,6 +10,8 @@ sys.path.append("../../")
 
 from ewifi.libs.controller import AurubaController 
 from ewifi.libs.errors import FrameworkError
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
@@ -19,11 +21,15 @@ logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
 
 parser = argparse.ArgumentParser(description="Controller")
 parser.add_argument("--controller", help="Name of the controller")
+add_profile_argument(parser)
+add_logging_arguments(parser)
 args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
 
 CONFIGURATION_FILE = "../../ewifi/configure/{}.yaml".format(args.controller)
 
-controller = AurubaController(CONFIGURATION_FILE, name=args.controller)
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
 if not controller.test_health():
     raise FrameworkError("Unhealthy Aruba controller")
 controller.disable_auto_certificate_allow_all()
@@ -0,0 +1,51 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import json
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.correlation import CorrelationEngine
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller")
+parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--mac", action="append", default=[], help="Client MAC address")
+parser.add_argument("--ip", action="append", default=[], help="Client IP address")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+if not controller.test_health():
+    raise FrameworkError("Unhealthy Aruba controller")
+
+engine = CorrelationEngine(controller)
+engine.refresh()
+logger.info("%s: %s", args.controller, engine.stats())
+macs = list(args.mac)
+for ip in args.ip:
+    view = engine.client_by_ip(ip)
+    if view is None:
+        logger.info("%s: %s not in user table", args.controller, ip)
+    else:
+        macs.append(view["mac"])
+for mac in macs:
+    logger.info("%s: %s", args.controller, json.dumps(engine.diagnose(mac), indent=2))
@@ -0,0 +1,48 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import datetime
+import logging
+import sys
+import time
+
+sys.path.append("../")
+
+from ewifi.libs.forecast import OK, CapacityForecaster, ingest_archive
+from ewifi.libs.output_archive import OutputArchive
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+parser = argparse.ArgumentParser(description="License and capacity forecast")
+parser.add_argument("--archive", required=True, help="Archive directory set with the archive configuration key")
+parser.add_argument("--controller", nargs="+", required=True, help="Names of the controllers")
+parser.add_argument("--horizon", type=float, default=90, help="Days to project ahead")
+parser.add_argument("--half-life", type=float, help="Days after which a sample weighs half, all equal if not given")
+parser.add_argument("--max-users", type=int, help="User capacity of each controller")
+parser.add_argument("--max-aps", type=int, help="AP capacity of each controller")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+archive = OutputArchive(args.archive)
+forecaster = CapacityForecaster(half_life_days=args.half_life, horizon_days=args.horizon)
+for name in args.controller:
+    limits = {metric: limit for metric, limit in (("users", args.max_users), ("aps", args.max_aps)) if limit}
+    forecaster.set_limits(name, limits)
+    ingest_archive(forecaster, archive, name)
+
+for result in forecaster.forecast(time.time()):
+    crosses = datetime.datetime.fromtimestamp(result["crosses_at"]).date() if result["crosses_at"] else "-"
+    log = logger.info if result["status"] == OK else logger.warning
+    log("%s: %-6s %-40s %5s of %6.0f, %+.2f/day, %s at horizon, reaches limit %s: %s", result["controller"],
+        result["metric"], result["limit_name"], result["current"], result["limit"], result["slope_per_day"] or 0.0,
+        "-" if result["projected"] is None else f"{result['projected']:.0f}", crosses, result["status"])
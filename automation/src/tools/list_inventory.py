@@ -0,0 +1,35 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.inventory import FleetInventory
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+parser = argparse.ArgumentParser(description="Fleet inventory")
+parser.add_argument("--inventory", default="../ewifi/configure/fleet.yaml", help="Fleet inventory file")
+parser.add_argument("--site", help="Select controllers at this site")
+parser.add_argument("--model", help="Select controllers of this model")
+parser.add_argument("--group", help="Select controllers in this group")
+parser.add_argument("--tag", action="append", default=[], help="Select controllers carrying this tag")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+inventory = FleetInventory.load(args.inventory)
+for entry in inventory.select(site=args.site, model=args.model, group=args.group, tags=args.tag):
+    logger.info("%s: site %s, model %s, groups %s, tags %s, config %s", entry.name, entry.site,
+                entry.model, ",".join(entry.groups), ",".join(entry.tags), inventory.config_file(entry.name))
@@ -0,0 +1,75 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import json
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.wifi_client import (NmcliBackend, OnboardingHarness, correlate, simulated_backends, summarize_attempts,
+                                   user_table_observer)
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Onboarding load test")
+parser.add_argument("--controller", help="Name of the controller to correlate with")
+parser.add_argument("--ssid", required=True, help="SSID to connect to")
+parser.add_argument("--psk", help="Pre-shared key, none for open system and MAC auth SSIDs")
+parser.add_argument("--ifname", action="append", help="Wi-Fi interface, one client per interface")
+parser.add_argument("--simulate", type=int, default=0, help="Number of simulated clients instead of interfaces")
+parser.add_argument("--failure-rate", type=float, default=0.0, help="Failure rate of simulated clients")
+parser.add_argument("--attempts", type=int, default=1, help="Attempts per client")
+parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for a connection")
+parser.add_argument("--output", help="JSON file for per attempt results")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+if args.simulate:
+    backends = simulated_backends(args.simulate, args.ssid, failure_rate=args.failure_rate)
+elif args.ifname:
+    backends = [NmcliBackend(ifname) for ifname in args.ifname]
+else:
+    raise FrameworkError("Give --ifname or --simulate")
+
+controller = None
+observe = None
+if args.controller:
+    CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+    controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+    if not controller.test_health():
+        raise FrameworkError("Unhealthy Aruba controller")
+    # Clients are looked up while still associated; they are gone from the user table once disconnected.
+    observe = user_table_observer(controller)
+
+harness = OnboardingHarness(backends, args.ssid, password=args.psk, timeout=args.timeout, observe=observe)
+results = harness.run(args.attempts)
+summary = summarize_attempts(results)
+logger.info("%d attempts, %d succeeded, %d failed", summary["attempts"], summary["succeeded"], summary["failed"])
+for phase, stats in summary["phases"].items():
+    logger.info("%s: %s", phase, ", ".join(f"{name} {value:.3f}s" for name, value in stats.items()))
+
+report = {"summary": summary, "attempts": [result.as_dict() for result in results]}
+if controller is not None:
+    unobserved = any(not result.observed for result in results)
+    report["attempts"] = correlate(results, controller.show_user_table() if unobserved else None,
+                                   controller.show_auth_tracebuf())
+    mismatched = [entry for entry in report["attempts"] if not entry["consistent"]]
+    logger.info("%s: %d attempts disagree with the user table", args.controller, len(mismatched))
+
+if args.output:
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
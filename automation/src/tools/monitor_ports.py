@@ -0,0 +1,53 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+import time
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.ports import PORT_SAMPLES, PortSampler
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller")
+parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--interval", type=float, default=30, help="Seconds between samples")
+parser.add_argument("--samples", type=int, default=0, help="Number of samples, 0 to poll until interrupted")
+parser.add_argument("--history", type=int, default=PORT_SAMPLES, help="Samples kept per port")
+add_profile_argument(parser)
+add_logging_arguments(parser, full_output=False)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+if not controller.test_health():
+    raise FrameworkError("Unhealthy Aruba controller")
+
+sampler = PortSampler(controller, samples=args.history)
+sample = 0
+try:
+    while not args.samples or sample < args.samples:
+        if sample:
+            time.sleep(args.interval)
+        sampler.sample()
+        sample += 1
+except KeyboardInterrupt:
+    pass
+for name, report in sampler.report().items():
+    logger.info("%s: %s: %s for %.0f seconds, %d flaps (%d recent)", args.controller, name, report["state"],
+                report["in_state_seconds"], report["flaps"], report["recent_flaps"])
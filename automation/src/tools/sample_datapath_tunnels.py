@@ -0,0 +1,50 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+import time
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController 
+from ewifi.libs.datapath import TunnelSampler
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller")
+parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--id", action="append", help="Tunnel ID, all tunnels if not given")
+parser.add_argument("--interval", type=float, default=10, help="Seconds between samples")
+parser.add_argument("--samples", type=int, default=2, help="Number of samples")
+add_profile_argument(parser)
+add_logging_arguments(parser, full_output=False)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+if not controller.test_health():
+    raise FrameworkError("Unhealthy Aruba controller")
+
+sampler = TunnelSampler(controller)
+for sample in range(args.samples):
+    if sample:
+        time.sleep(args.interval)
+    result = sampler.sample(args.id)
+    for tunnel_id, rates in sorted(result.rates.items()):
+        logger.info("%s: tunnel %s: %s", args.controller, tunnel_id,
+                    ", ".join(f"{column} {rate:.1f}/s" for column, rate in rates.items()))
+    if result.vanished:
+        logger.info("%s: vanished tunnels: %s", args.controller, ", ".join(map(str, result.vanished)))
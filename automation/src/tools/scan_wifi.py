@@ -0,0 +1,54 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import json
+import logging
+import sys
+import time
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.wifi_client import NmcliBackend
+from ewifi.libs.wifi_scan import WifiScanner, coverage_audit
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Wi-Fi scan")
+parser.add_argument("--ifname", required=True, help="Wi-Fi interface")
+parser.add_argument("--scans", type=int, default=1, help="Number of scans")
+parser.add_argument("--interval", type=float, default=30, help="Seconds between scans")
+parser.add_argument("--controller", help="Name of the controller to audit coverage against")
+add_profile_argument(parser)
+add_logging_arguments(parser, full_output=False)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+scanner = WifiScanner(NmcliBackend(args.ifname), max_age=args.interval)
+for scan in range(args.scans):
+    if scan:
+        time.sleep(args.interval)
+    diff = scanner.scan(force=True)
+    for record in diff.appeared:
+        logger.info("appeared: %s %s channel %s signal %s %s", record.bssid, record.ssid or "<hidden>",
+                    record.channel, record.signal, record.security)
+    for record in diff.disappeared:
+        logger.info("disappeared: %s %s", record.bssid, record.ssid or "<hidden>")
+
+if args.controller:
+    CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+    controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+    if not controller.test_health():
+        raise FrameworkError("Unhealthy Aruba controller")
+    audit = coverage_audit(scanner.records.values(), controller.show_essids(), controller.show_ap_database())
+    logger.info("%s: coverage %s", args.controller, json.dumps(audit, indent=2))
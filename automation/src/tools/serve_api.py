@@ -0,0 +1,57 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import asyncio
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.api import API_HOST, API_PORT, POLL_INTERVAL_SECONDS, RESOURCES, ApiServer, StateService
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.inventory import FleetInventory
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.INFO,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller state HTTP API")
+parser.add_argument("--controller", action="append", default=[], help="Name of the controller")
+parser.add_argument("--inventory", default="../ewifi/configure/fleet.yaml", help="Fleet inventory file")
+parser.add_argument("--site", help="Serve the controllers at this site")
+parser.add_argument("--resource", action="append", choices=sorted(RESOURCES), help="Resource to poll, all if not given")
+parser.add_argument("--interval", type=float, default=POLL_INTERVAL_SECONDS, help="Seconds between polls")
+parser.add_argument("--host", default=API_HOST, help="Address to listen on")
+parser.add_argument("--port", type=int, default=API_PORT, help="Port to listen on")
+add_profile_argument(parser)
+add_logging_arguments(parser, full_output=False)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+if args.controller:
+    configs = {name: "../ewifi/configure/{}.yaml".format(name) for name in args.controller}
+else:
+    inventory = FleetInventory.load(args.inventory)
+    configs = {entry.name: inventory.config_file(entry.name) for entry in inventory.select(site=args.site)}
+if not configs:
+    raise FrameworkError("No controller selected")
+
+controllers = {name: AurubaController(conf_file, name=name, lazy=True) for name, conf_file in configs.items()}
+
+
+async def main():
+    server = await ApiServer(StateService(controllers, args.resource, args.interval), args.host, args.port).start()
+    try:
+        await server.serve_forever()
+    finally:
+        await server.stop()
+
+asyncio.run(main())
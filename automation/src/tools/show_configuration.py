@@ -10,6 +10,9 @@ sys.path.append("../")
 
 from ewifi.libs.controller import AurubaController 
 from ewifi.libs.errors import FrameworkError
+from ewifi.libs.running_config import diff_configs
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
@@ -18,11 +21,29 @@ logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
 
 parser = argparse.ArgumentParser(description="Controller")
 parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--output", help="Stream the configuration to this file instead of logging it")
+parser.add_argument("--diff", help="Earlier configuration file to compare --output against")
+add_profile_argument(parser)
+add_logging_arguments(parser)
 args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
 
 CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
 
-controller = AurubaController(CONFIGURATION_FILE, name=args.controller)
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
 if not controller.test_health():
     raise FrameworkError("Unhealthy Aruba controller")
-controller.show_running_config()
+if not args.output:
+    controller.show_running_config()
+    sys.exit(0)
+
+controller.save_running_config(args.output)
+if args.diff:
+    changes = diff_configs(args.diff, args.output)
+    for header in changes["added"]:
+        logger.info("Added: %s", header)
+    for header in changes["removed"]:
+        logger.info("Removed: %s", header)
+    for header, lines in changes["changed"].items():
+        logger.info("Changed: %s\n%s", header, "\n".join(lines))
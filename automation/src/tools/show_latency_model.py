@@ -0,0 +1,36 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.latency import LATENCY_FILE, LatencyModel
+from ewifi.libs.serial_access import COMMAND_TIMEOUT_SECONDS, SERIAL_COMMAND_TIMEOUT_SECONDS
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+parser = argparse.ArgumentParser(description="Learned command latencies and timeouts")
+parser.add_argument("--controller", help="Name of the controller, all controllers if not given")
+parser.add_argument("--model", default=LATENCY_FILE, help="Latency model file")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+model = LatencyModel(args.model)
+statistics = model.stats(args.controller, SERIAL_COMMAND_TIMEOUT_SECONDS, COMMAND_TIMEOUT_SECONDS)
+for controller, commands in sorted(statistics.items()):
+    for command, stats in sorted(commands.items()):
+        logger.info("%s: %s: %s", controller, command,
+                    ", ".join(f"{key} {value:.2f}" if isinstance(value, float) else f"{key} {value}"
+                              for key, value in stats.items()))
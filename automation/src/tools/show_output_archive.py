@@ -0,0 +1,50 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import datetime
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.output_archive import OutputArchive
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+parser = argparse.ArgumentParser(description="Archived command outputs")
+parser.add_argument("--archive", required=True, help="Archive directory set with the archive configuration key")
+parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--command", default="show run", help="Archived command")
+parser.add_argument("--at", help="Print the output in effect at this time, YYYY-MM-DD HH:MM:SS")
+parser.add_argument("--history", action="store_true", help="List the captures of the command")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+archive = OutputArchive(args.archive)
+stats = archive.stats()
+logger.info("%s: %d captures, %d bytes stored as %d bytes in %d objects (%.1fx)", args.archive, stats["captures"],
+            stats["logical_bytes"], stats["stored_bytes"], stats["objects"], stats["ratio"])
+if not args.controller:
+    sys.exit(0)
+
+if args.history:
+    for capture in archive.history(args.controller, args.command):
+        logger.info("%s %8d bytes %4d chunks %s", datetime.datetime.fromtimestamp(capture["time"]),
+                    capture["size"], capture["chunks"], "changed" if capture["changed"] else "unchanged")
+
+at = datetime.datetime.strptime(args.at, "%Y-%m-%d %H:%M:%S").timestamp() if args.at else None
+output = archive.get(args.controller, args.command, at)
+if output is None:
+    logger.error("%s: No %s archived by %s", args.controller, args.command, args.at or "now")
+else:
+    print(output)
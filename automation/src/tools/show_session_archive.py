@@ -0,0 +1,33 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.session_archive import SessionArchive
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+parser = argparse.ArgumentParser(description="Recorded console session")
+parser.add_argument("--archive", required=True, help="Session archive recorded with the record configuration key")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+archive = SessionArchive(args.archive)
+logger.info("%s: %d exchanges recorded from %s", args.archive, len(archive), archive.header.get("controller"))
+for record in archive.records:
+    logger.info("%9.3fs %-40s %8d chars %8.3fs%s", record["offset"],
+                "<prompt probe>" if record["command"] is None else record["command"],
+                len(record["before"] or ""), record["seconds"], " timed out" if record["timed_out"] else "")
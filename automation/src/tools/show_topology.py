@@ -0,0 +1,48 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.inventory import FleetInventory
+from ewifi.libs.topology import TopologyResolver
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller cluster topology")
+parser.add_argument("--controller", action="append", default=[], help="Name of a controller of the cluster")
+parser.add_argument("--inventory", default="../ewifi/configure/fleet.yaml", help="Fleet inventory file")
+parser.add_argument("--site", help="Use the controllers at this site")
+parser.add_argument("--command", action="append", default=[], help="Command to run on the routed controller")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+if args.controller:
+    configs = {name: "../ewifi/configure/{}.yaml".format(name) for name in args.controller}
+else:
+    inventory = FleetInventory.load(args.inventory)
+    configs = {entry.name: inventory.config_file(entry.name) for entry in inventory.select(site=args.site)}
+if not configs:
+    raise FrameworkError("No controller selected")
+
+resolver = TopologyResolver({name: AurubaController(conf_file, name=name, lazy=True) for name, conf_file in configs.items()})
+for name, role in sorted(resolver.discover().items()):
+    logger.info("%s: %s", name, role)
+for command in args.command:
+    name, output = resolver.run(command)
+    logger.info("%s: %s\n%s", name, command, output)
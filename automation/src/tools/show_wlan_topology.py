@@ -0,0 +1,48 @@
+# Copyright 2021. All right reserved.
+# Author: Roopesha Sheshappa, Rai
+
+import argparse
+
+import logging
+import sys
+
+sys.path.append("../")
+
+from ewifi.libs.controller import AurubaController
+from ewifi.libs.errors import FrameworkError
+from ewifi.libs.wlan_topology import WlanTopology
+from ewifi.libs.output_logging import add_logging_arguments, start_logging
+from ewifi.libs.profiling import add_profile_argument, start_profiling
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(format='%(asctime)s: %(levelname)-1s: %(message)s',
+                level=logging.DEBUG,
+                datefmt='%Y-%m-%d %H:%M:%S')
+
+
+parser = argparse.ArgumentParser(description="Controller")
+parser.add_argument("--controller", help="Name of the controller")
+parser.add_argument("--vlan", action="append", default=[], help="Show the ESSIDs and virtual APs on this VLAN")
+parser.add_argument("--essid", action="append", default=[], help="Show the VLANs of this ESSID")
+parser.add_argument("--vap", action="append", default=[], help="Show what this virtual AP maps to")
+add_profile_argument(parser)
+add_logging_arguments(parser)
+args = parser.parse_args()
+start_profiling(args.profile)
+start_logging(args.capture, args.full_output)
+
+CONFIGURATION_FILE = "../ewifi/configure/{}.yaml".format(args.controller)
+
+controller = AurubaController(CONFIGURATION_FILE, name=args.controller, lazy=True)
+if not controller.test_health():
+    raise FrameworkError("Unhealthy Aruba controller")
+
+topology = WlanTopology(controller)
+topology.refresh()
+for vlan in args.vlan:
+    logger.info("%s: VLAN %s: ESSIDs %s, virtual APs %s", args.controller, vlan,
+                ", ".join(topology.essids_on_vlan(vlan)), ", ".join(topology.vaps_on_vlan(vlan)))
+for essid in args.essid:
+    logger.info("%s: ESSID %s: VLANs %s", args.controller, essid, ", ".join(topology.vlans_for_essid(essid)))
+for vap in args.vap or sorted(topology.vaps):
+    logger.info("%s: virtual AP %s: %s", args.controller, vap, topology.describe(vap))